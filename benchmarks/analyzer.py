@@ -0,0 +1,93 @@
+"""
+Measures the throughput of analyzing and indexing `text` fields.
+
+Run from the repository root with `python -m benchmarks.analyzer`.
+"""
+import os
+import random
+from typing import Callable, List, Tuple
+
+from benchmarks.common import argument_parser, best
+from engine.analyzer import tokenize, tokenize_batch
+from engine.schema import Document, Schema
+from engine.writer import IndexWriter
+from models import IndexDeclaration
+
+WORDS = [
+    "search", "engine", "index", "segment", "query", "token", "Document", "Ranking",
+    "the", "of", "and", "fast", "latency", "throughput", "cache", "merge", "commit",
+    "Hello", "world", "lnx", "rust", "python", "tantivy", "analyzer", "posting",
+]
+
+
+def _documents(schema: Schema, count: int, words: int) -> List[Tuple[int, Document]]:
+    rng = random.Random(42)
+    vocabulary = WORDS + [f"term{i}" for i in range(20_000)]
+    return [
+        (i, schema.validate({
+            "title": " ".join(rng.choices(vocabulary, k=8)),
+            "body": " ".join(rng.choices(vocabulary, k=words)) + ".",
+        }))
+        for i in range(count)
+    ]
+
+
+def _report(label: str, fn: Callable[[], None], docs: int, size: int, repeat: int = 3):
+    elapsed = best(fn, repeat)
+    print(f"{label:32s} {docs / elapsed:12,.0f} docs/s {size / elapsed / 1e6:8.2f} MB/s")
+
+
+def main():
+    parser = argument_parser(__doc__, docs=50_000)
+    parser.add_argument("--words", type=int, default=100, help="words per document body")
+    parser.add_argument("--batches", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    declaration = IndexDeclaration(
+        name="bench",
+        storage_type="tempdir",
+        fields={
+            "title": {"type": "text", "stored": True},
+            "body": {"type": "text", "stored": False},
+        },
+        search_fields=["title", "body"],
+        max_concurrency=2,
+    )
+    schema = Schema(declaration)
+    documents = _documents(schema, args.docs, args.words)
+    values = [doc["body"] for _, doc in documents] + [doc["title"] for _, doc in documents]
+    size = sum(len(value) for field in values for value in field)
+    print(f"{args.docs} documents, {size / 1e6:.1f} MB of text, {os.cpu_count()} cpus")
+
+    def per_value() -> List[List[str]]:
+        # How documents were analyzed before batching, one value at a time.
+        tokens_per_doc = []
+        for field in values:
+            tokens = []
+            for value in field:
+                tokens.extend(tokenize(value))
+            tokens_per_doc.append(tokens)
+        return tokens_per_doc
+
+    assert per_value() == tokenize_batch(values)
+    _report("tokenize, per value", per_value, args.docs, size)
+    _report("tokenize, batched", lambda: tokenize_batch(values), args.docs, size)
+
+    step = len(documents) // args.batches or 1
+    batches = [documents[i:i + step] for i in range(0, len(documents), step)]
+    for label, processes in (("build, threads", 0), (f"build, {args.processes} processes", args.processes)):
+        writer = IndexWriter("bench", schema, None, args.processes, processes)
+        # Starts the worker processes before timing.
+        writer.build(documents[:1], bulk=True).result()
+
+        def build():
+            for future in [writer.build(batch, bulk=True) for batch in batches]:
+                future.result()
+
+        _report(label, build, args.docs, size)
+        writer.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Measures the per-request cost of checking access tokens.
+
+Run from the repository root with `python -m benchmarks.auth`.
+"""
+import time
+import timeit
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+
+from benchmarks.common import argument_parser
+from engine.auth import SEARCH_INDEX, SUPER_USER, TokenStore
+from models import CreateTokenPayload
+
+
+def _per_call(fn, number: int) -> float:
+    """ The best mean time of a call in microseconds. """
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def _app(store: TokenStore, protected: bool) -> FastAPI:
+    async def check(request: Request):
+        store.check(request.headers.get("authorization"), SEARCH_INDEX, request.path_params.get("index"))
+
+    app = FastAPI()
+    dependencies = [Depends(check)] if protected else []
+
+    @app.get("/indexes/{index:str}/ping", dependencies=dependencies)
+    async def ping(index: str):  # noqa
+        return {"status": 200, "data": "pong"}
+
+    return app
+
+
+def _per_request(app: FastAPI, token: str, requests: int) -> float:
+    client = TestClient(app)
+    headers = {"Authorization": token}
+    for _ in range(100):
+        client.get("/indexes/products/ping", headers=headers)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get("/indexes/products/ping", headers=headers)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument("--tokens", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=5_000)
+    args = parser.parse_args()
+
+    store = TokenStore("super-user-key")
+    payload = CreateTokenPayload(permissions=SEARCH_INDEX, allowed_indexes=["products", "reviews"])
+    tokens = [store.create(payload).token for _ in range(args.tokens)]
+    token = tokens[len(tokens) // 2]
+
+    print(f"{args.tokens} tokens")
+    print(f"check, allowed index    {_per_call(lambda: store.check(token, SEARCH_INDEX, 'products'), 100_000):8.3f}us")
+    print(f"check, super user       {_per_call(lambda: store.check('super-user-key', SUPER_USER), 100_000):8.3f}us")
+
+    def rejected():
+        try:
+            store.check(token, SEARCH_INDEX, "orders")
+        except Exception:
+            pass
+
+    print(f"check, rejected index   {_per_call(rejected, 100_000):8.3f}us")
+
+    start = time.perf_counter()
+    store.revoke(tokens[0])
+    print(f"revoke                  {(time.perf_counter() - start) * 1e6:8.3f}us")
+
+    # Alternated and the best of each kept, as the test client is noisy.
+    apps = (_app(store, False), _app(store, True))
+    unprotected, protected = float("inf"), float("inf")
+    for _ in range(3):
+        unprotected = min(unprotected, _per_request(apps[0], token, args.requests))
+        protected = min(protected, _per_request(apps[1], token, args.requests))
+    print(f"request, no auth        {unprotected:8.3f}us")
+    print(f"request, auth           {protected:8.3f}us")
+    print(f"added per request       {protected - unprotected:8.3f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Helpers shared by the benchmarks, timing a run and building an in memory segment.
+"""
+import argparse
+import random
+import time
+import uuid
+from operator import eq
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from engine.query import Searcher
+from engine.schema import Schema
+from engine.segment import Segment
+from engine.writer import RawDocument
+from models import IndexDeclaration
+
+# Words padding out every generated text, so documents vary in length.
+FILLER = [f"filler{i}" for i in range(1000)]
+
+# How often a term occurs within a document it appears in.
+FREQUENCIES = (1, 1, 1, 2, 2, 3, 5)
+
+
+def argument_parser(doc: str, docs: Optional[int] = None) -> argparse.ArgumentParser:
+    """ A parser described by the first line of a benchmark's docstring, with `--docs` if given a default. """
+    parser = argparse.ArgumentParser(description=doc.strip().splitlines()[0])
+    if docs is not None:
+        parser.add_argument("--docs", type=int, default=docs)
+    return parser
+
+
+def best(fn: Callable[[], object], repeat: int = 3) -> float:
+    """ The fastest of several runs of a function in seconds. """
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    return elapsed
+
+
+def compare(
+    label: str,
+    before: Tuple[str, Callable[[], Any]],
+    after: Tuple[str, Callable[[], Any]],
+    same: Callable[[Any, Any], bool] = eq,
+):
+    """
+    Checks two ways of doing the same work agree, then prints the best
+    time of each and the speedup of the second.
+    """
+    (before_name, before_fn), (after_name, after_fn) = before, after
+    assert same(before_fn(), after_fn()), f"{label}: {before_name} and {after_name} disagree"
+
+    before_time, after_time = best(before_fn), best(after_fn)
+    print(
+        f"{label}   {before_name} {before_time * 1000:8.1f}ms   {after_name} {after_time * 1000:8.1f}ms"
+        f"   {before_time / after_time:6.1f}x"
+    )
+
+
+def random_texts(rng: random.Random, num_docs: int, selectivity: Dict[str, float]) -> List[str]:
+    """ A text per document, where each term appears in the given share of them. """
+    tokens = [rng.choices(FILLER, k=rng.randint(2, 12)) for _ in range(num_docs)]
+    for term, fraction in sorted(selectivity.items()):
+        for ordinal in rng.sample(range(num_docs), int(num_docs * fraction)):
+            tokens[ordinal].extend([term] * rng.choice(FREQUENCIES))
+    return [" ".join(doc_tokens) for doc_tokens in tokens]
+
+
+def build_segment(declaration: IndexDeclaration, documents: List[RawDocument]) -> Tuple[Searcher, Segment]:
+    """ Builds documents into a segment the way the writer does, along with a searcher over it. """
+    schema = Schema(declaration)
+    validated = [(doc_id, schema.validate(doc)) for doc_id, doc in enumerate(documents, 1)]
+    segment = Segment.build(uuid.uuid4().hex, schema, validated)
+    return memory_searcher(declaration, [segment]), segment
+
+
+def memory_searcher(declaration: IndexDeclaration, segments: List[Segment]) -> Searcher:
+    """ A searcher over segments built in memory, without an index behind it. """
+    return Searcher(SimpleNamespace(schema=Schema(declaration)), segments)
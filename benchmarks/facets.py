@@ -0,0 +1,56 @@
+"""
+Measures counting the facet paths of broad and narrow match sets.
+
+Run from the repository root with `python -m benchmarks.facets`.
+"""
+import random
+from typing import Dict, List
+
+from benchmarks.common import argument_parser, build_segment, compare
+from engine.facets import FacetColumn
+from models import IndexDeclaration
+
+SELECTIVITY = [1.0, 0.5, 0.1, 0.01]
+
+
+def _naive(column: FacetColumn, ordinals: List[int]) -> Dict[str, int]:
+    # Counting a document and a path at a time.
+    counts: Dict[str, int] = {}
+    for ordinal in ordinals:
+        for path in column.get(ordinal):
+            counts[path] = counts.get(path, 0) + 1
+    return counts
+
+
+def main():
+    args = argument_parser(__doc__, docs=1_000_000).parse_args()
+
+    declaration = IndexDeclaration(
+        name="bench",
+        storage_type="tempdir",
+        fields={"category": {"type": "facet", "fast": True, "multi": True}},
+        search_fields=[],
+        max_concurrency=2,
+    )
+    rng = random.Random(42)
+    categories = [f"/c{i}/s{j}/l{k}" for i in range(20) for j in range(10) for k in range(10)]
+    documents = [{"category": rng.sample(categories, 2 if rng.random() < 0.1 else 1)} for _ in range(args.docs)]
+    _, segment = build_segment(declaration, documents)
+    column = segment.facets["category"]
+    print(f"{args.docs} documents, {len(column.names)} paths, {len(column.offsets) - 1} distinct sets of paths")
+
+    def below(counts: Dict[str, int], children: Dict[str, int]) -> bool:
+        return children == {path: count for path, count in counts.items() if path.rpartition("/")[0] == "/c1"}
+
+    for fraction in SELECTIVITY:
+        ordinals = sorted(rng.sample(range(args.docs), int(args.docs * fraction)))
+        compare(
+            f"{fraction:6.1%} matching {len(ordinals):8d} docs",
+            ("per doc", lambda: _naive(column, ordinals)),
+            ("column", lambda: column.children(column.count(ordinals), "/c1")),
+            below,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Measures conjunctions of common and rare terms, with and without exclusions.
+
+Run from the repository root with `python -m benchmarks.intersection`.
+"""
+import random
+from typing import Dict, List
+
+from benchmarks.common import argument_parser, build_segment, compare, random_texts
+from engine.query import BooleanQuery, Query, Searcher, TermGroup
+from engine.segment import Segment
+from models import IndexDeclaration, Occur
+
+SELECTIVITY = {"the": 0.6, "common": 0.2, "uncommon": 0.02, "rare": 0.0005}
+
+QUERIES = [
+    ("+the +common", ["the", "common"], []),
+    ("+the +rare", ["the", "rare"], []),
+    ("+the +common +rare", ["the", "common", "rare"], []),
+    ("+the +uncommon -common", ["the", "uncommon"], ["common"]),
+    ("+rare -the", ["rare"], ["the"]),
+]
+
+
+def _naive(query: BooleanQuery, searcher: Searcher, segment: Segment) -> Dict[int, float]:
+    # How a conjunction was evaluated before, every clause in full and then intersected.
+    results = sorted((clause.evaluate(searcher, segment) for clause in query.must), key=len)
+    scores = results[0]
+    for other in results[1:]:
+        scores = {
+            ordinal: score + other[ordinal]
+            for ordinal, score in scores.items()
+            if ordinal in other
+        }
+    for clause in query.must_not:
+        for ordinal in clause.evaluate(searcher, segment):
+            scores.pop(ordinal, None)
+    return scores
+
+
+def _query(must: List[str], must_not: List[str]) -> BooleanQuery:
+    query = BooleanQuery()
+    for term in must:
+        query.add(Occur.Must, TermGroup([("body", term, 1.0)]))
+    for term in must_not:
+        query.add(Occur.MustNot, TermGroup([("body", term, 1.0)]))
+    return query
+
+
+def main():
+    args = argument_parser(__doc__, docs=1_000_000).parse_args()
+
+    declaration = IndexDeclaration(
+        name="bench",
+        storage_type="tempdir",
+        fields={"body": {"type": "text", "stored": False}},
+        search_fields=["body"],
+        set_conjunction_by_default=True,
+        max_concurrency=2,
+    )
+    rng = random.Random(42)
+    searcher, segment = build_segment(declaration, [{"body": text} for text in random_texts(rng, args.docs, SELECTIVITY)])
+    print(f"{args.docs} documents, " + ", ".join(f"{term} in {share:.2%}" for term, share in SELECTIVITY.items()))
+
+    for label, must, must_not in QUERIES:
+        query: Query = _query(must, must_not)
+        hits = len(query.evaluate(searcher, segment))
+        compare(
+            f"{label:24s} {hits:8d} hits",
+            ("full", lambda: _naive(query, searcher, segment).keys()),
+            ("leapfrog", lambda: query.evaluate(searcher, segment).keys()),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures date range filters on their own and alongside rare and common terms.
+
+Run from the repository root with `python -m benchmarks.ranges`.
+"""
+import random
+from typing import Optional
+
+from benchmarks.common import argument_parser, build_segment, compare, random_texts
+from engine.query import BooleanQuery, Query, RangeQuery, Scores, Searcher, TermGroup
+from engine.segment import Segment
+from models import IndexDeclaration, Occur
+
+DAY = 86400
+START = 1_600_000_000
+
+SELECTIVITY = {"common": 0.2, "rare": 0.0005}
+
+# (label, term, days covered by the range out of a year)
+QUERIES = [
+    ("last day", None, 1),
+    ("last month", None, 30),
+    ("last half year", None, 182),
+    ("+common last month", "common", 30),
+    ("+rare last month", "rare", 30),
+    ("+rare last half year", "rare", 182),
+]
+
+
+def _naive(term: Optional[str], days: int, searcher: Searcher, segment: Segment) -> Scores:
+    # Filtering the matches of the text, or every document, by their value.
+    low = START + (365 - days) * DAY
+    values = segment.fast_fields["created_at"].values
+    candidates = range(len(segment)) if term is None else TermGroup([("body", term, 1.0)]).evaluate(searcher, segment)
+    return {ordinal: 0.0 for ordinal in candidates if values[ordinal] >= low}
+
+
+def _query(term: Optional[str], days: int) -> Query:
+    query = BooleanQuery()
+    query.add(Occur.Must, RangeQuery("created_at", START + (365 - days) * DAY, None))
+    if term is not None:
+        query.add(Occur.Must, TermGroup([("body", term, 1.0)]))
+    return query
+
+
+def main():
+    args = argument_parser(__doc__, docs=1_000_000).parse_args()
+
+    declaration = IndexDeclaration(
+        name="bench",
+        storage_type="tempdir",
+        fields={"body": {"type": "text", "stored": False}, "created_at": {"type": "date", "fast": True}},
+        search_fields=["body"],
+        max_concurrency=2,
+    )
+    rng = random.Random(42)
+    documents = [
+        {"body": text, "created_at": START + rng.randrange(365 * DAY)}
+        for text in random_texts(rng, args.docs, SELECTIVITY)
+    ]
+    searcher, segment = build_segment(declaration, documents)
+    print(f"{args.docs} documents over a year, " + ", ".join(f"{t} in {s:.2%}" for t, s in SELECTIVITY.items()))
+
+    for label, term, days in QUERIES:
+        query = _query(term, days)
+        hits = len(query.evaluate(searcher, segment))
+        compare(
+            f"{label:22s} {hits:8d} hits",
+            ("scan", lambda: _naive(term, days, searcher, segment).keys()),
+            ("sorted index", lambda: query.evaluate(searcher, segment).keys()),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Measures writing search results through the response model and straight to JSON.
+
+Run from the repository root with `python -m benchmarks.responses`.
+"""
+import random
+from typing import Any, Dict
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import responses
+from benchmarks.common import argument_parser, best
+from models import QueryResponse
+from responses import RawJSONResponse
+
+
+def _results(hits: int) -> Dict[str, Any]:
+    rng = random.Random(42)
+    words = ["search", "engine", "index", "segment", "query", "token", "ranking", "latency"]
+    return {
+        "hits": [
+            {
+                "data": {
+                    "title": [" ".join(rng.choices(words, k=6))],
+                    "description": [" ".join(rng.choices(words, k=40))],
+                    "tags": rng.choices(words, k=3),
+                    "price": [rng.random() * 100],
+                    "stock": [rng.randrange(1000)],
+                },
+                "ratio": rng.random() * 10,
+                "document_id": str(rng.getrandbits(63)),
+            }
+            for _ in range(hits)
+        ],
+        "count": hits * 10,
+        "time_taken": 0.001,
+        "next_cursor": {"value": 1.5, "document_id": "12345"},
+        "facets": [],
+        "cached": False,
+    }
+
+
+def _app(results: Dict[str, Any]) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/model", response_model=QueryResponse)
+    async def model():  # noqa
+        return {"status": 200, "data": results}
+
+    @app.post("/raw", response_model=QueryResponse)
+    async def raw():  # noqa
+        return RawJSONResponse({"status": 200, "data": results})
+
+    return app
+
+
+def _per_request(client: TestClient, path: str, requests: int) -> float:
+    """ The best mean time of a request in milliseconds. """
+    for _ in range(10):
+        client.post(path)
+
+    def run():
+        for _ in range(requests):
+            client.post(path)
+
+    return best(run) / requests * 1e3
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"encoder: {'orjson' if responses.orjson is not None else 'json'}")
+    for hits in (20, 100, 1000):
+        client = TestClient(_app(_results(hits)))
+        assert client.post("/model").content == client.post("/raw").content
+
+        requests = max(args.requests * 20 // hits, 10)
+        model = _per_request(client, "/model", requests)
+        raw = _per_request(client, "/raw", requests)
+        print(
+            f"{hits:5d} hits   response model {model:8.2f}ms   raw json {raw:8.2f}ms   {model / raw:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
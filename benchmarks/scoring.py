@@ -0,0 +1,90 @@
+"""
+Measures scoring and collecting broad queries across several boosted fields.
+
+Run from the repository root with `python -m benchmarks.scoring`.
+"""
+import heapq
+import random
+from typing import Dict, List, Tuple
+
+from benchmarks.common import argument_parser, build_segment, compare, random_texts
+from engine.collector import TopDocs
+from engine.query import B, K1, Searcher, TermGroup
+from engine.segment import Segment
+from models import IndexDeclaration
+
+FIELDS = ["title", "description", "body"]
+
+
+def _naive(group: TermGroup, searcher: Searcher, segment: Segment) -> Dict[int, float]:
+    # How a group was scored before, a posting at a time into a dict.
+    scores: Dict[int, float] = {}
+    for field, term, boost in group.terms:
+        field_index = segment.fields[field]
+        postings = field_index.postings(term)
+        if postings is None:
+            continue
+
+        weight = boost * searcher.idf(field, term)
+        avg_length = searcher.avg_length(field)
+        lengths = field_index.lengths
+        deleted = segment.deleted
+        for ordinal, freq in zip(*postings):
+            if deleted and ordinal in deleted:
+                continue
+            norm = K1 * (1 - B + B * lengths[ordinal] / avg_length)
+            score = weight * freq * (K1 + 1) / (freq + norm)
+            scores[ordinal] = scores.get(ordinal, 0.0) + score
+    return scores
+
+
+def _naive_top(segment: Segment, scores: Dict[int, float], k: int) -> List[Tuple[float, int]]:
+    heap: List[Tuple[float, int]] = []
+    doc_ids = segment.doc_ids
+    for ordinal, score in scores.items():
+        entry = (score, -doc_ids[ordinal])
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+    return sorted(heap, reverse=True)
+
+
+def main():
+    parser = argument_parser(__doc__, docs=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    declaration = IndexDeclaration(
+        name="bench",
+        storage_type="tempdir",
+        fields={name: {"type": "text", "stored": False} for name in FIELDS},
+        search_fields=FIELDS,
+        boost_fields={"title": 3, "description": 1.5},
+        max_concurrency=2,
+    )
+
+    rng = random.Random(42)
+    selectivity = {"broad": 0.3, "common": 0.05, "rare": 0.001}
+    texts = {name: random_texts(rng, args.docs, selectivity) for name in FIELDS}
+    searcher, segment = build_segment(declaration, [dict(zip(texts, doc)) for doc in zip(*texts.values())])
+    print(f"{args.docs} documents, {len(FIELDS)} fields, top {args.limit}")
+
+    for term, fraction in selectivity.items():
+        group = TermGroup([(name, term, searcher.schema.boost(name)) for name in FIELDS])
+        # Warms the searcher's idf and the fields' cached norms.
+        group.evaluate(searcher, segment)
+
+        def naive() -> List[int]:
+            return [doc_id for _, doc_id in _naive_top(segment, _naive(group, searcher, segment), args.limit)]
+
+        def vectorized() -> List[int]:
+            collector = TopDocs(args.limit)
+            collector.collect_scores(segment, group.evaluate(searcher, segment))
+            return [doc_id for _, doc_id, _, _, _, _ in collector.top()]
+
+        compare(f"{term:8s} {fraction:6.1%} of docs per field", ("naive", naive), ("vectorized", vectorized))
+
+
+if __name__ == "__main__":
+    main()
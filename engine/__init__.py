@@ -0,0 +1,17 @@
+from .engine import Engine
+from .errors import (
+    DataDirectoryInUse,
+    DocumentNotFound,
+    EngineError,
+    IndexAlreadyExists,
+    IndexNotFound,
+    InvalidDocument,
+    InvalidQuery,
+    InvalidSchema,
+    InvalidSnapshot,
+    InvalidSynonym,
+    ServerOverloaded,
+    TokenNotFound,
+    Unauthorized,
+)
+from .index import Index
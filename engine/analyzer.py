@@ -0,0 +1,266 @@
+import re
+import sys
+import threading
+from array import array
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from .errors import InvalidSynonym
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Synonym tables are only compacted once they hold at least this many
+# replaced synonyms, and they make up half of the table.
+COMPACT_MIN_GARBAGE = 1024
+
+# The fallback set used when an index has no custom stop words.
+DEFAULT_STOP_WORDS: FrozenSet[str] = frozenset("""
+a about above after again against all am an and any are as at be because been
+before being below between both but by can did do does doing down during each
+few for from further had has have having he her here hers herself him himself
+his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what
+when where which while who whom why will with you your yours yourself
+yourselves
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """ Splits text into lowercase word tokens. """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def tokenize_batch(values_per_doc: Iterable[List[str]]) -> List[List[str]]:
+    """
+    Tokenizes the values of a batch of documents, producing the same
+    tokens as `tokenize` on each value.
+
+    Each document's values are joined into one buffer and split with a
+    single regex pass, so the only work done in Python is per document.
+    Joining the whole batch into a single buffer and splitting the tokens
+    back out by document was measured to be slower, as finding the
+    document boundaries costs more than the calls it saves.
+    """
+    return [TOKEN_PATTERN.findall(" ".join(values).lower()) for values in values_per_doc]
+
+
+class StopWords:
+    """
+    The custom stop words of an index.
+
+    The active set is compiled whenever the words change rather than on
+    every query, so stripping stop words is a single set lookup per token.
+    """
+
+    def __init__(self):
+        self._words: Set[str] = set()
+        self._active: FrozenSet[str] = DEFAULT_STOP_WORDS
+
+    def _compile(self):
+        self._active = frozenset(self._words) if self._words else DEFAULT_STOP_WORDS
+
+    def add(self, words: Iterable[str]):
+        self._words.update(word.lower() for word in words)
+        self._compile()
+
+    def remove(self, words: Iterable[str]):
+        self._words.difference_update(word.lower() for word in words)
+        self._compile()
+
+    def clear(self):
+        self._words.clear()
+        self._compile()
+
+    @property
+    def active(self) -> FrozenSet[str]:
+        """ The custom stop words, or the default set if none are added. """
+        return self._active
+
+    def strip(self, tokens: List[str]) -> List[str]:
+        active = self._active
+        return [token for token in tokens if token not in active]
+
+    def to_list(self) -> List[str]:
+        return sorted(self._active)
+
+
+class SynonymTable:
+    """
+    The compiled form of an index's synonyms.
+
+    Every word is interned once and given a term id, `rows[t]` is the row
+    holding the synonyms of term `t` or -1 if it has none, and the synonyms
+    of row `r` are the term ids at `values[offsets[r]:offsets[r + 1]]`.
+
+    Rows and terms are only ever appended, replacing a word's synonyms
+    appends a new row and leaves the old one as garbage until the table
+    is compacted, so a table is never changed underneath a query still
+    reading it.
+    """
+
+    __slots__ = ("rows", "offsets", "values", "terms", "term_ids", "garbage")
+
+    def __init__(
+        self,
+        rows: array,
+        offsets: array,
+        values: array,
+        terms: List[str],
+        term_ids: Dict[str, int],
+        garbage: int = 0,
+    ):
+        self.rows = rows
+        self.offsets = offsets
+        self.values = values
+        self.terms = terms
+        self.term_ids = term_ids
+        self.garbage = garbage
+
+    @classmethod
+    def empty(cls) -> "SynonymTable":
+        return cls(array("i"), array("I", [0]), array("I"), [], {})
+
+    def row(self, word: str) -> int:
+        term_id = self.term_ids.get(word)
+        # Terms interned after this table was swapped in have no row in it.
+        if term_id is None or term_id >= len(self.rows):
+            return -1
+        return self.rows[term_id]
+
+    def synonyms(self, word: str) -> Sequence[int]:
+        row = self.row(word)
+        if row < 0:
+            return ()
+        return self.values[self.offsets[row]:self.offsets[row + 1]]
+
+    def words(self) -> Iterator[str]:
+        rows = self.rows
+        return (term for term_id, term in enumerate(self.terms[:len(rows)]) if rows[term_id] >= 0)
+
+    def term_id(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = self.term_ids[term] = len(self.terms)
+            self.terms.append(sys.intern(term))
+        return term_id
+
+    def compacted(self) -> "SynonymTable":
+        """ A copy of the table without any replaced rows or unused terms. """
+        table = SynonymTable.empty()
+        for word in self.words():
+            term_ids = [table.term_id(self.terms[s]) for s in self.synonyms(word)]
+            word_id = table.term_id(word)
+            table.rows.extend([-1] * (len(table.terms) - len(table.rows)))
+            table.rows[word_id] = len(table.offsets) - 1
+            table.values.extend(term_ids)
+            table.offsets.append(len(table.values))
+        return table
+
+
+class Synonyms:
+    """
+    A mapping of words to the words they can be expanded into.
+
+    Queries read the current `SynonymTable` without locking, changes are
+    applied to a new table which shares the arrays of the current one and
+    is swapped in once complete. Only the changed words are appended, the
+    table is compacted once replaced rows make up half of it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table = SynonymTable.empty()
+
+    @staticmethod
+    def _parse(line: str) -> Tuple[List[str], List[str]]:
+        words, sep, synonyms = line.partition(":")
+        if not sep:
+            raise InvalidSynonym(f"synonym {line!r} is missing a ':' separator")
+
+        words = tokenize(words)
+        synonyms = tokenize(synonyms)
+        if not words or not synonyms:
+            raise InvalidSynonym(f"synonym {line!r} must map words to synonyms")
+        return words, synonyms
+
+    def _swap(self, current: SynonymTable, rows: array, garbage: int):
+        table = SynonymTable(
+            rows,
+            current.offsets,
+            current.values,
+            current.terms,
+            current.term_ids,
+            garbage,
+        )
+        if garbage > COMPACT_MIN_GARBAGE and garbage * 2 > len(table.values):
+            table = table.compacted()
+        self._table = table
+
+    def add(self, lines: Iterable[str]):
+        parsed = [self._parse(line) for line in lines]
+        with self._lock:
+            current = self._table
+            changed: Dict[int, List[int]] = {}
+            for words, synonyms in parsed:
+                term_ids = [current.term_id(synonym) for synonym in synonyms]
+                for word in words:
+                    word_id = current.term_id(word)
+                    existing = changed.get(word_id)
+                    if existing is None:
+                        existing = changed[word_id] = list(current.synonyms(word))
+                    for term_id in term_ids:
+                        if term_id not in existing:
+                            existing.append(term_id)
+
+            rows = array("i", current.rows)
+            rows.extend([-1] * (len(current.terms) - len(rows)))
+            garbage = current.garbage
+            for word_id, synonyms in changed.items():
+                if rows[word_id] >= 0:
+                    garbage += len(current.synonyms(current.terms[word_id]))
+                rows[word_id] = len(current.offsets) - 1
+                current.values.extend(synonyms)
+                current.offsets.append(len(current.values))
+
+            self._swap(current, rows, garbage)
+
+    def remove(self, words: Iterable[str]):
+        with self._lock:
+            current = self._table
+            rows = array("i", current.rows)
+            garbage = current.garbage
+            for word in words:
+                word = word.lower()
+                row = current.row(word)
+                if row >= 0:
+                    garbage += current.offsets[row + 1] - current.offsets[row]
+                    rows[current.term_ids[word]] = -1
+
+            self._swap(current, rows, garbage)
+
+    def clear(self):
+        with self._lock:
+            self._table = SynonymTable.empty()
+
+    def expand(self, term: str) -> Iterator[str]:
+        """ Yields the term along with any of its synonyms. """
+        yield term
+        table = self._table
+        row = table.row(term)
+        if row < 0:
+            return
+
+        # Indexed in place rather than sliced so nothing is copied per query.
+        values, terms = table.values, table.terms
+        for i in range(table.offsets[row], table.offsets[row + 1]):
+            synonym = terms[values[i]]
+            if synonym != term:
+                yield synonym
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        table = self._table
+        return {
+            word: [table.terms[term_id] for term_id in table.synonyms(word)]
+            for word in table.words()
+        }
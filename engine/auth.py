@@ -0,0 +1,164 @@
+import json
+import os
+import secrets
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Optional
+
+from models import CreateTokenPayload
+
+from .errors import TokenNotFound, Unauthorized
+
+# Permission bits, a token's permissions are any combination of them.
+MODIFY_ENGINE = 1 << 0
+SEARCH_INDEX = 1 << 1
+MODIFY_DOCUMENTS = 1 << 2
+MODIFY_STOP_WORDS = 1 << 3
+MODIFY_AUTH = 1 << 4
+SUPER_USER = MODIFY_ENGINE | SEARCH_INDEX | MODIFY_DOCUMENTS | MODIFY_STOP_WORDS | MODIFY_AUTH
+
+TOKENS_FILE = "tokens.json"
+
+
+class AccessToken:
+    """ A token's permissions and allowed indexes in the form they are checked in. """
+
+    __slots__ = ("token", "permissions", "allowed_indexes", "user", "description", "created")
+
+    def __init__(
+        self,
+        token: str,
+        permissions: int,
+        allowed_indexes: Optional[FrozenSet[str]],
+        user: Optional[str] = None,
+        description: Optional[str] = None,
+        created: Optional[datetime] = None,
+    ):
+        self.token = token
+        self.permissions = permissions
+        self.allowed_indexes = allowed_indexes
+        self.user = user
+        self.description = description
+        self.created = created or datetime.now(timezone.utc)
+
+    @classmethod
+    def from_payload(cls, token: str, payload: CreateTokenPayload, created: Optional[datetime] = None):
+        allowed = payload.allowed_indexes
+        return cls(
+            token,
+            payload.permissions,
+            None if allowed is None else frozenset(allowed),
+            payload.user,
+            payload.description,
+            created,
+        )
+
+    def allows(self, permission: int, index: Optional[str] = None) -> bool:
+        """ Tokens without allowed indexes may access every index. """
+        if self.permissions & permission != permission:
+            return False
+        return index is None or self.allowed_indexes is None or index in self.allowed_indexes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "token": self.token,
+            "permissions": self.permissions,
+            "user": self.user,
+            "description": self.description,
+            "allowed_indexes": None if self.allowed_indexes is None else sorted(self.allowed_indexes),
+            "created": self.created.isoformat(),
+        }
+
+
+class TokenStore:
+    """
+    The access tokens lnx accepts, authorization is only enabled when a
+    super user key is given.
+
+    Tokens are checked on every request so the lookup is a single read of
+    an immutable dict, with each token's permissions already resolved to a
+    bitmask and its allowed indexes to a frozenset. Changes copy the dict
+    and swap it in under a lock which requests never take, so a revoked
+    token is rejected by every request which starts after the swap.
+
+    If a directory is given the tokens are saved to it after each change,
+    the super user key is never saved.
+    """
+
+    def __init__(self, super_user_key: Optional[str] = None, directory: Optional[str] = None):
+        self.enabled = super_user_key is not None
+        self._super_user_key = super_user_key
+        self._path = None if directory is None else os.path.join(directory, TOKENS_FILE)
+        self._lock = threading.Lock()
+
+        tokens: Dict[str, AccessToken] = {}
+        if self._path is not None and os.path.exists(self._path):
+            with open(self._path, encoding="UTF-8") as file:
+                for entry in json.load(file):
+                    created = datetime.fromisoformat(entry.pop("created"))
+                    token = entry.pop("token")
+                    tokens[token] = AccessToken.from_payload(token, CreateTokenPayload(**entry), created)
+        if super_user_key is not None:
+            tokens[super_user_key] = AccessToken(super_user_key, SUPER_USER, None, "super user")
+        self._tokens: Dict[str, AccessToken] = tokens
+
+    def check(self, token: Optional[str], permission: int, index: Optional[str] = None) -> Optional[AccessToken]:
+        """ Raises `Unauthorized` unless the token grants the permission for the index. """
+        if not self.enabled:
+            return None
+
+        access = self._tokens.get(token) if token else None
+        if access is None or not access.allows(permission, index):
+            raise Unauthorized()
+        return access
+
+    def get(self, token: str) -> AccessToken:
+        access = self._tokens.get(token)
+        if access is None:
+            raise TokenNotFound()
+        return access
+
+    def _swap(self, tokens: Dict[str, AccessToken]):
+        self._save(tokens)
+        self._tokens = tokens
+
+    def _save(self, tokens: Dict[str, AccessToken]):
+        if self._path is None:
+            return
+
+        saved = [
+            access.to_dict()
+            for token, access in tokens.items()
+            if token != self._super_user_key
+        ]
+        with open(self._path + ".tmp", "w", encoding="UTF-8") as file:
+            json.dump(saved, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self._path + ".tmp", self._path)
+
+    def create(self, payload: CreateTokenPayload) -> AccessToken:
+        access = AccessToken.from_payload(secrets.token_urlsafe(32), payload)
+        with self._lock:
+            self._swap({**self._tokens, access.token: access})
+        return access
+
+    def edit(self, token: str, payload: CreateTokenPayload) -> AccessToken:
+        """ Replaces every field of a token, keeping the token itself and when it was created. """
+        with self._lock:
+            existing = self.get(token)
+            access = AccessToken.from_payload(token, payload, existing.created)
+            self._swap({**self._tokens, token: access})
+        return access
+
+    def revoke(self, token: str):
+        with self._lock:
+            self.get(token)
+            tokens = dict(self._tokens)
+            del tokens[token]
+            self._swap(tokens)
+
+    def revoke_all(self):
+        """ Revokes every token, including the super user key. """
+        with self._lock:
+            self._swap({})
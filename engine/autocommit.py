@@ -0,0 +1,70 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Once the writes pending since the last commit reach this fraction of the
+# writer buffer the index is committed straight away rather than waiting
+# for the next scheduled commit.
+EARLY_COMMIT_FRACTION = 0.9
+
+
+class CommitScheduler:
+    """
+    Commits an index every `interval` seconds on a background thread.
+
+    Scheduled commits are skipped while nothing is pending, the writer
+    wakes the scheduler early once its pending writes near the writer
+    buffer so each commit publishes close to a full sized segment.
+    """
+
+    def __init__(self, index, interval: int):
+        self.index = index
+        self.interval = interval
+        self.auto_commits = 0
+        self.early_commits = 0
+
+        self._early = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        if interval > 0:
+            index.writer.on_nearly_full = self.notify_nearly_full
+            index.writer.nearly_full_bytes = int(index.writer.buffer_size * EARLY_COMMIT_FRACTION)
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f"{index.name}-committer",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def notify_nearly_full(self):
+        if self._thread is not None:
+            self._early.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            early = self._early.wait(self.interval)
+            self._early.clear()
+            if self._stopped.is_set() or not self.index.writer.has_pending:
+                continue
+
+            try:
+                self.index.commit()
+            except Exception:
+                logger.exception("failed to auto commit index %r", self.index.name)
+                continue
+
+            self.auto_commits += 1
+            if early:
+                self.early_commits += 1
+
+    def shutdown(self):
+        self._stopped.set()
+        self._early.set()
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "auto_commits": self.auto_commits,
+            "early_commits": self.early_commits,
+        }
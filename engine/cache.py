@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ResultCache:
+    """
+    A size bounded LRU cache of search results.
+
+    Entries are keyed on the index generation they were produced at, any
+    change to what a search could return bumps the generation so stale
+    entries can never be served, even if a search started before the
+    change finishes after it.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[int, Optional[Any]]:
+        """
+        Looks up a result, returning the current generation along with it
+        so a miss can be stored against the generation it was computed at.
+        """
+        with self._lock:
+            generation = self.generation
+            if not self.capacity:
+                return generation, None
+
+            result = self._entries.get((generation, key))
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end((generation, key))
+            return generation, result
+
+    def put(self, generation: int, key: Hashable, result: Any):
+        with self._lock:
+            if not self.capacity or generation != self.generation:
+                return
+
+            self._entries[(generation, key)] = result
+            self._entries.move_to_end((generation, key))
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """ Bumps the generation, dropping every cached result. """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "generation": self.generation,
+        }
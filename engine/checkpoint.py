@@ -0,0 +1,59 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Once an index's write-ahead log grows beyond this many bytes its
+# committed segments are saved and the log is cut down.
+CHECKPOINT_LOG_BYTES = 64 * 1024 * 1024
+
+
+class Checkpointer:
+    """
+    Checkpoints a `FileSystem` index on a background thread.
+
+    The checkpointer wakes up after each commit and checkpoints the index
+    once its write-ahead log has grown past `log_bytes`, this bounds both
+    the size of the log and the time it takes to replay it on start up.
+    """
+
+    def __init__(self, index, log_bytes: int = CHECKPOINT_LOG_BYTES):
+        self.index = index
+        self.log_bytes = log_bytes
+        self.checkpoints = 0
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"{index.name}-checkpointer",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                return
+
+            wal = self.index.writer.wal
+            if wal.stats()["log_bytes"] < self.log_bytes:
+                continue
+
+            try:
+                self.index.checkpoint()
+                self.checkpoints += 1
+            except Exception:
+                logger.exception("failed to checkpoint index %r", self.index.name)
+
+    def shutdown(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {"checkpoints": self.checkpoints}
@@ -0,0 +1,92 @@
+import heapq
+from itertools import compress, repeat
+from operator import ge
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from models import SearchCursor
+
+SortValue = Union[int, float]
+
+# (key, -doc_id, segment, ordinal, score, value)
+#
+# Entries are ordered so a larger tuple is always a better hit, the key is
+# the score or sort value negated for ascending sorts, and the negated doc
+# id breaks ties in favour of older documents. Doc ids are unique so two
+# entries never compare beyond the second element.
+Entry = Tuple[SortValue, int, Any, int, float, SortValue]
+
+
+class TopDocs:
+    """
+    Collects the best `k` hits of a search with a bounded heap rather
+    than sorting every match.
+
+    If a `search_after` cursor is given only hits ordered after it are
+    considered, which lets clients page at a constant cost per page.
+    """
+
+    def __init__(self, k: int, descending: bool = True, after: Optional[SearchCursor] = None):
+        self.k = k
+        self.descending = descending
+        self.after: Optional[Tuple[SortValue, int]] = None
+        if after is not None:
+            self.after = (self._key(after.value), -int(after.document_id))
+
+        self.eligible = 0
+        self._heap: List[Entry] = []
+
+    def _key(self, value: SortValue) -> SortValue:
+        return value if self.descending else -value
+
+    def collect(self, segment: Any, entries: Iterable[Tuple[int, float, SortValue]]):
+        """ Collects `(ordinal, score, value)` hits from a single segment. """
+        heap, k, after, descending = self._heap, self.k, self.after, self.descending
+        doc_ids = segment.doc_ids
+        for ordinal, score, value in entries:
+            entry = (value if descending else -value, -doc_ids[ordinal], segment, ordinal, score, value)
+            if after is not None and entry[:2] >= after:
+                continue
+
+            self.eligible += 1
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    def collect_scores(self, segment: Any, scores: Dict[int, float]):
+        """
+        Collects hits ordered by score from a single segment.
+
+        Broad queries can match far more documents than are kept, so when
+        no cursor is given the `k`th best score is found first with
+        `heapq.nlargest` and only the matches scoring at least as well,
+        ties included, are pushed through the heap.
+        """
+        if self.after is not None or not self.descending or len(scores) <= self.k:
+            self.collect(segment, ((ordinal, score, score) for ordinal, score in scores.items()))
+            return
+
+        values = scores.values()
+        threshold = heapq.nlargest(self.k, values)[-1]
+        candidates = list(compress(scores.items(), map(ge, values, repeat(threshold))))
+        self.eligible += len(scores) - len(candidates)
+        self.collect(segment, ((ordinal, score, score) for ordinal, score in candidates))
+
+    def merge(self, other: "TopDocs"):
+        """ Merges the hits collected by another collector, e.g. from another segment. """
+        heap, k = self._heap, self.k
+        self.eligible += other.eligible
+        for entry in other._heap:
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    def top(self) -> List[Entry]:
+        """ The collected hits, best first. """
+        return sorted(self._heap, reverse=True)
+
+    @staticmethod
+    def cursor(entry: Entry) -> Dict[str, Any]:
+        """ The cursor which continues a search after the given hit. """
+        return {"value": entry[5], "document_id": str(-entry[1])}
@@ -0,0 +1,160 @@
+import json
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence
+
+# Documents are packed into blocks of at least this many uncompressed bytes.
+BLOCK_BYTES = 16 * 1024
+
+# The memory a cached block holds per document beyond its encoded bytes.
+_DOC_OVERHEAD = sys.getsizeof(b"") + 8
+
+
+class BlockCache:
+    """
+    A memory bounded LRU cache of decompressed document store blocks.
+
+    A single cache is shared by every segment of an index, blocks are
+    keyed on their store so entries of a merged away segment are simply
+    evicted over time.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._blocks: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[List[bytes]]:
+        with self._lock:
+            entry = self._blocks.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._blocks.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, docs: List[bytes], size: int):
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._blocks:
+                return
+            self._blocks[key] = (docs, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._blocks.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "blocks": len(self._blocks),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class DocStore:
+    """
+    The stored fields of a segment's documents packed into compressed blocks.
+
+    Documents are encoded as JSON lines and packed in ordinal order into
+    blocks of at least `BLOCK_BYTES`, each compressed on its own. The
+    first ordinal of block `b` is `starts[b]` so finding an ordinal's
+    block is a binary search, and the compressed block lives at
+    `offsets[b]:offsets[b + 1]` within `blocks`.
+
+    The arrays may be `array`s or memory mapped views of a segment file.
+    """
+
+    __slots__ = ("blocks", "offsets", "starts", "key")
+
+    def __init__(self, blocks: Sequence[int], offsets: Sequence[int], starts: Sequence[int]):
+        self.blocks = blocks
+        self.offsets = offsets
+        self.starts = starts
+        # Unique to this store within the process, including once unpickled.
+        self.key = object()
+
+    @classmethod
+    def build(cls, docs: Iterable[Dict[str, Any]]) -> "DocStore":
+        return cls.from_raw(json.dumps(doc, separators=(",", ":")).encode() for doc in docs)
+
+    @classmethod
+    def from_raw(cls, docs: Iterable[bytes]) -> "DocStore":
+        """ Packs documents which are already JSON encoded, e.g. read from other stores. """
+        blocks = bytearray()
+        offsets = array("Q", [0])
+        starts = array("I", [0])
+
+        pending: List[bytes] = []
+        size = 0
+        count = 0
+        for doc in docs:
+            pending.append(doc)
+            size += len(doc) + 1
+            count += 1
+            if size >= BLOCK_BYTES:
+                blocks += zlib.compress(b"\n".join(pending))
+                offsets.append(len(blocks))
+                starts.append(count)
+                pending, size = [], 0
+
+        if pending:
+            blocks += zlib.compress(b"\n".join(pending))
+            offsets.append(len(blocks))
+            starts.append(count)
+        return cls(bytes(blocks), offsets, starts)
+
+    def __len__(self) -> int:
+        return self.starts[-1]
+
+    @property
+    def nbytes(self) -> int:
+        """ The compressed size of every block. """
+        return self.offsets[-1]
+
+    def _block(self, block: int, cache: Optional[BlockCache]) -> List[bytes]:
+        if cache is not None:
+            docs = cache.get((self.key, block))
+            if docs is not None:
+                return docs
+
+        data = zlib.decompress(self.blocks[self.offsets[block]:self.offsets[block + 1]])
+        docs = data.split(b"\n")
+        if cache is not None:
+            cache.put((self.key, block), docs, len(data) + _DOC_OVERHEAD * len(docs))
+        return docs
+
+    def raw(self, ordinal: int, cache: Optional[BlockCache] = None) -> bytes:
+        block = bisect_right(self.starts, ordinal) - 1
+        return self._block(block, cache)[ordinal - self.starts[block]]
+
+    def get_many(self, ordinals: Sequence[int], cache: Optional[BlockCache] = None) -> List[Dict[str, Any]]:
+        """ Reads several documents, decompressing each block they sit in once. """
+        blocks: Dict[int, List[bytes]] = {}
+        docs = []
+        for ordinal in ordinals:
+            block = bisect_right(self.starts, ordinal) - 1
+            entries = blocks.get(block)
+            if entries is None:
+                entries = blocks[block] = self._block(block, cache)
+            docs.append(json.loads(entries[ordinal - self.starts[block]]))
+        return docs
+
+    def __getitem__(self, ordinal: int) -> Dict[str, Any]:
+        return json.loads(self.raw(ordinal))
@@ -0,0 +1,143 @@
+import logging
+import os
+import shutil
+import threading
+from typing import BinaryIO, Dict, List, Optional
+
+from models import IndexDeclaration, StorageType
+
+from .errors import DataDirectoryInUse, IndexAlreadyExists, IndexNotFound, InvalidSchema
+from .index import Index
+from .snapshot import DEFAULT_SNAPSHOT_THREADS, create_snapshot
+from .storage import DECLARATION_FILE
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = ".lock"
+
+
+def lock_data_dir(data_dir: str) -> Optional[BinaryIO]:
+    """
+    Takes the lock on a data directory, raising `DataDirectoryInUse` if
+    another engine holds it. The lock is held until the returned file is
+    closed, or not taken at all on platforms without `fcntl`.
+    """
+    if fcntl is None:
+        return None
+
+    file = open(os.path.join(data_dir, LOCK_FILE), "ab")
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        file.close()
+        raise DataDirectoryInUse(data_dir) from None
+    return file
+
+
+class Engine:
+    """
+    The registry of every index being served.
+
+    `FileSystem` indexes are kept in their own directory within
+    `data_dir` and are reopened when the engine starts, `TempDir`
+    indexes only ever live in memory. The data directory is locked while
+    the engine is open, as opening an index recovers and rewrites its files.
+    """
+
+    def __init__(self, data_dir: Optional[str] = None):
+        self.data_dir = data_dir
+        self._indexes: Dict[str, Index] = {}
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._dir_lock: Optional[BinaryIO] = None
+
+        if data_dir is not None:
+            os.makedirs(data_dir, exist_ok=True)
+            self._dir_lock = lock_data_dir(data_dir)
+            self._open_indexes()
+
+    def _open_indexes(self):
+        for name in sorted(os.listdir(self.data_dir)):
+            path = os.path.join(self.data_dir, name, DECLARATION_FILE)
+            if not os.path.isfile(path):
+                continue
+
+            declaration = IndexDeclaration.parse_file(path)
+            logger.info("recovering index %r", declaration.name)
+            self._indexes[declaration.name] = Index(declaration, os.path.dirname(path))
+
+    def _index_dir(self, declaration: IndexDeclaration) -> Optional[str]:
+        """ The directory a new index is kept in, if it's kept on disk at all. """
+        if self.data_dir is None or declaration.storage_type != StorageType.FileSystem:
+            return None
+
+        name = declaration.name
+        if name in (".", "..") or os.path.basename(name) != name:
+            raise InvalidSchema(f"index name {name!r} cannot be used as a directory name")
+        return os.path.join(self.data_dir, name)
+
+    def _remove_index_dir(self, index: Index):
+        if index.directory is not None:
+            shutil.rmtree(index.directory, ignore_errors=True)
+
+    def create_index(self, declaration: IndexDeclaration, override: bool = False) -> Index:
+        with self._lock:
+            existing = self._indexes.get(declaration.name)
+            if existing is not None and not override:
+                raise IndexAlreadyExists(declaration.name)
+
+            directory = self._index_dir(declaration)
+            if existing is not None:
+                existing.close()
+                self._remove_index_dir(existing)
+
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+                os.makedirs(directory)
+                with open(os.path.join(directory, DECLARATION_FILE), "w", encoding="UTF-8") as file:
+                    file.write(declaration.json())
+
+            index = Index(declaration, directory)
+            self._indexes[declaration.name] = index
+            return index
+
+    def delete_index(self, name: str):
+        with self._lock:
+            index = self._indexes.pop(name, None)
+            if index is None:
+                raise IndexNotFound(name)
+            index.close()
+            self._remove_index_dir(index)
+
+    def close(self):
+        """ Closes every index and releases the data directory. """
+        with self._lock:
+            for index in self._indexes.values():
+                index.close()
+            self._indexes.clear()
+            if self._dir_lock is not None:
+                self._dir_lock.close()
+                self._dir_lock = None
+
+    def indexes(self) -> List[Index]:
+        return list(self._indexes.values())
+
+    def snapshot(self, directory: str, threads: int = DEFAULT_SNAPSHOT_THREADS) -> str:
+        """
+        Snapshots every `FileSystem` index, returning the snapshot's path.
+
+        Snapshots are taken one at a time, as each builds on the latest.
+        """
+        with self._snapshot_lock:
+            return create_snapshot(self, directory, threads)
+
+    def get_index(self, name: str) -> Index:
+        index = self._indexes.get(name)
+        if index is None:
+            raise IndexNotFound(name)
+        return index
@@ -0,0 +1,71 @@
+class EngineError(Exception):
+    """ The base error for anything the engine rejects. """
+
+
+class IndexNotFound(EngineError):
+    """ The given index does not exist. """
+
+    def __init__(self, index: str):
+        super().__init__(f"index {index!r} does not exist")
+
+
+class IndexAlreadyExists(EngineError):
+    """ The given index already exists and override has not been set. """
+
+    def __init__(self, index: str):
+        super().__init__(f"index {index!r} already exists")
+
+
+class InvalidSchema(EngineError):
+    """ The index declaration was rejected by the engine. """
+
+
+class InvalidDocument(EngineError):
+    """ A document does not conform to the index schema. """
+
+
+class InvalidQuery(EngineError):
+    """ The query is malformed or references unknown fields. """
+
+
+class InvalidSynonym(EngineError):
+    """ A synonym line does not follow the `<words>:<synonyms>` format. """
+
+
+class ServerOverloaded(EngineError):
+    """ Too many searches are already running or queued for the index, or it's shutting down. """
+
+    def __init__(self, message: str = "too many searches are queued, try again later"):
+        super().__init__(message)
+
+
+class DocumentNotFound(EngineError):
+    """ No document exists with the given id. """
+
+    def __init__(self, document_id: int):
+        super().__init__(f"document {document_id} does not exist")
+
+
+class InvalidSnapshot(EngineError):
+    """ A snapshot is missing, incomplete or from an unsupported version. """
+
+
+class DataDirectoryInUse(EngineError):
+    """ Another engine already has the data directory open. """
+
+    def __init__(self, data_dir: str):
+        super().__init__(f"data directory {data_dir!r} is in use by another lnx process")
+
+
+class Unauthorized(EngineError):
+    """ The request's token is missing, unknown or lacks the permission needed. """
+
+    def __init__(self):
+        super().__init__("you lack the permissions to run this operation")
+
+
+class TokenNotFound(EngineError):
+    """ No access token exists with the given value. """
+
+    def __init__(self):
+        super().__init__("the given token does not exist")
@@ -0,0 +1,131 @@
+from array import array
+from collections import Counter
+from itertools import chain
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from models import FieldType
+
+from .schema import Document, Schema
+
+
+def ancestors(path: str) -> List[str]:
+    """ A facet path and every path above it, e.g. `/a/b` is `/a` and `/a/b`. """
+    if path == "/":
+        return []
+    parts = path.split("/")
+    return ["/".join(parts[:depth]) for depth in range(2, len(parts) + 1)]
+
+
+class FacetColumn:
+    """
+    The facet paths of each document of a facet field within a segment.
+
+    Every distinct path and each of its ancestors is given an ordinal in
+    sorted path order, a document is tagged with the ordinals of its paths
+    and their ancestors so the count of a path includes every document
+    below it.
+
+    Documents share few distinct sets of paths, so each distinct set is
+    stored once and `sets[d]` is the set of document `d`. The ordinals of
+    set `s` live at `offsets[s]:offsets[s + 1]` within the shared
+    `ordinals` array. Counting the paths of a set of documents is then a
+    bincount over a single value per document, only the distinct sets
+    found are expanded into their paths.
+
+    The arrays may be `array`s or memory mapped views of a segment file,
+    `paths` is any mapping of each path to its ordinal.
+    """
+
+    __slots__ = ("paths", "sets", "offsets", "ordinals", "_names", "_parents")
+
+    def __init__(
+        self,
+        paths: Mapping[str, int],
+        sets: Sequence[int],
+        offsets: Sequence[int],
+        ordinals: Sequence[int],
+    ):
+        self.paths = paths
+        self.sets = sets
+        self.offsets = offsets
+        self.ordinals = ordinals
+        self._names: Optional[List[str]] = None
+        self._parents: Optional[array] = None
+
+    @classmethod
+    def build(cls, paths_per_doc: Iterable[List[str]]) -> "FacetColumn":
+        set_ids: Dict[Tuple[str, ...], int] = {}
+        sets = array("I")
+        for doc_paths in paths_per_doc:
+            tagged = tuple(sorted(set(chain.from_iterable(map(ancestors, doc_paths)))))
+            set_id = set_ids.get(tagged)
+            if set_id is None:
+                set_id = set_ids[tagged] = len(set_ids)
+            sets.append(set_id)
+
+        paths = {path: ordinal for ordinal, path in enumerate(sorted(set(chain.from_iterable(set_ids))))}
+        offsets = array("Q", [0])
+        ordinals = array("I")
+        for tagged in set_ids:
+            ordinals.extend(map(paths.__getitem__, tagged))
+            offsets.append(len(ordinals))
+        return cls(paths, sets, offsets, ordinals)
+
+    @classmethod
+    def merge(cls, columns: List["FacetColumn"], order: List[Tuple[int, int, int]]) -> "FacetColumn":
+        """ Merges the columns of several segments in the merged document order. """
+        return cls.build(columns[i].get(ordinal) for _, i, ordinal in order)
+
+    def __len__(self) -> int:
+        return len(self.sets)
+
+    @property
+    def names(self) -> List[str]:
+        """ Every path, indexed by its ordinal. """
+        if self._names is None:
+            if hasattr(self.paths, "term"):
+                self._names = [self.paths.term(ordinal) for ordinal in range(len(self.paths))]
+            else:
+                self._names = list(self.paths)
+        return self._names
+
+    @property
+    def parents(self) -> array:
+        """ The ordinal of each path's parent, or -1 for top level paths. """
+        if self._parents is None:
+            paths = self.paths
+            self._parents = array("q", (paths.get(name.rpartition("/")[0], -1) for name in self.names))
+        return self._parents
+
+    def _set(self, set_id: int) -> Sequence[int]:
+        return self.ordinals[self.offsets[set_id]:self.offsets[set_id + 1]]
+
+    def get(self, ordinal: int) -> List[str]:
+        """ The paths of a single document, ancestors included. """
+        names = self.names
+        return [names[path] for path in self._set(self.sets[ordinal])]
+
+    def count(self, ordinals: Iterable[int]) -> Dict[int, int]:
+        """ The number of the given documents tagged with each path ordinal. """
+        counts: Dict[int, int] = {}
+        for set_id, num_docs in Counter(map(self.sets.__getitem__, ordinals)).items():
+            for path in self._set(set_id):
+                counts[path] = counts.get(path, 0) + num_docs
+        return counts
+
+    def children(self, counts: Dict[int, int], path: str) -> Dict[str, int]:
+        """ The counts of the paths directly below a path. """
+        parent = -1 if path == "/" else self.paths.get(path)
+        if parent is None:
+            return {}
+        names, parents = self.names, self.parents
+        return {names[ordinal]: count for ordinal, count in counts.items() if parents[ordinal] == parent}
+
+
+def build_facets(schema: Schema, documents: List[Tuple[int, Document]]) -> Dict[str, FacetColumn]:
+    """ Builds a column for every facet fast field in the schema. """
+    return {
+        field.name: FacetColumn.build(doc[field.name] for _, doc in documents)
+        for field in schema.fields.values()
+        if field.fast and field.type == FieldType.Facet
+    }
@@ -0,0 +1,176 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain, compress, repeat
+from operator import and_, ge, gt, itemgetter, le, lt, sub
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from models import FieldType
+
+from .schema import Document, Schema
+
+# The array typecode each numeric fast field is stored as, dates are
+# stored as their i64 unix timestamp.
+TYPECODES = {
+    FieldType.F64: "d",
+    FieldType.U64: "Q",
+    FieldType.I64: "q",
+    FieldType.Date: "q",
+}
+
+
+class FastFieldColumn:
+    """
+    A contiguous, typed column of a fast field's values indexed by doc ordinal.
+
+    Single valued fields are one value per document, multi valued fields
+    use an offsets + values layout where the values of document `d` live
+    at `values[offsets[d]:offsets[d + 1]]`.
+
+    Alongside the column every value is kept in ascending order in
+    `sorted_values`, with the ordinal of the document holding it at the
+    same position of `sorted_ordinals`, so the documents with a value
+    within a range are a contiguous run found by two binary searches.
+
+    Columns can be backed by an `array` or any buffer cast to the same
+    typecode, e.g. a memory mapped segment file.
+    """
+
+    __slots__ = ("typecode", "values", "offsets", "sorted_values", "sorted_ordinals")
+
+    def __init__(
+        self,
+        typecode: str,
+        values: Sequence,
+        offsets: Optional[Sequence[int]],
+        sorted_values: Sequence,
+        sorted_ordinals: Sequence[int],
+    ):
+        self.typecode = typecode
+        self.values = values
+        self.offsets = offsets
+        self.sorted_values = sorted_values
+        self.sorted_ordinals = sorted_ordinals
+
+    @classmethod
+    def build(cls, typecode: str, values_per_doc: Iterable[List[Any]], multi: bool) -> "FastFieldColumn":
+        values = array(typecode)
+        offsets = None
+        if not multi:
+            values.extend(doc_values[-1] for doc_values in values_per_doc)
+        else:
+            offsets = array("Q", [0])
+            for doc_values in values_per_doc:
+                values.extend(doc_values)
+                offsets.append(len(values))
+
+        order = sorted(range(len(values)), key=values.__getitem__)
+        if multi:
+            counts = map(sub, offsets[1:], offsets[:-1])
+            owners = array("I", chain.from_iterable(map(repeat, range(len(offsets) - 1), counts)))
+            sorted_ordinals = array("I", map(owners.__getitem__, order))
+        else:
+            sorted_ordinals = array("I", order)
+        sorted_values = array(typecode, map(values.__getitem__, order))
+        return cls(typecode, values, offsets, sorted_values, sorted_ordinals)
+
+    @classmethod
+    def merge(cls, columns: List["FastFieldColumn"], order: List[Tuple[int, int, int]]) -> "FastFieldColumn":
+        """ Merges the columns of several segments in the merged document order. """
+        first = columns[0]
+        return cls.build(
+            first.typecode,
+            (columns[i].get(ordinal) for _, i, ordinal in order),
+            first.multi,
+        )
+
+    @property
+    def multi(self) -> bool:
+        return self.offsets is not None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1 if self.multi else len(self.values)
+
+    def get(self, ordinal: int) -> Sequence:
+        """ All the values of a single document. """
+        if not self.multi:
+            return self.values[ordinal:ordinal + 1]
+        return self.values[self.offsets[ordinal]:self.offsets[ordinal + 1]]
+
+    def gather(self, ordinals: List[int], descending: bool = False) -> List:
+        """
+        Gathers the sort value of each ordinal, multi valued documents
+        sort by their smallest value ascending or largest descending.
+        """
+        if not ordinals:
+            return []
+        if not self.multi:
+            if len(ordinals) == 1:
+                return [self.values[ordinals[0]]]
+            return list(itemgetter(*ordinals)(self.values))
+
+        pick = max if descending else min
+        values, offsets = self.values, self.offsets
+        return [pick(values[offsets[o]:offsets[o + 1]]) for o in ordinals]
+
+    def value_range(
+        self,
+        low: Optional[Union[int, float]] = None,
+        high: Optional[Union[int, float]] = None,
+        include_low: bool = True,
+        include_high: bool = True,
+    ) -> Sequence[int]:
+        """
+        The ordinals of the documents with a value within a range, an
+        unset bound is unbounded. Documents of multi valued fields appear
+        once per value within the range.
+        """
+        values = self.sorted_values
+        start, stop = 0, len(values)
+        if low is not None:
+            start = bisect_left(values, low) if include_low else bisect_right(values, low)
+        if high is not None:
+            stop = bisect_right(values, high) if include_high else bisect_left(values, high)
+        if start >= stop:
+            return ()
+        return memoryview(self.sorted_ordinals)[start:stop]
+
+    def scan_range(
+        self,
+        low: Optional[Union[int, float]] = None,
+        high: Optional[Union[int, float]] = None,
+        include_low: bool = True,
+        include_high: bool = True,
+    ) -> Iterable[int]:
+        """
+        The same as `value_range` for single valued columns but compares
+        every value of the column, yielding the ordinals in ascending
+        order. Comparing is done by `map` so it costs less per document
+        than inserting the scattered ordinals of a broad range does.
+        """
+        values = self.values
+        checks = []
+        if low is not None:
+            checks.append(map(ge if include_low else gt, values, repeat(low)))
+        if high is not None:
+            checks.append(map(le if include_high else lt, values, repeat(high)))
+        if not checks:
+            return range(len(values))
+        selected = checks[0] if len(checks) == 1 else map(and_, *checks)
+        return compress(range(len(values)), selected)
+
+
+def build_columns(
+    schema: Schema,
+    documents: List[Tuple[int, Document]],
+) -> Dict[str, FastFieldColumn]:
+    """ Builds a column for every numeric fast field in the schema. """
+    columns = {}
+    for field in schema.fields.values():
+        typecode = TYPECODES.get(field.type)
+        if field.fast and typecode is not None:
+            columns[field.name] = FastFieldColumn.build(
+                typecode,
+                (doc[field.name] for _, doc in documents),
+                field.multi,
+            )
+    return columns
@@ -0,0 +1,89 @@
+from array import array
+from typing import Dict, Iterable, List, Set, Tuple
+
+from .query import edit_distance, max_edits
+
+# The largest edit distance any term is allowed, see `max_edits`.
+MAX_EDIT_DISTANCE = 2
+
+# Only the first few characters of a term generate delete variants, which
+# bounds the size of the index for long terms. Candidates are always
+# verified against the full term afterwards.
+PREFIX_LENGTH = 7
+
+
+def deletes(word: str, distance: int) -> Set[str]:
+    """ Every variant of `word` with up to `distance` characters deleted. """
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        next_frontier = set()
+        for variant in frontier:
+            if len(variant) <= 1:
+                continue
+            for i in range(len(variant)):
+                next_frontier.add(variant[:i] + variant[i + 1:])
+        next_frontier -= variants
+        variants |= next_frontier
+        frontier = next_frontier
+    return variants
+
+
+class FuzzyIndex:
+    """
+    A symmetric delete (SymSpell style) index over a field's vocabulary.
+
+    Every term is registered under each variant of its prefix with up to
+    `MAX_EDIT_DISTANCE` characters deleted. A query term then only needs
+    to look up its own delete variants to find every candidate within its
+    edit distance, rather than comparing itself against the whole
+    vocabulary.
+    """
+
+    def __init__(self):
+        self._terms: List[str] = []
+        self._term_ids: Dict[str, int] = {}
+        self._deletes: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add(self, terms: Iterable[str]):
+        """ Adds any new terms to the index, existing terms are skipped. """
+        for term in terms:
+            if term in self._term_ids:
+                continue
+
+            term_id = len(self._terms)
+            self._terms.append(term)
+            self._term_ids[term] = term_id
+
+            for variant in deletes(term[:PREFIX_LENGTH], MAX_EDIT_DISTANCE):
+                ids = self._deletes.get(variant)
+                if ids is None:
+                    self._deletes[variant] = array("I", (term_id,))
+                else:
+                    ids.append(term_id)
+
+    def candidates(self, word: str) -> List[Tuple[str, int]]:
+        """ Every indexed term within the word's edit distance, with its distance. """
+        limit = max_edits(word)
+        prefix = word[:PREFIX_LENGTH]
+
+        seen = set()
+        matches = []
+        for variant in deletes(prefix, limit):
+            ids = self._deletes.get(variant)
+            if ids is None:
+                continue
+
+            for term_id in ids:
+                if term_id in seen:
+                    continue
+                seen.add(term_id)
+
+                term = self._terms[term_id]
+                distance = edit_distance(word, term, limit)
+                if distance <= limit:
+                    matches.append((term, distance))
+        return matches
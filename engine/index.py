@@ -0,0 +1,665 @@
+import heapq
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from models import FacetQuery, FieldType, IndexDeclaration, QueryPayload, Sort
+
+from .analyzer import StopWords, Synonyms
+from .autocommit import CommitScheduler
+from .cache import ResultCache
+from .checkpoint import Checkpointer
+from .doc_store import BlockCache
+from .collector import TopDocs
+from .errors import DocumentNotFound, InvalidQuery
+from .fast_fields import TYPECODES
+from .fuzzy import FuzzyIndex
+from .merge import BackgroundMerger, TieredMergePolicy
+from .query import Query, QueryCompiler, Searcher, query_term
+from .readers import ReaderPool
+from .schema import Schema
+from .segment import Segment
+from .storage import (
+    load_segments,
+    open_segment,
+    remove_unused_segments,
+    segment_path,
+    write_segment,
+    write_segment_list,
+)
+from .tombstones import Tombstones
+from .wal import WriteAheadLog
+from .writer import (
+    OP_ADD_SEGMENT,
+    OP_CLEAR,
+    OP_DELETE_IDS,
+    OP_DELETE_TERMS,
+    BulkWriter,
+    IndexWriter,
+    RawDocument,
+)
+
+
+class Index:
+    """
+    A single index, its committed segments and its pending writes.
+
+    Writes are queued until `commit` is called, readers only ever see
+    the tuple of segments published by the last commit.
+
+    Indexes given a directory keep a write-ahead log in it, the committed
+    segments are periodically checkpointed into the directory as memory
+    mapped segment files. When opened the index maps the saved segments
+    and replays the log written since the checkpoint on top of them.
+    """
+
+    def __init__(self, declaration: IndexDeclaration, directory: Optional[str] = None):
+        self.declaration = declaration
+        self.directory = directory
+        self.name = declaration.name
+        self.schema = Schema(declaration)
+        self.stop_words = StopWords()
+        self.synonyms = Synonyms()
+        self.cache = ResultCache(declaration.result_cache_size)
+        self.more_like_this_cache = ResultCache(declaration.result_cache_size)
+        self.doc_cache = BlockCache(declaration.doc_cache_bytes)
+        self.readers = ReaderPool(
+            self.name,
+            declaration.max_concurrency,
+            declaration.reader_threads,
+        )
+
+        self.writer = IndexWriter(
+            self.name,
+            self.schema,
+            declaration.writer_buffer,
+            declaration.writer_threads,
+            declaration.writer_processes,
+        )
+
+        self._segments: Tuple[Segment, ...] = ()
+        self._commit_lock = threading.Lock()
+        self.fuzzy_indexes: Dict[str, FuzzyIndex] = self._new_fuzzy_indexes()
+        self.merger = BackgroundMerger(self, TieredMergePolicy())
+
+        self.commits = 0
+        self.last_commit_duration = 0.0
+        self.total_commit_duration = 0.0
+
+        # The ids of the segments with a file in the index directory.
+        self._segment_files: Set[str] = set()
+        self._checkpoint_lock = threading.Lock()
+        self.checkpointer: Optional[Checkpointer] = None
+
+        if directory is not None:
+            segments, checkpoint = load_segments(directory)
+            self._segments = tuple(segments)
+            self._segment_files = {segment.segment_id for segment in segments}
+            remove_unused_segments(directory, self._segment_files)
+            self._update_fuzzy_indexes((), False)
+
+            wal = WriteAheadLog(directory)
+            for record in wal.records(after=checkpoint):
+                if self.writer.replay(record):
+                    self.commit()
+            self.writer.wal = wal
+            self.checkpointer = Checkpointer(self)
+
+        self.committer = CommitScheduler(self, declaration.auto_commit)
+
+    def _new_fuzzy_indexes(self) -> Dict[str, FuzzyIndex]:
+        if not self.declaration.use_fast_fuzzy:
+            return {}
+        return {
+            field.name: FuzzyIndex()
+            for field in self.schema.indexed_fields
+            if field.tokenized
+        }
+
+    def _update_fuzzy_indexes(self, previous: Tuple[Segment, ...], cleared: bool):
+        """ Adds the vocabulary of newly published segments to the fuzzy indexes. """
+        if not self.fuzzy_indexes:
+            return
+        if cleared:
+            self.fuzzy_indexes = self._new_fuzzy_indexes()
+
+        published = {segment.segment_id for segment in previous}
+        new_segments = [segment for segment in self._segments if segment.segment_id not in published]
+        for name, fuzzy_index in self.fuzzy_indexes.items():
+            for segment in new_segments:
+                fuzzy_index.add(segment.fields[name].vocabulary())
+
+    @property
+    def segments(self) -> Tuple[Segment, ...]:
+        return self._segments
+
+    @property
+    def num_docs(self) -> int:
+        return sum(segment.num_live for segment in self._segments)
+
+    def _invalidate_caches(self):
+        """ Drops the cached results and more-like-this terms, called on any change a search could see. """
+        self.cache.invalidate()
+        self.more_like_this_cache.invalidate()
+
+    def searcher(self) -> Searcher:
+        # The generation is read first so results can never be cached against a newer one.
+        generation = self.cache.generation
+        return Searcher(self, self._segments, generation)
+
+    def add_documents(self, documents: Union[RawDocument, List[RawDocument]]) -> int:
+        """
+        Validates and queues documents to be added on the next commit.
+
+        If any document is invalid the entire batch is rejected.
+        """
+        if not isinstance(documents, list):
+            documents = [documents]
+        validated = [self.schema.validate(doc) for doc in documents]
+        self.writer.add(validated)
+        return len(validated)
+
+    def bulk_writer(self) -> BulkWriter:
+        """
+        Starts staging a stream of documents, if the stream fails part way
+        through none of its documents are added.
+        """
+        return BulkWriter(self.writer)
+
+    def _term_matches(self, searcher: Searcher, terms: Dict[str, List[str]]) -> int:
+        count = 0
+        for segment in searcher.segments:
+            matched = set()
+            for field, values in terms.items():
+                for value in values:
+                    matched.update(segment.term_ordinals(field, value))
+            deleted = segment.deleted
+            count += sum(1 for ordinal in matched if ordinal not in deleted)
+        return count
+
+    def delete_by_terms(self, payload: Union[RawDocument, List[RawDocument]]) -> int:
+        """
+        Queues the deletion of every document containing any of the
+        given field terms, returning the number currently matching.
+
+        Keyed fast fields are looked up in their key index, so deleting a
+        batch of unique keys costs a hash lookup per key and segment.
+        """
+        if not isinstance(payload, list):
+            payload = [payload]
+
+        terms: Dict[str, List[str]] = {}
+        for entry in payload:
+            for name, values in entry.items():
+                if name not in self.schema:
+                    raise InvalidQuery(f"field {name!r} is not declared")
+                field = self.schema[name]
+                if not field.indexed and not field.keyed:
+                    raise InvalidQuery(f"field {name!r} must be indexed or a fast field")
+                if not isinstance(values, list):
+                    values = [values]
+                terms.setdefault(name, []).extend(
+                    query_term(field, str(value)) for value in values
+                )
+
+        matched = self._term_matches(self.searcher(), terms)
+        self.writer.queue(OP_DELETE_TERMS, terms)
+        return matched
+
+    def delete_by_query(self, payload: QueryPayload, all_matches: bool = False) -> int:
+        """
+        Queues the deletion of the documents within the query's page, or
+        of every document matching the query if `all_matches` is set.
+        Returns the number of documents which will be deleted.
+
+        Deleting every match scores each segment once without collecting
+        any hits, rather than paging through the results.
+        """
+        if not all_matches:
+            hits = self.search(payload)["hits"]
+            self.delete_by_ids([int(hit["document_id"]) for hit in hits])
+            return len(hits)
+
+        searcher = self.searcher()
+        query = QueryCompiler(searcher).compile(payload.query)
+        doc_ids = []
+        for segment in searcher.segments:
+            ids = segment.doc_ids
+            doc_ids.extend(ids[ordinal] for ordinal in query.evaluate(searcher, segment))
+
+        self.delete_by_ids(doc_ids)
+        return len(doc_ids)
+
+    def delete_by_ids(self, doc_ids: List[int]):
+        self.writer.queue(OP_DELETE_IDS, frozenset(doc_ids))
+
+    def clear(self):
+        self.writer.queue(OP_CLEAR)
+        self._invalidate_caches()
+
+    def commit(self):
+        """
+        Applies every pending operation in order and publishes the
+        resulting segments, waiting for any segments still being built.
+
+        Returns once the commit is durable, the log is synced outside the
+        commit lock so concurrent commits can share a single sync.
+        """
+        start = time.perf_counter()
+        with self._commit_lock:
+            ops, position = self.writer.take()
+            if not ops:
+                return
+
+            previous = self._segments
+            segments = list(previous)
+            # Deletes are applied to copies of the published tombstones, which
+            # are published along with the new segments.
+            copied: Set[int] = set()
+
+            def delete(i: int, ordinals: Iterable[int]):
+                segment = segments[i]
+                ordinals = [ordinal for ordinal in ordinals if ordinal not in segment.deleted]
+                if not ordinals:
+                    return
+                if i not in copied:
+                    segment = segments[i] = segment.with_deleted(segment.deleted.copy())
+                    copied.add(i)
+                segment.deleted.update(ordinals)
+
+            cleared = False
+            for op in ops:
+                kind = op[0]
+                if kind == OP_ADD_SEGMENT:
+                    segments.append(op[1].result())
+                    # Segments built in this commit aren't published yet.
+                    copied.add(len(segments) - 1)
+                elif kind == OP_CLEAR:
+                    segments.clear()
+                    copied.clear()
+                    cleared = True
+                elif kind == OP_DELETE_IDS:
+                    doc_ids = sorted(op[1])
+                    for i, segment in enumerate(segments):
+                        delete(i, segment.find_all(doc_ids))
+                elif kind == OP_DELETE_TERMS:
+                    for i, segment in enumerate(segments):
+                        for field, values in op[1].items():
+                            for value in values:
+                                delete(i, segment.term_ordinals(field, value))
+
+            self._segments = tuple(segment for segment in segments if segment.num_live)
+            self._update_fuzzy_indexes(previous, cleared)
+            self._invalidate_caches()
+
+        self.writer.sync(position)
+        self.merger.notify()
+        if self.checkpointer is not None:
+            self.checkpointer.notify()
+
+        duration = time.perf_counter() - start
+        self.commits += 1
+        self.last_commit_duration = duration
+        self.total_commit_duration += duration
+
+    def pin(self) -> Tuple[Tuple[Segment, ...], List[Tombstones]]:
+        """
+        The committed segments along with a copy of their deleted ordinals,
+        taken together so no commit or merge can land in between.
+        """
+        with self._commit_lock:
+            segments = self._segments
+            return segments, [segment.deleted.copy() for segment in segments]
+
+    def merge_segments(self, sources: List[Segment]) -> bool:
+        """
+        Merges committed segments into one, returning `False` if the
+        sources were replaced by a commit while merging.
+
+        The merged segment is built without holding the commit lock,
+        deletes committed in the meantime are carried over when it's
+        swapped in.
+        """
+        with self._commit_lock:
+            deleted = [segment.deleted.copy() for segment in sources]
+
+        merged = Segment.merge(uuid.uuid4().hex, sources, deleted)
+        if self.directory is not None:
+            merged = self._save_segment(merged)
+
+        with self._commit_lock:
+            # Commits publish copies of segments they delete from, so sources are matched by id.
+            current = {segment.segment_id: segment for segment in self._segments}
+            if any(source.segment_id not in current for source in sources):
+                if self.directory is not None:
+                    os.remove(segment_path(self.directory, merged.segment_id))
+                return False
+
+            for source, snapshot in zip(sources, deleted):
+                for ordinal in current[source.segment_id].deleted.difference(snapshot):
+                    merged_ordinal = merged.find(source.doc_ids[ordinal])
+                    if merged_ordinal is not None:
+                        merged.deleted.add(merged_ordinal)
+
+            source_ids = {source.segment_id for source in sources}
+            segments = []
+            for segment in self._segments:
+                if segment.segment_id == sources[0].segment_id:
+                    if merged.num_live:
+                        segments.append(merged)
+                elif segment.segment_id not in source_ids:
+                    segments.append(segment)
+
+            self._segments = tuple(segments)
+            self._segment_files.add(merged.segment_id)
+            self._invalidate_caches()
+        return True
+
+    def _save_segment(self, segment: Segment) -> Segment:
+        """ Writes a segment to the index directory, returning its memory mapped copy. """
+        path = segment_path(self.directory, segment.segment_id)
+        write_segment(segment, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+        mapped = open_segment(path)
+        mapped.deleted = segment.deleted
+        return mapped
+
+    def checkpoint(self):
+        """
+        Saves every committed segment into the index directory and drops
+        the write-ahead log records they include.
+
+        Segments only held in memory are written out and swapped for their
+        memory mapped copies, segment files no longer in use are removed.
+        """
+        with self._checkpoint_lock:
+            with self._commit_lock:
+                segments = self._segments
+                deleted = [segment.deleted.copy() for segment in segments]
+                position = self.writer.wal.committed
+
+            mapped = {}
+            for segment in segments:
+                if segment.segment_id not in self._segment_files:
+                    mapped[segment.segment_id] = self._save_segment(segment)
+                    self._segment_files.add(segment.segment_id)
+
+            saved = [segment.segment_id for segment in segments]
+            write_segment_list(self.directory, list(zip(saved, deleted)), position)
+            self.writer.wal.checkpoint(position)
+
+            with self._commit_lock:
+                # Any delete committed since is carried over onto the mapped copy.
+                self._segments = tuple(
+                    mapped[segment.segment_id].with_deleted(segment.deleted)
+                    if segment.segment_id in mapped else segment
+                    for segment in self._segments
+                )
+                in_use = set(saved)
+                in_use.update(segment.segment_id for segment in self._segments)
+                unused = self._segment_files - in_use
+                self._segment_files -= unused
+
+            for segment_id in unused:
+                os.remove(segment_path(self.directory, segment_id))
+
+    def rollback(self):
+        """
+        Discards every operation since the last commit, the write-ahead
+        log is truncated back to the last commit.
+        """
+        self.writer.discard()
+        self._invalidate_caches()
+
+    def add_stop_words(self, words: List[str]):
+        self.stop_words.add(words)
+        self._invalidate_caches()
+
+    def remove_stop_words(self, words: List[str]):
+        self.stop_words.remove(words)
+        self._invalidate_caches()
+
+    def clear_stop_words(self):
+        self.stop_words.clear()
+        self._invalidate_caches()
+
+    def add_synonyms(self, lines: List[str]):
+        self.synonyms.add(lines)
+        self._invalidate_caches()
+
+    def remove_synonyms(self, words: List[str]):
+        self.synonyms.remove(words)
+        self._invalidate_caches()
+
+    def clear_synonyms(self):
+        self.synonyms.clear()
+        self._invalidate_caches()
+
+    def stats(self) -> Dict[str, Any]:
+        segments = self._segments
+        return {
+            "num_docs": sum(segment.num_live for segment in segments),
+            "num_deleted": sum(len(segment.deleted) for segment in segments),
+            "num_segments": len(segments),
+            "stored_bytes": sum(segment.stored.nbytes for segment in segments),
+            "result_cache": self.cache.stats(),
+            "more_like_this_cache": self.more_like_this_cache.stats(),
+            "doc_cache": self.doc_cache.stats(),
+            "readers": self.readers.stats(),
+            "writer": {
+                **self.writer.stats(),
+                **self.merger.stats(),
+                **(self.checkpointer.stats() if self.checkpointer is not None else {}),
+            },
+            "commits": {
+                **self.committer.stats(),
+                "commits": self.commits,
+                "pending_docs": self.writer.pending_docs,
+                "last_duration_ms": self.last_commit_duration * 1000,
+                "mean_duration_ms": self.total_commit_duration * 1000 / max(self.commits, 1),
+            },
+        }
+
+    def close(self):
+        """ Stops the index's thread pools, called once it's deleted or replaced. """
+        self.committer.shutdown()
+        if self.checkpointer is not None:
+            self.checkpointer.shutdown()
+        self.readers.shutdown()
+        self.writer.shutdown()
+        self.merger.shutdown()
+
+    def get_document(self, doc_id: int) -> Dict[str, Any]:
+        located = self.searcher().locate(doc_id)
+        if located is None:
+            raise DocumentNotFound(doc_id)
+        segment, ordinal = located
+        return {
+            "data": segment.doc(ordinal, self.doc_cache),
+            "ratio": None,
+            "document_id": str(doc_id),
+        }
+
+    def _documents(self, hits: List[Tuple[Segment, int]]) -> List[Dict[str, Any]]:
+        """
+        Reads the stored documents of a page of hits, the hits of each
+        segment are read together so a block holding several of them is
+        only decompressed once.
+        """
+        grouped: Dict[str, Tuple[Segment, List[int]]] = {}
+        for segment, ordinal in hits:
+            grouped.setdefault(segment.segment_id, (segment, []))[1].append(ordinal)
+
+        docs: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        for segment, ordinals in grouped.values():
+            for ordinal, doc in zip(ordinals, segment.docs(ordinals, self.doc_cache)):
+                docs[(segment.segment_id, ordinal)] = doc
+        return [docs[(segment.segment_id, ordinal)] for segment, ordinal in hits]
+
+    def _sort_column(self, name: str):
+        if name not in self.schema:
+            raise InvalidQuery(f"field {name!r} is not declared")
+        field = self.schema[name]
+        if not field.fast or field.type not in TYPECODES:
+            raise InvalidQuery(f"field {name!r} must be a numeric fast field to order by it")
+        return name
+
+    def _facet_path(self, facet: FacetQuery) -> str:
+        """ Checks a facet request, returning its normalised path. """
+        if facet.field not in self.schema:
+            raise InvalidQuery(f"field {facet.field!r} is not declared")
+        field = self.schema[facet.field]
+        if not field.fast or field.type != FieldType.Facet:
+            raise InvalidQuery(f"field {facet.field!r} must be a facet fast field to count it")
+        if not facet.path.startswith("/"):
+            raise InvalidQuery("facets must be a path starting with '/'")
+        return facet.path.rstrip("/") or "/"
+
+    def search(self, payload: QueryPayload) -> Dict[str, Any]:
+        """
+        Runs a query returning the requested page of hits, the total count
+        and the cursor of the next page if there is one.
+
+        Results are served from the result cache when the same query has
+        already been run since the index last changed.
+        """
+        key = payload.json(by_alias=True, sort_keys=True)
+        generation, results = self.cache.get(key)
+        if results is not None:
+            return {**results, "cached": True}
+
+        results = self._search(payload)
+        self.cache.put(generation, key, results)
+        return {**results, "cached": False}
+
+    async def search_async(self, payload: QueryPayload, searcher: Optional[Searcher] = None) -> Dict[str, Any]:
+        """
+        The same as `search` but runs the search on the reader pool,
+        cached results are returned without waiting for a searcher.
+
+        Searches given the same searcher run against the same view of the
+        index and share its term statistics and posting lookups, e.g. the
+        searches of a single multi-search request.
+        """
+        key = payload.json(by_alias=True, sort_keys=True)
+        generation, results = self.cache.get(key)
+        if results is not None:
+            return {**results, "cached": True}
+
+        results = await self.readers.run(self._search, payload, searcher)
+        if searcher is not None:
+            generation = searcher.generation
+        self.cache.put(generation, key, results)
+        return {**results, "cached": False}
+
+    def _collect_segment(
+        self,
+        searcher: Searcher,
+        query: Query,
+        segment: Segment,
+        payload: QueryPayload,
+        facet_paths: List[str],
+    ) -> Tuple[TopDocs, int, List[Dict[str, int]]]:
+        order_by = payload.order_by
+        descending = order_by is None or payload.sort == Sort.Desc
+        collector = TopDocs(payload.offset + payload.limit, descending, payload.search_after)
+
+        scores = query.evaluate(searcher, segment)
+
+        if order_by is None:
+            collector.collect_scores(segment, scores)
+        else:
+            matches = list(scores.items())
+            values = segment.fast_fields[order_by].gather([o for o, _ in matches], descending)
+            collector.collect(segment, ((o, s, v) for (o, s), v in zip(matches, values)))
+
+        # Each facet field's paths are counted over every match once, however many requests share it.
+        field_counts: Dict[str, Dict[int, int]] = {}
+        facet_counts = []
+        for facet, path in zip(payload.facets, facet_paths):
+            column = segment.facets.get(facet.field)
+            if column is None or not scores:
+                facet_counts.append({})
+                continue
+            counts = field_counts.get(facet.field)
+            if counts is None:
+                counts = field_counts[facet.field] = column.count(scores.keys())
+            facet_counts.append(column.children(counts, path))
+        return collector, len(scores), facet_counts
+
+    def _search(
+        self,
+        payload: QueryPayload,
+        searcher: Optional[Searcher] = None,
+        executor: Optional[Executor] = None,
+    ) -> Dict[str, Any]:
+        """
+        Hits are ordered by relevance, or by a fast field's column if the
+        payload sets `order_by`, and collected with a bounded heap so only
+        `offset + limit` hits are ever kept.
+
+        If an executor is given each segment is searched on it in parallel
+        and the per-segment top hits are merged.
+
+        Requested facets are counted over every match of the query rather
+        than the page, within each segment from its facet column.
+        """
+        searcher = searcher or self.searcher()
+        query = QueryCompiler(searcher).compile(payload.query)
+        if payload.order_by is not None:
+            self._sort_column(payload.order_by)
+        facet_paths = [self._facet_path(facet) for facet in payload.facets]
+
+        descending = payload.order_by is None or payload.sort == Sort.Desc
+        collector = TopDocs(payload.offset + payload.limit, descending, payload.search_after)
+
+        def collect(segment: Segment) -> Tuple[TopDocs, int, List[Dict[str, int]]]:
+            return self._collect_segment(searcher, query, segment, payload, facet_paths)
+
+        if executor is not None and len(searcher.segments) > 1:
+            results = executor.map(collect, searcher.segments)
+        else:
+            results = map(collect, searcher.segments)
+
+        count = 0
+        facet_totals = [Counter() for _ in payload.facets]
+        for segment_collector, segment_count, facet_counts in results:
+            collector.merge(segment_collector)
+            count += segment_count
+            for totals, counts in zip(facet_totals, facet_counts):
+                totals.update(counts)
+
+        page = collector.top()[payload.offset:]
+        docs = self._documents([(segment, ordinal) for _, _, segment, ordinal, _, _ in page])
+        hits = [
+            {
+                "data": doc,
+                "ratio": score,
+                "document_id": str(segment.doc_ids[ordinal]),
+            }
+            for (_, _, segment, ordinal, score, _), doc in zip(page, docs)
+        ]
+
+        next_cursor = None
+        if page and collector.eligible > payload.offset + payload.limit:
+            next_cursor = collector.cursor(page[-1])
+
+        facets = [
+            {
+                "field": facet.field,
+                "path": path,
+                "counts": [
+                    {"path": child, "count": child_count}
+                    for child, child_count in heapq.nsmallest(
+                        facet.limit, totals.items(), key=lambda item: (-item[1], item[0]),
+                    )
+                ],
+            }
+            for facet, path, totals in zip(payload.facets, facet_paths, facet_totals)
+        ]
+        return {"hits": hits, "count": count, "next_cursor": next_cursor, "facets": facets}
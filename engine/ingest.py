@@ -0,0 +1,112 @@
+import codecs
+import json
+from typing import Any, List
+
+from .errors import InvalidDocument
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+# A single document larger than this is treated as malformed rather than
+# letting a missing delimiter buffer the rest of the upload.
+MAX_DOCUMENT_SIZE = 16 * 1024 * 1024
+
+
+class DocumentStream:
+    """
+    An incremental parser for bulk document uploads.
+
+    Bodies are either newline delimited JSON objects or a JSON array of
+    objects, chunks are fed in as they arrive and complete documents are
+    returned as soon as they can be decoded, so only a single partial
+    document is ever buffered.
+    """
+
+    def __init__(self, content_type: str):
+        self.ndjson = content_type.split(";")[0].strip() == NDJSON_CONTENT_TYPE
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self._after_value = False
+        self._after_comma = False
+        self._finished = False
+        self.position = 0
+
+    def _error(self, reason: str) -> InvalidDocument:
+        return InvalidDocument(f"document {self.position + 1}: {reason}")
+
+    def _decode(self, text: str) -> Any:
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise self._error(f"invalid JSON: {e.msg}") from None
+        self.position += 1
+        return document
+
+    def _split_lines(self, final: bool) -> List[Any]:
+        *lines, self._buffer = self._buffer.split("\n")
+        if final:
+            lines.append(self._buffer)
+            self._buffer = ""
+        return [self._decode(line) for line in lines if line.strip()]
+
+    def _split_array(self, final: bool) -> List[Any]:
+        documents = []
+        buffer, pos = self._buffer, 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buffer):
+                break
+
+            char = buffer[pos]
+            if self._finished:
+                raise self._error("unexpected data after the end of the array")
+            if not self._started:
+                if char != "[":
+                    raise self._error("expected a JSON array of documents")
+                self._started = True
+                pos += 1
+                continue
+            if char == "]" and self._after_comma:
+                raise self._error("expected a document after ','")
+            if self._after_value or char == "]":
+                if char == "]":
+                    self._finished = True
+                elif char != ",":
+                    raise self._error("expected ',' or ']' between documents")
+                self._after_value = False
+                self._after_comma = char == ","
+                pos += 1
+                continue
+
+            try:
+                document, end = self._json.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if final:
+                    raise self._error(f"invalid JSON: {e.msg}") from None
+                break
+
+            self.position += 1
+            self._after_value = True
+            self._after_comma = False
+            documents.append(document)
+            pos = end
+
+        self._buffer = buffer[pos:]
+        if final and not self._finished:
+            raise self._error("the JSON array was never closed")
+        return documents
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """ Feeds a chunk of the body returning any completed documents. """
+        self._buffer += self._decoder.decode(chunk)
+        documents = self._split_lines(False) if self.ndjson else self._split_array(False)
+        if len(self._buffer) > MAX_DOCUMENT_SIZE:
+            raise self._error("document exceeds the maximum document size")
+        return documents
+
+    def finish(self) -> List[Any]:
+        """ Flushes the trailing document once the body has been read. """
+        self._buffer += self._decoder.decode(b"", final=True)
+        return self._split_lines(True) if self.ndjson else self._split_array(True)
@@ -0,0 +1,105 @@
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Mapping, Sequence
+
+# The fraction of hash table slots left empty so probes stay short.
+LOAD_FACTOR = 0.5
+
+_EMPTY = array("I")
+
+
+def key_hash(key: bytes) -> int:
+    """ A hash of a key's UTF-8 bytes which is stable across processes. """
+    return zlib.crc32(key)
+
+
+def hash_slots(keys: Sequence[bytes]) -> array:
+    """
+    Builds an open addressing table of key ids, the id of key `k` is
+    found by probing linearly from slot `key_hash(k) & (len(slots) - 1)`
+    and empty slots hold -1.
+    """
+    size = 1
+    while size * LOAD_FACTOR < len(keys):
+        size <<= 1
+
+    mask = size - 1
+    slots = array("q", [-1]) * size
+    for key_id, key in enumerate(keys):
+        slot = key_hash(key) & mask
+        while slots[slot] >= 0:
+            slot = (slot + 1) & mask
+        slots[slot] = key_id
+    return slots
+
+
+class KeyIndex:
+    """
+    The exact match index of a keyed fast field within a segment.
+
+    Each distinct value of the field maps to the ordinals of the documents
+    holding it in the same CSR layout as a field's postings, without any
+    frequencies or lengths as keys are never scored. `keys` is a hash
+    lookup of each value to its id so finding a key is O(1) regardless of
+    how many the segment holds.
+    """
+
+    __slots__ = ("keys", "offsets", "docs")
+
+    def __init__(self, keys: Mapping[str, int], offsets: Sequence[int], docs: Sequence[int]):
+        self.keys = keys
+        self.offsets = offsets
+        self.docs = docs
+
+    @classmethod
+    def build(cls, values_per_doc: Iterable[List[str]]) -> "KeyIndex":
+        ordinals: Dict[str, List[int]] = {}
+        for ordinal, values in enumerate(values_per_doc):
+            for value in set(values):
+                entry = ordinals.get(value)
+                if entry is None:
+                    entry = ordinals[value] = []
+                entry.append(ordinal)
+
+        return cls._from_ordinals(ordinals)
+
+    @classmethod
+    def _from_ordinals(cls, ordinals: Dict[str, List[int]]) -> "KeyIndex":
+        # Keys are sorted the same as terms so both are written alike.
+        keys = {}
+        offsets = array("Q", [0])
+        docs = array("I")
+        for key in sorted(ordinals):
+            keys[key] = len(keys)
+            docs.extend(ordinals[key])
+            offsets.append(len(docs))
+        return cls(keys, offsets, docs)
+
+    @classmethod
+    def merge(cls, sources: List["KeyIndex"], mappings: List[array]) -> "KeyIndex":
+        """
+        Merges the keys of several segments, `mappings` maps each source
+        ordinal to its merged ordinal or -1 if the document was dropped.
+        """
+        ordinals: Dict[str, List[int]] = {}
+        for source, mapping in zip(sources, mappings):
+            for key in source.vocabulary():
+                merged = [mapping[ordinal] for ordinal in source.ordinals(key)]
+                merged = [ordinal for ordinal in merged if ordinal >= 0]
+                if merged:
+                    ordinals.setdefault(key, []).extend(merged)
+
+        for merged in ordinals.values():
+            # Each source contributes an ascending run, so this is close to linear.
+            merged.sort()
+        return cls._from_ordinals(ordinals)
+
+    def ordinals(self, key: str) -> Sequence[int]:
+        """ The ordinals of every document holding the key, deleted or not. """
+        key_id = self.keys.get(key)
+        if key_id is None:
+            return _EMPTY
+        return memoryview(self.docs)[self.offsets[key_id]:self.offsets[key_id + 1]]
+
+    def vocabulary(self) -> Iterable[str]:
+        return self.keys.keys()
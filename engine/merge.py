@@ -0,0 +1,134 @@
+import logging
+import math
+import threading
+from typing import List, Optional, Sequence
+
+from .segment import Segment
+
+logger = logging.getLogger(__name__)
+
+# How many similarly sized segments collect before they are merged.
+SEGMENTS_PER_TIER = 8
+
+# Segments smaller than this are all treated as the same, lowest, tier.
+MIN_SEGMENT_SIZE = 1_000
+
+# Segments at or beyond this many live documents are never merged further.
+MAX_MERGED_DOCS = 5_000_000
+
+# Segments with at least this fraction of their documents deleted are
+# rewritten on their own to reclaim the space, even if their tier isn't full.
+RECLAIM_DELETES_RATIO = 0.3
+
+# The minimum number of seconds between two merges of the same index,
+# this throttles merging during continuous ingestion.
+MERGE_INTERVAL = 1.0
+
+
+class TieredMergePolicy:
+    """
+    Groups segments into tiers of roughly equal size, each tier being
+    `segments_per_tier` times larger than the one below, and merges a
+    tier once it holds `segments_per_tier` segments.
+
+    This keeps the number of segments logarithmic in the size of the
+    index while every document is only rewritten a few times. Segments
+    which are mostly deleted are rewritten to drop their tombstoned
+    documents.
+    """
+
+    def __init__(
+        self,
+        segments_per_tier: int = SEGMENTS_PER_TIER,
+        min_segment_size: int = MIN_SEGMENT_SIZE,
+        max_merged_docs: int = MAX_MERGED_DOCS,
+        reclaim_deletes_ratio: float = RECLAIM_DELETES_RATIO,
+    ):
+        self.segments_per_tier = segments_per_tier
+        self.min_segment_size = min_segment_size
+        self.max_merged_docs = max_merged_docs
+        self.reclaim_deletes_ratio = reclaim_deletes_ratio
+
+    def tier(self, segment: Segment) -> int:
+        size = max(segment.num_live, self.min_segment_size)
+        return int(math.log(size / self.min_segment_size, self.segments_per_tier))
+
+    def find_merge(self, segments: Sequence[Segment]) -> Optional[List[Segment]]:
+        """ The segments which should be merged next, if any. """
+        tiers = {}
+        for segment in segments:
+            if segment.num_live < self.max_merged_docs:
+                tiers.setdefault(self.tier(segment), []).append(segment)
+
+        for tier in sorted(tiers):
+            members = sorted(tiers[tier], key=lambda segment: segment.num_live)
+            if len(members) < self.segments_per_tier:
+                continue
+
+            candidates = members[:self.segments_per_tier]
+            if sum(segment.num_live for segment in candidates) <= self.max_merged_docs:
+                return candidates
+
+        worst = max(segments, key=lambda segment: len(segment.deleted) / len(segment), default=None)
+        if worst is not None and len(worst.deleted) / len(worst) >= self.reclaim_deletes_ratio:
+            return [worst]
+        return None
+
+
+class BackgroundMerger:
+    """
+    Merges an index's segments on a background thread.
+
+    The merger wakes up after each commit and keeps merging while the
+    policy finds candidates, with at most one merge running at a time
+    and at least `interval` seconds between merges. Merged segments are
+    built without holding any lock so readers are never blocked.
+    """
+
+    def __init__(self, index, policy: TieredMergePolicy, interval: float = MERGE_INTERVAL):
+        self.index = index
+        self.policy = policy
+        self.interval = interval
+        self.merges = 0
+        self.merging = False
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"{index.name}-merger",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            while not self._stopped.is_set():
+                sources = self.policy.find_merge(self.index.segments)
+                if not sources:
+                    break
+
+                self.merging = True
+                try:
+                    if self.index.merge_segments(sources):
+                        self.merges += 1
+                except Exception:
+                    logger.exception("failed to merge segments of index %r", self.index.name)
+                    break
+                finally:
+                    self.merging = False
+
+                self._stopped.wait(self.interval)
+
+    def shutdown(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {"merges": self.merges, "merging": self.merging}
@@ -0,0 +1,603 @@
+import math
+from collections import Counter
+from itertools import compress, repeat
+from operator import add, mul, truediv
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from models import (
+    FuzzyQueryData,
+    MoreLikeThisQueryData,
+    NormalQueryData,
+    Occur,
+    QueryKinds,
+    RangeKind,
+    RangeQueryData,
+    TermQueryData,
+)
+
+from .analyzer import tokenize
+from .errors import InvalidDocument, InvalidQuery
+from .schema import NUMERIC_TYPES, FieldInfo
+from .segment import Postings, Segment
+
+K1 = 1.2
+B = 0.75
+
+# The number of terms a more-like-this query is built from.
+MORE_LIKE_THIS_TERMS = 25
+
+Scores = Dict[int, float]
+
+# A range matching more than this share of a single valued column is found
+# by comparing every value rather than from the sorted value index.
+RANGE_SCAN_SHARE = 0.25
+
+
+def max_edits(term: str) -> int:
+    """ The edit distance a fuzzy term is allowed, scaled with its length. """
+    if len(term) <= 2:
+        return 0
+    if len(term) <= 5:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    The levenshtein distance between two strings, anything
+    beyond `limit` is reported as `limit + 1`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def query_term(field: FieldInfo, value: str) -> str:
+    """ Converts a raw value into the form it is indexed as for a field. """
+    if field.tokenized:
+        return value.lower()
+    try:
+        return str(field.convert(value)[0])
+    except InvalidDocument as e:
+        raise InvalidQuery(str(e)) from None
+
+
+class Searcher:
+    """
+    A consistent view over a set of segments and their statistics,
+    `generation` is the result cache generation the view was taken at.
+    """
+
+    def __init__(self, index, segments: Sequence[Segment], generation: int = 0):
+        self.index = index
+        self.schema = index.schema
+        self.segments = segments
+        self.generation = generation
+        self.num_docs = sum(len(segment) for segment in segments)
+        self._idf: Dict[Tuple[str, str], float] = {}
+        self._avg_length: Dict[str, float] = {}
+        self._postings: Dict[Tuple[str, str, str], Optional[Postings]] = {}
+
+    def postings(self, segment: Segment, field: str, term: str) -> Optional[Postings]:
+        """ A term's postings within a segment, looked up once per searcher. """
+        key = (segment.segment_id, field, term)
+        try:
+            return self._postings[key]
+        except KeyError:
+            postings = self._postings[key] = segment.fields[field].postings(term)
+            return postings
+
+    def doc_freq(self, field: str, term: str) -> int:
+        return sum(
+            segment.fields[field].doc_freq(term)
+            for segment in self.segments
+        )
+
+    def idf(self, field: str, term: str) -> float:
+        key = (field, term)
+        idf = self._idf.get(key)
+        if idf is None:
+            df = self.doc_freq(field, term)
+            idf = self._idf[key] = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+        return idf
+
+    def avg_length(self, field: str) -> float:
+        avg = self._avg_length.get(field)
+        if avg is None:
+            total = sum(segment.fields[field].total_length for segment in self.segments)
+            avg = self._avg_length[field] = (total / self.num_docs) if self.num_docs else 0.0
+        return avg or 1.0
+
+    def vocabulary(self, field: str) -> Set[str]:
+        terms = set()
+        for segment in self.segments:
+            terms.update(segment.fields[field].vocabulary())
+        return terms
+
+    def locate(self, doc_id: int) -> Optional[Tuple[Segment, int]]:
+        for segment in self.segments:
+            ordinal = segment.find(doc_id)
+            if ordinal is not None:
+                return segment, ordinal
+        return None
+
+
+def add_scores(scores: Scores, other: Scores) -> Scores:
+    """ Sums two sets of scores, the smaller is added into the larger in place. """
+    if len(other) > len(scores):
+        scores, other = other, scores
+    if other:
+        keys = other.keys()
+        scores.update(zip(keys, map(add, other.values(), map(scores.get, keys, repeat(0.0)))))
+    return scores
+
+
+def _without_deleted(scores: Scores, segment: Segment) -> Scores:
+    deleted = segment.deleted
+    if not deleted:
+        return scores
+
+    # Walking the bitset touches a byte per 8 documents, checking each match touches one per match.
+    if len(scores) * 8 > len(segment):
+        for ordinal in deleted:
+            scores.pop(ordinal, None)
+    else:
+        for ordinal in [ordinal for ordinal in scores if ordinal in deleted]:
+            del scores[ordinal]
+    return scores
+
+
+class Query:
+    """
+    A node of a compiled query tree.
+
+    Evaluating a query scores its matches within a segment, deleted
+    documents are dropped from the scores it returns so they never match.
+    If `within`, an ascending sequence of ordinals, is given only those
+    ordinals are considered, which is how a conjunction narrows each of
+    its clauses to the matches of the ones before.
+    """
+
+    def evaluate(self, searcher: Searcher, segment: Segment, within: Optional[Sequence[int]] = None) -> Scores:
+        raise NotImplementedError()
+
+    def cost(self, segment: Segment) -> int:
+        """ An upper bound on the number of matches within a segment. """
+        raise NotImplementedError()
+
+
+class TermGroup(Query):
+    """
+    A set of alternative (field, term, boost) triples which together
+    match a single query word, e.g. the word across several fields or
+    its synonyms and fuzzy expansions.
+    """
+
+    def __init__(self, terms: List[Tuple[str, str, float]]):
+        self.terms = terms
+
+    def evaluate(self, searcher: Searcher, segment: Segment, within: Optional[Sequence[int]] = None) -> Scores:
+        """
+        Each term's postings are scored as a whole with `map` over the
+        posting arrays and the field's cached length norms, boosts and idf
+        are folded into a single multiplier, and the contributions are
+        added into the scores without a Python level loop per posting.
+        """
+        scores: Scores = {}
+        for field, term, boost in self.terms:
+            field_index = segment.fields[field]
+            if within is None:
+                postings = searcher.postings(segment, field, term)
+            else:
+                postings = field_index.seek(term, within)
+            if not postings or not postings[0]:
+                continue
+
+            docs, freqs = postings
+            weight = boost * searcher.idf(field, term) * (K1 + 1)
+            norms = field_index.norms(searcher.avg_length(field), K1, B)
+            contributions = map(
+                truediv,
+                map(mul, freqs, repeat(weight)),
+                map(add, freqs, map(norms.__getitem__, docs)),
+            )
+            if scores:
+                scores.update(zip(docs, map(add, contributions, map(scores.get, docs, repeat(0.0)))))
+            else:
+                scores = dict(zip(docs, contributions))
+        return _without_deleted(scores, segment)
+
+    def cost(self, segment: Segment) -> int:
+        return sum(segment.fields[field].doc_freq(term) for field, term, _ in self.terms)
+
+
+class DocSet(Query):
+    """ Matches a fixed set of document ids. """
+
+    def __init__(self, doc_ids: Iterable[int]):
+        self.doc_ids = set(doc_ids)
+
+    def evaluate(self, searcher: Searcher, segment: Segment, within: Optional[Sequence[int]] = None) -> Scores:
+        scores = {}
+        for doc_id in self.doc_ids:
+            ordinal = segment.find(doc_id)
+            if ordinal is not None:
+                scores[ordinal] = 0.0
+        if within is not None and scores:
+            wanted = set(within)
+            scores = {ordinal: score for ordinal, score in scores.items() if ordinal in wanted}
+        return scores
+
+    def cost(self, segment: Segment) -> int:
+        return len(self.doc_ids)
+
+
+class RangeQuery(Query):
+    """
+    Matches the documents with a value of a numeric fast field within a
+    range, an unset bound is unbounded. Matches score nothing so a range
+    only filters the other clauses of a query.
+
+    On its own the matches are a single run of the column's sorted value
+    index, or for broad ranges a comparison of the whole column. Within a
+    conjunction driven by a rarer clause only the values of the candidates
+    are checked, so the range never costs more than the candidates do.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        low: Optional[Union[int, float]],
+        high: Optional[Union[int, float]],
+        include_low: bool = True,
+        include_high: bool = True,
+    ):
+        self.field = field
+        self.low = low
+        self.high = high
+        self.include_low = include_low
+        self.include_high = include_high
+
+    def _matches(self, segment: Segment) -> Sequence[int]:
+        column = segment.fast_fields[self.field]
+        return column.value_range(self.low, self.high, self.include_low, self.include_high)
+
+    def _contains(self, value: Union[int, float]) -> bool:
+        low, high = self.low, self.high
+        if low is not None and (value < low if self.include_low else value <= low):
+            return False
+        if high is not None and (value > high if self.include_high else value >= high):
+            return False
+        return True
+
+    def evaluate(self, searcher: Searcher, segment: Segment, within: Optional[Sequence[int]] = None) -> Scores:
+        column = segment.fast_fields[self.field]
+        matches = self._matches(segment)
+        if within is None:
+            if not column.multi and len(matches) > len(column) * RANGE_SCAN_SHARE:
+                matches = column.scan_range(self.low, self.high, self.include_low, self.include_high)
+            scores = dict.fromkeys(matches, 0.0)
+        elif len(within) < len(matches):
+            if column.multi:
+                selected = (any(map(self._contains, column.get(ordinal))) for ordinal in within)
+            else:
+                selected = map(self._contains, map(column.values.__getitem__, within))
+            scores = dict.fromkeys(compress(within, selected), 0.0)
+        else:
+            wanted = within if isinstance(within, (set, dict)) else set(within)
+            scores = dict.fromkeys(filter(wanted.__contains__, matches), 0.0)
+        return _without_deleted(scores, segment)
+
+    def cost(self, segment: Segment) -> int:
+        return len(self._matches(segment))
+
+
+def _add_within(scores: Scores, other: Scores) -> Scores:
+    """ Adds `scores` into `other` in place, every ordinal of `other` must be in `scores`. """
+    keys = other.keys()
+    other.update(zip(keys, map(add, other.values(), map(scores.__getitem__, keys))))
+    return other
+
+
+class BooleanQuery(Query):
+    """
+    Combines sub queries according to their occurrence.
+
+    Conjunctions are driven from the clause with the fewest matches, each
+    following clause only seeks the ordinals matched so far along its
+    posting lists' skip pointers, so a rare term makes the whole query
+    cheap however common the others are. Should clauses of a conjunction
+    are seeked the same way, and exclusions are removed from the matches
+    by whichever of the two sides is smaller.
+    """
+
+    def __init__(self):
+        self.must: List[Query] = []
+        self.should: List[Query] = []
+        self.must_not: List[Query] = []
+
+    def add(self, occur: Occur, query: Query):
+        if occur == Occur.Must:
+            self.must.append(query)
+        elif occur == Occur.MustNot:
+            self.must_not.append(query)
+        else:
+            self.should.append(query)
+
+    def cost(self, segment: Segment) -> int:
+        if self.must:
+            return min(query.cost(segment) for query in self.must)
+        return sum(query.cost(segment) for query in self.should)
+
+    def evaluate(self, searcher: Searcher, segment: Segment, within: Optional[Sequence[int]] = None) -> Scores:
+        if self.must:
+            scores: Optional[Scores] = None
+            for query in sorted(self.must, key=lambda query: query.cost(segment)):
+                # Only the clauses following the first need the ordinals matched so far in order.
+                candidates = within if scores is None else sorted(scores)
+                result = query.evaluate(searcher, segment, candidates)
+                scores = result if scores is None else _add_within(scores, result)
+                if not scores:
+                    return scores
+
+            if self.should:
+                candidates = sorted(scores)
+            for query in self.should:
+                scores.update(_add_within(scores, query.evaluate(searcher, segment, candidates)))
+        elif self.should:
+            scores = {}
+            for query in self.should:
+                scores = add_scores(scores, query.evaluate(searcher, segment, within))
+        else:
+            return {}
+
+        for query in self.must_not:
+            if not scores:
+                break
+            if query.cost(segment) > len(scores):
+                excluded = query.evaluate(searcher, segment, sorted(scores))
+            else:
+                excluded = query.evaluate(searcher, segment)
+            for ordinal in excluded:
+                scores.pop(ordinal, None)
+        return scores
+
+
+class QueryCompiler:
+    """ Compiles the query payload models into an executable query tree. """
+
+    def __init__(self, searcher: Searcher):
+        self.searcher = searcher
+        self.index = searcher.index
+        self.schema = searcher.schema
+
+    def _range_bound(self, field: FieldInfo, value: Optional[Any]) -> Optional[Union[int, float]]:
+        if not isinstance(value, str):
+            return value
+        try:
+            return field.convert(value)[0]
+        except InvalidDocument as e:
+            raise InvalidQuery(str(e)) from None
+
+    def _fields(self, fields: Optional[Union[str, List[str]]]) -> List[str]:
+        if fields is None:
+            return self.schema.search_fields
+        if isinstance(fields, str):
+            fields = [fields]
+
+        for name in fields:
+            if name not in self.schema:
+                raise InvalidQuery(f"field {name!r} is not declared")
+            if not self.schema[name].indexed:
+                raise InvalidQuery(f"field {name!r} is not indexed")
+        return fields
+
+    def _analyze(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        if self.index.declaration.strip_stop_words:
+            stripped = self.index.stop_words.strip(tokens)
+            # A query made entirely of stop words keeps its words.
+            tokens = stripped or tokens
+        return tokens
+
+    def _group(self, token: str, fields: List[str]) -> TermGroup:
+        terms = []
+        for term in self.index.synonyms.expand(token):
+            for field in fields:
+                terms.append((field, term, self.schema.boost(field)))
+        return TermGroup(terms)
+
+    @property
+    def _default_occur(self) -> Occur:
+        if self.index.declaration.set_conjunction_by_default:
+            return Occur.Must
+        return Occur.Should
+
+    def _words(self, groups: List[Query]) -> BooleanQuery:
+        query = BooleanQuery()
+        for group in groups:
+            query.add(self._default_occur, group)
+        return query
+
+    def normal(self, ctx: str) -> Query:
+        """
+        Parses the standard query syntax, words may be prefixed with
+        `+` to require them, `-` to exclude them or `field:` to restrict
+        them to a given field.
+        """
+        query = BooleanQuery()
+        for word in ctx.split():
+            occur = self._default_occur
+            if word[0] in "+-" and len(word) > 1:
+                occur = Occur.Must if word[0] == "+" else Occur.MustNot
+                word = word[1:]
+
+            fields = self.schema.search_fields
+            name, sep, value = word.partition(":")
+            if sep and name in self.schema and value:
+                fields = self._fields(name)
+                word = value
+
+            tokens = self._analyze(word) if occur != Occur.MustNot else tokenize(word)
+            for token in tokens:
+                query.add(occur, self._group(token, fields))
+        return query
+
+    def fuzzy(self, ctx: str, fields: Optional[Union[str, List[str]]]) -> Query:
+        fields = self._fields(fields)
+        groups = []
+        for token in self._analyze(ctx):
+            terms = []
+            for field in fields:
+                boost = self.schema.boost(field)
+                for candidate, distance in self._fuzzy_candidates(field, token):
+                    terms.append((field, candidate, boost / (1 + distance)))
+            groups.append(TermGroup(terms))
+        return self._words(groups)
+
+    def _fuzzy_candidates(self, field: str, token: str) -> List[Tuple[str, int]]:
+        fuzzy_index = self.index.fuzzy_indexes.get(field)
+        if fuzzy_index is not None:
+            return fuzzy_index.candidates(token)
+
+        limit = max_edits(token)
+        candidates = []
+        for term in self.searcher.vocabulary(field):
+            distance = edit_distance(token, term, limit)
+            if distance <= limit:
+                candidates.append((term, distance))
+        return candidates
+
+    def term(self, ctx: str, fields: Union[str, List[str]]) -> Query:
+        fields = self._fields(fields)
+        query = BooleanQuery()
+        for name in fields:
+            field = self.schema[name]
+            if field.tokenized:
+                terms = [(name, token, self.schema.boost(name)) for token in tokenize(ctx)]
+                phrase = BooleanQuery()
+                for term in terms:
+                    phrase.add(Occur.Must, TermGroup([term]))
+                query.add(Occur.Should, phrase)
+            else:
+                term = query_term(field, ctx)
+                query.add(Occur.Should, TermGroup([(name, term, self.schema.boost(name))]))
+        return query
+
+    def _field_weights(self, segment: Segment, ordinal: int, name: str) -> Dict[str, float]:
+        """
+        The TF-IDF weight of each of a document's terms within a field, read
+        from the field's term vectors if it stores them, otherwise by
+        analyzing the stored document again.
+        """
+        vectors = segment.vectors.get(name)
+        if vectors is not None:
+            field = segment.fields[name]
+            counts = {field.term(term_id): freq for term_id, freq in vectors.vector(ordinal)}
+            if self.index.declaration.strip_stop_words:
+                active = self.index.stop_words.active
+                # A document made entirely of stop words keeps its words.
+                counts = {term: freq for term, freq in counts.items() if term not in active} or counts
+        else:
+            values = segment.doc(ordinal, self.index.doc_cache).get(name)
+            if values is None:
+                return {}
+            if not isinstance(values, list):
+                values = [values]
+            counts = Counter(
+                token
+                for value in values
+                for token in self._analyze(str(value))
+            )
+
+        return {term: freq * self.searcher.idf(name, term) for term, freq in counts.items()}
+
+    def _top_terms(self, doc_id: int) -> List[Tuple[str, str]]:
+        located = self.searcher.locate(doc_id)
+        if located is None:
+            raise InvalidQuery(f"document {doc_id} does not exist")
+        segment, ordinal = located
+
+        weights: Dict[Tuple[str, str], float] = {}
+        for name in self.schema.search_fields:
+            for term, weight in self._field_weights(segment, ordinal, name).items():
+                weights[(name, term)] = weight
+
+        # Ties are broken by term so both ways of weighting pick the same terms.
+        top = sorted(weights.items(), key=lambda item: (-item[1], item[0]))
+        return [key for key, _ in top[:MORE_LIKE_THIS_TERMS]]
+
+    def more_like_this(self, doc_id: int) -> Query:
+        """
+        The top terms of a document are cached by its id, as the same few
+        documents tend to be asked for over and over. Entries are keyed on
+        the searcher's generation, so the terms always come from the same
+        view of the index as the search, and the cache is cleared by any
+        change which could alter a term's weight.
+        """
+        cache = self.index.more_like_this_cache
+        key = (self.searcher.generation, doc_id)
+        generation, top = cache.get(key)
+        if top is None:
+            top = self._top_terms(doc_id)
+            cache.put(generation, key, top)
+
+        query = BooleanQuery()
+        for field, term in top:
+            query.add(Occur.Should, TermGroup([(field, term, self.schema.boost(field))]))
+        query.add(Occur.MustNot, DocSet([doc_id]))
+        return query
+
+    def range(self, kind: RangeKind) -> Query:
+        if kind.field not in self.schema:
+            raise InvalidQuery(f"field {kind.field!r} is not declared")
+        field = self.schema[kind.field]
+        if not field.fast or field.type not in NUMERIC_TYPES:
+            raise InvalidQuery(f"field {kind.field!r} must be a numeric fast field to query a range of it")
+        if kind.gt is not None and kind.gte is not None:
+            raise InvalidQuery("a range can only have one of `gt` and `gte`")
+        if kind.lt is not None and kind.lte is not None:
+            raise InvalidQuery("a range can only have one of `lt` and `lte`")
+
+        low = self._range_bound(field, kind.gte if kind.gt is None else kind.gt)
+        high = self._range_bound(field, kind.lte if kind.lt is None else kind.lt)
+        if low is None and high is None:
+            raise InvalidQuery("a range must have at least one bound")
+        return RangeQuery(kind.field, low, high, kind.gt is None, kind.lt is None)
+
+    def compile_kind(self, kind: QueryKinds) -> Query:
+        if isinstance(kind, NormalQueryData):
+            return self.normal(kind.normal.ctx)
+        if isinstance(kind, FuzzyQueryData):
+            return self.fuzzy(kind.fuzzy.ctx, kind.fuzzy.fields)
+        if isinstance(kind, TermQueryData):
+            return self.term(kind.term.ctx, kind.term.fields)
+        if isinstance(kind, MoreLikeThisQueryData):
+            return self.more_like_this(kind.more_like_this.ctx)
+        if isinstance(kind, RangeQueryData):
+            return self.range(kind.range)
+        raise InvalidQuery(f"unsupported query kind {type(kind).__name__}")
+
+    def compile(self, query: Union[str, QueryKinds, List[QueryKinds]]) -> Query:
+        if isinstance(query, str):
+            return self.normal(query)
+        if not isinstance(query, list):
+            query = [query]
+
+        root = BooleanQuery()
+        for kind in query:
+            root.add(kind.occur, self.compile_kind(kind))
+        return root
@@ -0,0 +1,125 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .errors import ServerOverloaded
+
+# How many searches may wait for a free searcher per searcher slot before
+# new searches are turned away.
+QUEUED_SEARCHES_PER_SLOT = 8
+
+SHUTTING_DOWN = "the index is shutting down, try again later"
+
+
+class SearcherSlot:
+    """ A single concurrent searcher and the reader threads it fans out on. """
+
+    def __init__(self, name: str, reader_threads: int):
+        self.executor: Optional[Executor] = None
+        if reader_threads > 1:
+            self.executor = ThreadPoolExecutor(reader_threads, thread_name_prefix=name)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+
+class ReaderPool:
+    """
+    Schedules searches for an index.
+
+    At most `max_concurrency` searches run at once, each on its own
+    searcher slot which fans the search out across segments on
+    `reader_threads` threads. Searches beyond that wait in a bounded
+    queue, once it is full new searches are rejected rather than
+    oversubscribing the machine.
+
+    Shutting down doesn't wait on or interrupt running searches, queued
+    and new searches are rejected and each running search shuts its slot
+    down once it's done with it.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, reader_threads: int):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_concurrency * QUEUED_SEARCHES_PER_SLOT
+
+        self._slots: queue.SimpleQueue = queue.SimpleQueue()
+        for i in range(max_concurrency):
+            self._slots.put(SearcherSlot(f"{name}-reader-{i}", reader_threads))
+
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix=f"{name}-searcher")
+        self._in_flight = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return max(self._in_flight - self.max_concurrency, 0)
+
+    def _run(self, fn: Callable[..., Any], args: tuple) -> Any:
+        with self._lock:
+            if self._closed:
+                self._in_flight -= 1
+                raise ServerOverloaded(SHUTTING_DOWN)
+            # Never blocks, there are as many slots as threads running searches.
+            slot = self._slots.get()
+        try:
+            return fn(*args, executor=slot.executor)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                closed = self._closed
+                if not closed:
+                    self._slots.put(slot)
+            if closed:
+                slot.shutdown()
+
+    def _cancelled(self, future: Future):
+        # A search cancelled before it reached a slot never releases itself.
+        if future.cancelled():
+            with self._lock:
+                self._in_flight -= 1
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Runs `fn(*args, executor=...)` on a searcher slot without
+        blocking the event loop.
+        """
+        with self._lock:
+            if self._closed:
+                raise ServerOverloaded(SHUTTING_DOWN)
+            if self._in_flight >= self.max_concurrency + self.max_queued:
+                raise ServerOverloaded()
+            self._in_flight += 1
+
+            try:
+                future = self._executor.submit(self._run, fn, args)
+            except BaseException:
+                self._in_flight -= 1
+                raise
+        future.add_done_callback(self._cancelled)
+
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if future.cancelled() and self._closed:
+                raise ServerOverloaded(SHUTTING_DOWN) from None
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            while not self._slots.empty():
+                self._slots.get().shutdown()
+        # Outside the lock, cancelling the queued searches runs their callbacks which take it.
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": min(self._in_flight, self.max_concurrency),
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+        }
@@ -0,0 +1,191 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Union
+
+from models import FieldDeclaration, FieldType, IndexDeclaration
+
+from .errors import InvalidDocument, InvalidSchema
+
+RawValue = Union[List[Any], Any]
+Document = Dict[str, List[Any]]
+
+NUMERIC_TYPES = frozenset({FieldType.F64, FieldType.U64, FieldType.I64, FieldType.Date})
+
+
+def _to_timestamp(value: Any) -> int:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+
+    value = str(value)
+    if value.lstrip("-").isdigit():
+        return int(value)
+
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def _to_u64(value: Any) -> int:
+    value = int(value)
+    if not 0 <= value < 1 << 64:
+        raise ValueError("value out of range for u64")
+    return value
+
+
+def _to_i64(value: Any) -> int:
+    value = int(value)
+    if not -(1 << 63) <= value < 1 << 63:
+        raise ValueError("value out of range for i64")
+    return value
+
+
+def _to_facet(value: Any) -> str:
+    value = str(value)
+    if not value.startswith("/"):
+        raise ValueError("facets must be a path starting with '/'")
+    return value.rstrip("/") or "/"
+
+
+_CONVERTERS = {
+    FieldType.F64: float,
+    FieldType.U64: _to_u64,
+    FieldType.I64: _to_i64,
+    FieldType.Date: _to_timestamp,
+    FieldType.Text: str,
+    FieldType.String: str,
+    FieldType.Facet: _to_facet,
+}
+
+
+class FieldInfo:
+    """ The resolved options of a single declared field. """
+
+    __slots__ = ("name", "type", "stored", "indexed", "multi", "fast", "term_vectors")
+
+    def __init__(self, name: str, declaration: FieldDeclaration):
+        self.name = name
+        self.type = declaration.type
+        self.stored = bool(declaration.stored)
+        self.multi = declaration.multi
+        self.fast = declaration.fast
+        self.term_vectors = declaration.term_vectors
+
+        if declaration.indexed is None:
+            self.indexed = declaration.type == FieldType.Text
+        else:
+            self.indexed = declaration.indexed
+
+    @property
+    def tokenized(self) -> bool:
+        return self.type == FieldType.Text
+
+    @property
+    def keyed(self) -> bool:
+        """ Fast fields which aren't tokenized keep an exact match index of their values. """
+        return self.fast and not self.tokenized
+
+    def convert(self, raw: RawValue) -> List[Any]:
+        values = raw if isinstance(raw, list) else [raw]
+        if not values:
+            raise InvalidDocument(f"field {self.name!r} has no values")
+
+        if not self.multi:
+            # Single value fields only keep the last value given.
+            values = values[-1:]
+
+        converter = _CONVERTERS[self.type]
+        try:
+            return [converter(value) for value in values]
+        except (TypeError, ValueError) as e:
+            raise InvalidDocument(
+                f"field {self.name!r} expected type {self.type.value}: {e}"
+            ) from None
+
+    def output(self, values: List[Any]) -> RawValue:
+        """ Converts stored values back into their response form. """
+        return values if self.multi else values[0]
+
+
+class Schema:
+    """ The validated form of an index declaration. """
+
+    def __init__(self, declaration: IndexDeclaration):
+        if not declaration.fields:
+            raise InvalidSchema("an index must declare at least one field")
+
+        self.fields: Dict[str, FieldInfo] = {
+            name: FieldInfo(name, field)
+            for name, field in declaration.fields.items()
+        }
+
+        for field in self.fields.values():
+            if field.term_vectors and not field.indexed:
+                raise InvalidSchema(f"field {field.name!r} must be indexed to store term vectors")
+
+        for name in declaration.search_fields:
+            field = self.fields.get(name)
+            if field is None:
+                raise InvalidSchema(f"search field {name!r} is not declared")
+            if not field.indexed:
+                raise InvalidSchema(f"search field {name!r} must be indexed")
+
+        self.search_fields: List[str] = list(declaration.search_fields)
+
+        self.boosts: Dict[str, float] = {}
+        for name, boost in declaration.boost_fields.items():
+            if name not in self.fields:
+                raise InvalidSchema(f"boost field {name!r} is not declared")
+            try:
+                self.boosts[name] = float(boost)
+            except ValueError:
+                raise InvalidSchema(
+                    f"boost for field {name!r} must be a number"
+                ) from None
+
+    def __getitem__(self, name: str) -> FieldInfo:
+        return self.fields[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.fields
+
+    def boost(self, name: str) -> float:
+        return self.boosts.get(name, 1.0)
+
+    @property
+    def indexed_fields(self) -> List[FieldInfo]:
+        return [field for field in self.fields.values() if field.indexed]
+
+    @property
+    def keyed_fields(self) -> List[FieldInfo]:
+        return [field for field in self.fields.values() if field.keyed]
+
+    @property
+    def stored_fields(self) -> List[FieldInfo]:
+        return [field for field in self.fields.values() if field.stored]
+
+    def validate(self, raw: Dict[str, RawValue]) -> Document:
+        """
+        Checks a raw document against the schema, every declared field
+        is required and unknown fields are rejected.
+        """
+        if not isinstance(raw, dict):
+            raise InvalidDocument("documents must be JSON objects")
+
+        unknown = raw.keys() - self.fields.keys()
+        if unknown:
+            raise InvalidDocument(f"unknown fields: {', '.join(sorted(unknown))}")
+
+        missing = self.fields.keys() - raw.keys()
+        if missing:
+            raise InvalidDocument(f"missing fields: {', '.join(sorted(missing))}")
+
+        return {
+            name: field.convert(raw[name])
+            for name, field in self.fields.items()
+        }
+
+    def stored(self, document: Document) -> Dict[str, RawValue]:
+        return {
+            field.name: field.output(document[field.name])
+            for field in self.stored_fields
+        }
@@ -0,0 +1,412 @@
+import copy
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import compress, repeat
+from operator import add, contains, mul
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .analyzer import tokenize_batch
+from .doc_store import BLOCK_BYTES, BlockCache, DocStore
+from .facets import FacetColumn, build_facets
+from .fast_fields import FastFieldColumn, build_columns
+from .keys import KeyIndex
+from .schema import Document, Schema
+from .term_vectors import TermVectors
+from .tombstones import Tombstones
+
+Postings = Tuple[memoryview, memoryview]
+
+# The number of postings covered by each skip pointer.
+BLOCK_SIZE = 128
+
+# Seeking a single ordinal along the skip pointers costs about as much as
+# filtering this many postings by membership.
+SEEK_COST = 16
+
+# The merged order of documents, (doc id, source segment, source ordinal).
+MergeOrder = List[Tuple[int, int, int]]
+
+
+class FieldIndex:
+    """
+    The inverted index of a single field within a segment.
+
+    Posting lists are stored in CSR form, the doc ordinals and term
+    frequencies of term `t` live at `offsets[t]:offsets[t + 1]` within
+    the shared `docs` and `freqs` arrays.
+
+    The shared `docs` array is split into blocks of `BLOCK_SIZE` postings
+    and `skips[j]` holds the last ordinal of block `j`, within a single
+    term's range the pointers are ascending so seeking a posting is a
+    binary search over the pointers followed by one within a block.
+
+    The arrays may be `array`s or memory mapped views of a segment file,
+    `terms` is any mapping of each term to its id.
+    """
+
+    __slots__ = ("terms", "offsets", "docs", "freqs", "lengths", "total_length", "skips", "_names", "_norms")
+
+    def __init__(
+        self,
+        terms: Mapping[str, int],
+        offsets: Sequence[int],
+        docs: Sequence[int],
+        freqs: Sequence[int],
+        lengths: Sequence[int],
+        total_length: Optional[int] = None,
+        skips: Optional[Sequence[int]] = None,
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.freqs = freqs
+        self.lengths = lengths
+        self.total_length = sum(lengths) if total_length is None else total_length
+        self.skips = array("I", memoryview(docs)[BLOCK_SIZE - 1::BLOCK_SIZE]) if skips is None else skips
+        self._names: Optional[List[str]] = None
+        self._norms: Optional[Tuple[Tuple[float, float, float], array]] = None
+
+    @classmethod
+    def build(cls, tokens_per_doc: Iterable[List[str]]) -> "FieldIndex":
+        # Terms are interned in the order they are first seen and their postings
+        # gathered into packed arrays, then renumbered into sorted order at the end.
+        term_ids: Dict[str, int] = {}
+        term_docs: List[array] = []
+        term_freqs: List[array] = []
+        lengths = array("I")
+
+        for ordinal, tokens in enumerate(tokens_per_doc):
+            lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                term_id = term_ids.get(term)
+                if term_id is None:
+                    term_id = term_ids[term] = len(term_docs)
+                    term_docs.append(array("I"))
+                    term_freqs.append(array("I"))
+                term_docs[term_id].append(ordinal)
+                term_freqs[term_id].append(freq)
+
+        terms = {}
+        offsets = array("Q", [0])
+        docs = array("I")
+        freqs = array("I")
+        for term in sorted(term_ids):
+            term_id = term_ids[term]
+            terms[term] = len(terms)
+            docs.extend(term_docs[term_id])
+            freqs.extend(term_freqs[term_id])
+            offsets.append(len(docs))
+
+        return cls(terms, offsets, docs, freqs, lengths)
+
+    @classmethod
+    def merge(cls, sources: List["FieldIndex"], mappings: List[array], order: MergeOrder) -> "FieldIndex":
+        """
+        Merges the field of several segments, `mappings` maps each source
+        ordinal to its merged ordinal or -1 if the document was dropped.
+        """
+        lengths = array("I", (sources[i].lengths[ordinal] for _, i, ordinal in order))
+
+        vocabulary = set()
+        for source in sources:
+            vocabulary.update(source.vocabulary())
+
+        terms = {}
+        offsets = array("Q", [0])
+        docs = array("I")
+        freqs = array("I")
+        for term in sorted(vocabulary):
+            pairs = []
+            for source, mapping in zip(sources, mappings):
+                postings = source.postings(term)
+                if postings is None:
+                    continue
+                for ordinal, freq in zip(*postings):
+                    merged = mapping[ordinal]
+                    if merged >= 0:
+                        pairs.append((merged, freq))
+            if not pairs:
+                continue
+
+            # Each source contributes an ascending run, so this is close to linear.
+            pairs.sort()
+            terms[term] = len(terms)
+            docs.extend(ordinal for ordinal, _ in pairs)
+            freqs.extend(freq for _, freq in pairs)
+            offsets.append(len(docs))
+
+        return cls(terms, offsets, docs, freqs, lengths)
+
+    def doc_freq(self, term: str) -> int:
+        term_id = self.terms.get(term)
+        if term_id is None:
+            return 0
+        return self.offsets[term_id + 1] - self.offsets[term_id]
+
+    def postings(self, term: str) -> Optional[Postings]:
+        term_id = self.terms.get(term)
+        if term_id is None:
+            return None
+
+        start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+        return memoryview(self.docs)[start:stop], memoryview(self.freqs)[start:stop]
+
+    def vocabulary(self) -> Iterable[str]:
+        return self.terms.keys()
+
+    def seek(self, term: str, ordinals: Sequence[int]) -> Tuple[List[int], List[int]]:
+        """
+        The ordinals from an ascending sequence which hold the term, along
+        with the term's frequency in each.
+
+        Whichever of the two is cheaper drives, a short posting list is
+        filtered by membership of the ordinals, otherwise each ordinal
+        leapfrogs along the term's skip pointers so at most a block of
+        postings is searched per ordinal.
+        """
+        term_id = self.terms.get(term)
+        if term_id is None or not ordinals:
+            return [], []
+
+        start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+        docs, freqs = self.docs, self.freqs
+        if stop - start <= len(ordinals) * SEEK_COST:
+            wanted = ordinals if isinstance(ordinals, (set, dict)) else set(ordinals)
+            postings = memoryview(docs)[start:stop]
+            matched = list(compress(range(start, stop), map(contains, repeat(wanted), postings)))
+            return [docs[i] for i in matched], [freqs[i] for i in matched]
+
+        skips = self.skips
+        block, last_block = start // BLOCK_SIZE, stop // BLOCK_SIZE
+        found_docs: List[int] = []
+        found_freqs: List[int] = []
+        for ordinal in ordinals:
+            block = bisect_left(skips, ordinal, block, last_block)
+            lo = max(start, block * BLOCK_SIZE)
+            hi = stop if block == last_block else (block + 1) * BLOCK_SIZE
+            position = bisect_left(docs, ordinal, lo, hi)
+            if position < hi and docs[position] == ordinal:
+                found_docs.append(ordinal)
+                found_freqs.append(freqs[position])
+        return found_docs, found_freqs
+
+    def norms(self, avg_length: float, k1: float, b: float) -> array:
+        """
+        The BM25 length normalisation `k1 * (1 - b + b * length / avg_length)`
+        of every document, shared by every term of the field.
+
+        The average length only changes when the set of segments does, so
+        the last one computed is kept rather than computed per search.
+        """
+        key = (avg_length, k1, b)
+        cached = self._norms
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        norms = array("d", map(add, repeat(k1 * (1 - b)), map(mul, self.lengths, repeat(k1 * b / avg_length))))
+        self._norms = (key, norms)
+        return norms
+
+    def term(self, term_id: int) -> str:
+        """ The term with the given id, ids are assigned in sorted term order. """
+        if hasattr(self.terms, "term"):
+            return self.terms.term(term_id)
+        if self._names is None:
+            self._names = list(self.terms)
+        return self._names[term_id]
+
+
+def analyze_field(schema: Schema, name: str, documents: List[Tuple[int, Document]]) -> List[List[str]]:
+    """ Produces the terms of a field for a whole batch of documents at once. """
+    values_per_doc = [doc[name] for _, doc in documents]
+    if schema[name].tokenized:
+        return tokenize_batch(values_per_doc)
+    return [list(map(str, values)) for values in values_per_doc]
+
+
+def _term_vectors(field: FieldIndex, num_docs: int) -> TermVectors:
+    return TermVectors.from_postings(field.offsets, field.docs, field.freqs, num_docs)
+
+
+def _live_docs(source: int, segment: "Segment", deleted: Tombstones) -> Iterable[Tuple[int, int, int]]:
+    return (
+        (doc_id, source, ordinal)
+        for ordinal, doc_id in enumerate(segment.doc_ids)
+        if ordinal not in deleted
+    )
+
+
+class Segment:
+    """
+    An immutable batch of committed documents.
+
+    Documents are addressed by their ordinal within the segment, the
+    `doc_ids` array maps ordinals to the public document ids which are
+    always ascending so lookups by id are a binary search, `keys` holds
+    the exact match index of each keyed fast field, `vectors` the term
+    vectors of each field which stores them and `facets` the facet paths
+    of each facet fast field.
+    """
+
+    def __init__(
+        self,
+        segment_id: str,
+        doc_ids: Sequence[int],
+        fields: Dict[str, FieldIndex],
+        fast_fields: Dict[str, FastFieldColumn],
+        stored: DocStore,
+        keys: Optional[Dict[str, KeyIndex]] = None,
+        vectors: Optional[Dict[str, TermVectors]] = None,
+        facets: Optional[Dict[str, FacetColumn]] = None,
+    ):
+        self.segment_id = segment_id
+        self.doc_ids = doc_ids
+        self.fields = fields
+        self.fast_fields = fast_fields
+        self.stored = stored
+        self.keys = keys or {}
+        self.vectors = vectors or {}
+        self.facets = facets or {}
+        self.deleted = Tombstones(len(doc_ids))
+
+    @classmethod
+    def build(
+        cls,
+        segment_id: str,
+        schema: Schema,
+        documents: List[Tuple[int, Document]],
+    ) -> "Segment":
+        doc_ids = array("Q", (doc_id for doc_id, _ in documents))
+
+        fields = {}
+        for field in schema.indexed_fields:
+            fields[field.name] = FieldIndex.build(analyze_field(schema, field.name, documents))
+
+        keys = {}
+        for field in schema.keyed_fields:
+            keys[field.name] = KeyIndex.build(analyze_field(schema, field.name, documents))
+
+        vectors = {
+            field.name: _term_vectors(fields[field.name], len(documents))
+            for field in schema.indexed_fields
+            if field.term_vectors
+        }
+
+        fast_fields = build_columns(schema, documents)
+        facets = build_facets(schema, documents)
+        stored = DocStore.build(schema.stored(doc) for _, doc in documents)
+        return cls(segment_id, doc_ids, fields, fast_fields, stored, keys, vectors, facets)
+
+    @classmethod
+    def merge(
+        cls,
+        segment_id: str,
+        segments: List["Segment"],
+        deleted: List[Tombstones],
+    ) -> "Segment":
+        """
+        Merges several segments into one, the documents in the given
+        tombstones of each segment are dropped, reclaiming their space.
+        """
+        order: MergeOrder = list(heapq.merge(*(
+            _live_docs(i, segment, deleted[i])
+            for i, segment in enumerate(segments)
+        )))
+
+        mappings = [array("q", [-1]) * len(segment) for segment in segments]
+        for merged, (_, i, ordinal) in enumerate(order):
+            mappings[i][ordinal] = merged
+
+        fields = {
+            name: FieldIndex.merge(
+                [segment.fields[name] for segment in segments],
+                mappings,
+                order,
+            )
+            for name in segments[0].fields
+        }
+        fast_fields = {
+            name: FastFieldColumn.merge(
+                [segment.fast_fields[name] for segment in segments],
+                order,
+            )
+            for name in segments[0].fast_fields
+        }
+        keys = {
+            name: KeyIndex.merge([segment.keys[name] for segment in segments], mappings)
+            for name in segments[0].keys
+        }
+
+        vectors = {
+            name: _term_vectors(fields[name], len(order))
+            for name in segments[0].vectors
+        }
+        facets = {
+            name: FacetColumn.merge([segment.facets[name] for segment in segments], order)
+            for name in segments[0].facets
+        }
+
+        doc_ids = array("Q", (doc_id for doc_id, _, _ in order))
+        # Each source is read in ordinal order so it only needs its current block cached.
+        blocks = BlockCache(len(segments) * BLOCK_BYTES * 4)
+        stored = DocStore.from_raw(segments[i].stored.raw(ordinal, blocks) for _, i, ordinal in order)
+        return cls(segment_id, doc_ids, fields, fast_fields, stored, keys, vectors, facets)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def with_deleted(self, deleted: Tombstones) -> "Segment":
+        """
+        A copy of the segment sharing everything but its tombstones, the
+        tombstones of a published segment are never changed in place so
+        running searches keep a consistent view of every segment.
+        """
+        segment = copy.copy(self)
+        segment.deleted = deleted
+        return segment
+
+    @property
+    def num_live(self) -> int:
+        return len(self.doc_ids) - len(self.deleted)
+
+    def find(self, doc_id: int) -> Optional[int]:
+        """ Gets the ordinal of a live document id if it's in this segment. """
+        ordinal = bisect_left(self.doc_ids, doc_id)
+        if ordinal == len(self.doc_ids) or self.doc_ids[ordinal] != doc_id:
+            return None
+        if ordinal in self.deleted:
+            return None
+        return ordinal
+
+    def find_all(self, doc_ids: Sequence[int]) -> Iterable[int]:
+        """
+        The ordinals of the live documents among a sorted sequence of ids,
+        only the ids within this segment's range are looked up.
+        """
+        if not self.doc_ids:
+            return
+        start = bisect_left(doc_ids, self.doc_ids[0])
+        stop = bisect_right(doc_ids, self.doc_ids[-1])
+        for i in range(start, stop):
+            ordinal = self.find(doc_ids[i])
+            if ordinal is not None:
+                yield ordinal
+
+    def term_ordinals(self, field: str, term: str) -> Sequence[int]:
+        """
+        The ordinals of every document holding an exact term, deleted or
+        not, looked up in the field's key index if it has one.
+        """
+        keys = self.keys.get(field)
+        if keys is not None:
+            return keys.ordinals(term)
+        postings = self.fields[field].postings(term)
+        return () if postings is None else postings[0]
+
+    def doc(self, ordinal: int, cache: Optional[BlockCache] = None) -> Dict[str, Any]:
+        return self.stored.get_many([ordinal], cache)[0]
+
+    def docs(self, ordinals: Sequence[int], cache: Optional[BlockCache] = None) -> List[Dict[str, Any]]:
+        return self.stored.get_many(ordinals, cache)
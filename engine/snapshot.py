@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .errors import DataDirectoryInUse, InvalidSnapshot
+from .storage import (
+    DECLARATION_FILE,
+    SEGMENT_SUFFIX,
+    SEGMENTS_DIR,
+    segment_path,
+    write_segment,
+    write_segment_list,
+)
+from .tombstones import Tombstones
+
+LNX_VERSION = "0.9.0"
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 2
+
+# Segment files are compressed in independent chunks of this size so they
+# can be compressed and decompressed on several threads at once.
+CHUNK_SIZE = 4 * 1024 * 1024
+
+COMPRESSION_LEVEL = 6
+
+DEFAULT_SNAPSHOT_THREADS = os.cpu_count() or 1
+
+
+def _pipeline(executor: Executor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """
+    Applies `fn` to each item on the executor, keeping at most `window`
+    items in flight and yielding the results in order.
+    """
+    in_flight: Deque[Future] = deque()
+    for item in items:
+        if len(in_flight) >= window:
+            yield in_flight.popleft().result()
+        in_flight.append(executor.submit(fn, item))
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def _compress(chunk: bytes) -> Tuple[int, bytes]:
+    return zlib.crc32(chunk), zlib.compress(chunk, COMPRESSION_LEVEL)
+
+
+def _decompress(chunk: Tuple[bytes, int]) -> bytes:
+    compressed, checksum = chunk
+    data = zlib.decompress(compressed)
+    if zlib.crc32(data) != checksum:
+        raise InvalidSnapshot("snapshot chunk failed its checksum")
+    return data
+
+
+def _read_chunks(file: BinaryIO) -> Iterator[bytes]:
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _archive_file(source: str, destination: str, executor: Executor, window: int) -> List[List[int]]:
+    """ Compresses a file in parallel chunks, returning each chunk's size and checksum. """
+    chunks = []
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        for checksum, compressed in _pipeline(executor, _compress, _read_chunks(src), window):
+            dst.write(compressed)
+            chunks.append([len(compressed), checksum])
+        dst.flush()
+        os.fsync(dst.fileno())
+    return chunks
+
+
+def _archive_segment(
+    directory: str,
+    segment,
+    scratch: str,
+    destination: str,
+    executor: Executor,
+    window: int,
+) -> List[List[int]]:
+    """
+    Archives a segment's file from the index directory, segments which
+    haven't been checkpointed yet are written to a scratch file first.
+    """
+    try:
+        return _archive_file(segment_path(directory, segment.segment_id), destination, executor, window)
+    except FileNotFoundError:
+        pass
+
+    source = os.path.join(scratch, segment.segment_id + SEGMENT_SUFFIX)
+    write_segment(segment, source)
+    try:
+        return _archive_file(source, destination, executor, window)
+    finally:
+        os.remove(source)
+
+
+def _restore_file(source: str, destination: str, chunks: List[List[int]], executor: Executor, window: int):
+    """ Streams an archived file back out, decompressing its chunks in parallel. """
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        compressed = ((src.read(size), checksum) for size, checksum in chunks)
+        for data in _pipeline(executor, _decompress, compressed, window):
+            dst.write(data)
+        dst.flush()
+        os.fsync(dst.fileno())
+
+
+def _write_json(path: str, data: Any):
+    with open(path + ".tmp", "w", encoding="UTF-8") as file:
+        json.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="UTF-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError) as e:
+        raise InvalidSnapshot(f"{path!r} is not a snapshot: {e}") from None
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise InvalidSnapshot(f"snapshot version {manifest.get('version')!r} is not supported")
+    return manifest
+
+
+def latest_snapshot(directory: str) -> Optional[str]:
+    """ The most recent complete snapshot within a directory, if any. """
+    if not os.path.isdir(directory):
+        return None
+
+    snapshots = sorted(
+        (name for name in os.listdir(directory) if name.startswith("snapshot-")),
+        key=lambda name: int(name.split("-")[1]),
+    )
+    for name in reversed(snapshots):
+        path = os.path.join(directory, name)
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            return path
+    return None
+
+
+def create_snapshot(engine, directory: str, threads: int = DEFAULT_SNAPSHOT_THREADS) -> str:
+    """
+    Snapshots every `FileSystem` index of the engine into a new snapshot
+    within `directory`, returning its path.
+
+    Each index is only paused for as long as it takes to pin its committed
+    segments. Segments already archived by the most recent snapshot in the
+    directory are referenced by the manifest rather than archived again,
+    so every snapshot it references must be kept.
+    """
+    os.makedirs(directory, exist_ok=True)
+    previous: Dict[str, Dict[str, Any]] = {}
+    latest = latest_snapshot(directory)
+    if latest is not None:
+        for entry in read_manifest(latest)["indexes"].values():
+            for segment in entry["segments"]:
+                previous[segment["id"]] = segment
+
+    name = f"snapshot-{time.time_ns() // 1_000_000}-lnx-v{LNX_VERSION}"
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "lnx_version": LNX_VERSION,
+        "created": int(time.time()),
+        "indexes": {},
+    }
+    with ThreadPoolExecutor(threads) as executor, tempfile.TemporaryDirectory(dir=path) as scratch:
+        for index in engine.indexes():
+            if index.directory is None:
+                continue
+
+            segments = []
+            for segment, deleted in zip(*index.pin()):
+                archived = previous.get(segment.segment_id)
+                if archived is None:
+                    file = segment.segment_id + SEGMENT_SUFFIX + ".z"
+                    archived = {
+                        "id": segment.segment_id,
+                        "snapshot": name,
+                        "file": file,
+                        "chunks": _archive_segment(
+                            index.directory,
+                            segment,
+                            scratch,
+                            os.path.join(path, file),
+                            executor,
+                            threads * 2,
+                        ),
+                    }
+                segments.append({**archived, "deleted": deleted.encode()})
+
+            manifest["indexes"][index.name] = {
+                "declaration": json.loads(index.declaration.json()),
+                "segments": segments,
+            }
+
+    # The manifest is written last, a snapshot without one is incomplete.
+    _write_json(os.path.join(path, MANIFEST_FILE), manifest)
+    return path
+
+
+def restore_snapshot(path: str, data_dir: str, threads: int = DEFAULT_SNAPSHOT_THREADS) -> List[str]:
+    """
+    Restores every index of a snapshot into `data_dir`, replacing any
+    existing index of the same name, and returns the restored names.
+
+    Archived segments are streamed straight into each index directory
+    with their chunks decompressed in parallel.
+    """
+    manifest = read_manifest(path)
+    root = os.path.dirname(os.path.abspath(path))
+
+    with ThreadPoolExecutor(threads) as executor:
+        for name, entry in manifest["indexes"].items():
+            directory = os.path.join(data_dir, name)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.makedirs(os.path.join(directory, SEGMENTS_DIR))
+
+            for segment in entry["segments"]:
+                source = os.path.join(root, segment["snapshot"], segment["file"])
+                _restore_file(
+                    source,
+                    segment_path(directory, segment["id"]),
+                    segment["chunks"],
+                    executor,
+                    threads * 2,
+                )
+            write_segment_list(
+                directory,
+                [(s["id"], Tombstones.decode(s["deleted"])) for s in entry["segments"]],
+                0,
+            )
+
+            # The declaration is written last so a partly restored index is never opened.
+            _write_json(os.path.join(directory, DECLARATION_FILE), entry["declaration"])
+    return list(manifest["indexes"])
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Create or restore snapshots of lnx indexes.")
+    parser.add_argument("--data-dir", default=os.environ.get("LNX_DATA_DIR", "./index"))
+    parser.add_argument("--threads", type=int, default=DEFAULT_SNAPSHOT_THREADS)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="snapshot every filesystem index")
+    create.add_argument("--snapshot-directory", default="snapshots")
+    restore = commands.add_parser("restore", help="restore the indexes of a snapshot")
+    restore.add_argument("snapshot")
+
+    parsed = parser.parse_args(args)
+    from .engine import Engine, lock_data_dir
+
+    # A running server holds the data directory, which must not be opened or restored into under it.
+    try:
+        if parsed.command == "create":
+            engine = Engine(parsed.data_dir)
+            try:
+                print(create_snapshot(engine, parsed.snapshot_directory, parsed.threads))
+            finally:
+                engine.close()
+        else:
+            os.makedirs(parsed.data_dir, exist_ok=True)
+            lock = lock_data_dir(parsed.data_dir)
+            try:
+                for name in restore_snapshot(parsed.snapshot, parsed.data_dir, parsed.threads):
+                    print(f"restored index {name!r}")
+            finally:
+                if lock is not None:
+                    lock.close()
+    except DataDirectoryInUse as e:
+        if parsed.command == "create":
+            parser.exit(1, f"{e}, take the snapshot through POST /snapshots instead\n")
+        parser.exit(1, f"{e}, stop it before restoring\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .doc_store import DocStore
+from .facets import FacetColumn
+from .fast_fields import FastFieldColumn
+from .keys import KeyIndex, hash_slots, key_hash
+from .segment import FieldIndex, Segment
+from .term_vectors import TermVectors
+from .tombstones import Tombstones
+
+SEGMENT_MAGIC = b"LNXSEG\x00\x02"
+
+# The file within an index directory holding the index's declaration.
+DECLARATION_FILE = "index.json"
+
+# The offset and length of the table of contents, at the very end of the file.
+_FOOTER = struct.Struct("<QQ")
+
+# Sections are aligned so they can be cast in place once memory mapped.
+_ALIGNMENT = 8
+
+SEGMENTS_DIR = "segments"
+
+# The committed segments of an index directory and their tombstones.
+SEGMENTS_FILE = "segments.json"
+
+SEGMENT_SUFFIX = ".seg"
+
+
+def segment_path(directory: str, segment_id: str) -> str:
+    return os.path.join(directory, SEGMENTS_DIR, segment_id + SEGMENT_SUFFIX)
+
+
+def _joined(values: Iterable[bytes]) -> Tuple[bytes, array]:
+    """ Concatenates byte strings, returning the blob and their offsets. """
+    offsets = array("Q", [0])
+    parts = []
+    total = 0
+    for value in values:
+        parts.append(value)
+        total += len(value)
+        offsets.append(total)
+    return b"".join(parts), offsets
+
+
+class _SectionWriter:
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.position = len(SEGMENT_MAGIC)
+        self.toc: Dict[str, List[Any]] = {}
+        file.write(SEGMENT_MAGIC)
+
+    def write(self, name: str, data, typecode: str = "B"):
+        data = memoryview(data).cast("B")
+        padding = -self.position % _ALIGNMENT
+        self.file.write(b"\0" * padding)
+        self.position += padding
+
+        self.toc[name] = [self.position, len(data), typecode]
+        self.file.write(data)
+        self.position += len(data)
+
+    def finish(self, meta: Dict[str, Any]):
+        toc = json.dumps({"sections": self.toc, **meta}).encode()
+        self.file.write(toc)
+        self.file.write(_FOOTER.pack(self.position, len(toc)))
+
+
+def write_segment(segment: Segment, path: str):
+    """
+    Writes a segment's documents to a single file.
+
+    Every array is written as an aligned section in its native layout and
+    a table of contents naming each section is written at the end.
+    """
+    with open(path, "wb") as file:
+        writer = _SectionWriter(file)
+        writer.write("doc_ids", segment.doc_ids, "Q")
+
+        for name, field in segment.fields.items():
+            terms, term_offsets = _joined(term.encode() for term in field.vocabulary())
+            writer.write(f"fields/{name}/terms", terms)
+            writer.write(f"fields/{name}/term_offsets", term_offsets, "Q")
+            writer.write(f"fields/{name}/offsets", field.offsets, "Q")
+            writer.write(f"fields/{name}/docs", field.docs, "I")
+            writer.write(f"fields/{name}/freqs", field.freqs, "I")
+            writer.write(f"fields/{name}/lengths", field.lengths, "I")
+            writer.write(f"fields/{name}/skips", field.skips, "I")
+
+        for name, column in segment.fast_fields.items():
+            writer.write(f"fast_fields/{name}/values", array(column.typecode, column.values), column.typecode)
+            if column.multi:
+                writer.write(f"fast_fields/{name}/offsets", array("Q", column.offsets), "Q")
+            writer.write(f"fast_fields/{name}/sorted_values", column.sorted_values, column.typecode)
+            writer.write(f"fast_fields/{name}/sorted_ordinals", column.sorted_ordinals, "I")
+
+        for name, keys in segment.keys.items():
+            encoded = [key.encode() for key in keys.vocabulary()]
+            blob, key_offsets = _joined(encoded)
+            writer.write(f"keys/{name}/keys", blob)
+            writer.write(f"keys/{name}/key_offsets", key_offsets, "Q")
+            writer.write(f"keys/{name}/slots", hash_slots(encoded), "q")
+            writer.write(f"keys/{name}/offsets", keys.offsets, "Q")
+            writer.write(f"keys/{name}/docs", keys.docs, "I")
+
+        for name, vectors in segment.vectors.items():
+            writer.write(f"vectors/{name}/offsets", vectors.offsets, "Q")
+            writer.write(f"vectors/{name}/terms", vectors.terms, "I")
+            writer.write(f"vectors/{name}/freqs", vectors.freqs, "I")
+
+        for name, column in segment.facets.items():
+            paths, path_offsets = _joined(path.encode() for path in column.names)
+            writer.write(f"facets/{name}/paths", paths)
+            writer.write(f"facets/{name}/path_offsets", path_offsets, "Q")
+            writer.write(f"facets/{name}/sets", column.sets, "I")
+            writer.write(f"facets/{name}/offsets", column.offsets, "Q")
+            writer.write(f"facets/{name}/ordinals", column.ordinals, "I")
+
+        stored = segment.stored
+        writer.write("stored/blocks", stored.blocks)
+        writer.write("stored/offsets", stored.offsets, "Q")
+        writer.write("stored/starts", stored.starts, "I")
+
+        writer.finish({
+            "segment_id": segment.segment_id,
+            "fields": list(segment.fields),
+            "fast_fields": list(segment.fast_fields),
+            "keys": list(segment.keys),
+            "vectors": list(segment.vectors),
+            "facets": list(segment.facets),
+            "total_lengths": {name: field.total_length for name, field in segment.fields.items()},
+        })
+        file.flush()
+        os.fsync(file.fileno())
+
+
+class TermDictionary:
+    """
+    A read only term to term id mapping over a memory mapped segment.
+
+    Terms are stored sorted by their UTF-8 bytes, which matches the order
+    ids are assigned in, so looking up a term is a binary search over
+    the mapped terms rather than a dictionary built on open.
+    """
+
+    __slots__ = ("_terms", "_offsets")
+
+    def __init__(self, terms: memoryview, offsets: memoryview):
+        self._terms = terms
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _term(self, term_id: int) -> bytes:
+        return self._terms[self._offsets[term_id]:self._offsets[term_id + 1]].tobytes()
+
+    def term(self, term_id: int) -> str:
+        return self._term(term_id).decode()
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        key = term.encode()
+        low, high = 0, len(self)
+        while low < high:
+            mid = (low + high) // 2
+            if self._term(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self) and self._term(low) == key:
+            return low
+        return default
+
+    def __contains__(self, term: str) -> bool:
+        return self.get(term) is not None
+
+    def keys(self) -> Iterator[str]:
+        for term_id in range(len(self)):
+            yield self._term(term_id).decode()
+
+    __iter__ = keys
+
+
+class KeyDictionary(TermDictionary):
+    """
+    A read only key to key id mapping over a memory mapped segment, keys
+    are found through the hash table written alongside them rather than
+    a binary search.
+    """
+
+    __slots__ = ("_slots",)
+
+    def __init__(self, keys: memoryview, offsets: memoryview, slots: memoryview):
+        super().__init__(keys, offsets)
+        self._slots = slots
+
+    def get(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        encoded = key.encode()
+        mask = len(self._slots) - 1
+        slot = key_hash(encoded) & mask
+        while True:
+            key_id = self._slots[slot]
+            if key_id < 0:
+                return default
+            if self._term(key_id) == encoded:
+                return key_id
+            slot = (slot + 1) & mask
+
+
+def open_segment(path: str) -> Segment:
+    """
+    Memory maps a segment written with `write_segment`.
+
+    Only the table of contents is read, every section is used straight
+    from the mapping so opening a segment costs the same regardless of
+    its size and its pages are shared through the OS page cache.
+    """
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mapped[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+        raise ValueError(f"{path!r} is not a segment file")
+
+    toc_offset, toc_length = _FOOTER.unpack_from(mapped, len(mapped) - _FOOTER.size)
+    meta = json.loads(mapped[toc_offset:toc_offset + toc_length])
+    sections = meta["sections"]
+    view = memoryview(mapped)
+
+    def section(name: str) -> memoryview:
+        offset, length, typecode = sections[name]
+        return view[offset:offset + length].cast(typecode)
+
+    fields = {}
+    for name in meta["fields"]:
+        fields[name] = FieldIndex(
+            TermDictionary(section(f"fields/{name}/terms"), section(f"fields/{name}/term_offsets")),
+            section(f"fields/{name}/offsets"),
+            section(f"fields/{name}/docs"),
+            section(f"fields/{name}/freqs"),
+            section(f"fields/{name}/lengths"),
+            meta["total_lengths"][name],
+            section(f"fields/{name}/skips"),
+        )
+
+    fast_fields = {}
+    for name in meta["fast_fields"]:
+        values = section(f"fast_fields/{name}/values")
+        offsets = None
+        if f"fast_fields/{name}/offsets" in sections:
+            offsets = section(f"fast_fields/{name}/offsets")
+        fast_fields[name] = FastFieldColumn(
+            values.format,
+            values,
+            offsets,
+            section(f"fast_fields/{name}/sorted_values"),
+            section(f"fast_fields/{name}/sorted_ordinals"),
+        )
+
+    keys = {}
+    for name in meta["keys"]:
+        keys[name] = KeyIndex(
+            KeyDictionary(
+                section(f"keys/{name}/keys"),
+                section(f"keys/{name}/key_offsets"),
+                section(f"keys/{name}/slots"),
+            ),
+            section(f"keys/{name}/offsets"),
+            section(f"keys/{name}/docs"),
+        )
+
+    vectors = {}
+    for name in meta["vectors"]:
+        vectors[name] = TermVectors(
+            section(f"vectors/{name}/offsets"),
+            section(f"vectors/{name}/terms"),
+            section(f"vectors/{name}/freqs"),
+        )
+
+    facets = {}
+    for name in meta["facets"]:
+        facets[name] = FacetColumn(
+            TermDictionary(section(f"facets/{name}/paths"), section(f"facets/{name}/path_offsets")),
+            section(f"facets/{name}/sets"),
+            section(f"facets/{name}/offsets"),
+            section(f"facets/{name}/ordinals"),
+        )
+
+    stored = DocStore(section("stored/blocks"), section("stored/offsets"), section("stored/starts"))
+    return Segment(meta["segment_id"], section("doc_ids"), fields, fast_fields, stored, keys, vectors, facets)
+
+
+def write_segment_list(directory: str, segments: List[Tuple[str, Tombstones]], checkpoint: int):
+    """
+    Atomically replaces the list of an index directory's saved segments,
+    `checkpoint` is the write-ahead log position the segments include
+    every change up to.
+    """
+    path = os.path.join(directory, SEGMENTS_FILE)
+    data = [{"id": segment_id, "deleted": deleted.encode()} for segment_id, deleted in segments]
+    with open(path + ".tmp", "w", encoding="UTF-8") as file:
+        json.dump({"checkpoint": checkpoint, "segments": data}, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def load_segments(directory: str) -> Tuple[List[Segment], int]:
+    """
+    Opens the saved segments of an index directory, returning them along
+    with the write-ahead log position they were saved at.
+    """
+    os.makedirs(os.path.join(directory, SEGMENTS_DIR), exist_ok=True)
+    path = os.path.join(directory, SEGMENTS_FILE)
+    if not os.path.exists(path):
+        return [], 0
+
+    with open(path, encoding="UTF-8") as file:
+        saved = json.load(file)
+
+    segments = []
+    for entry in saved["segments"]:
+        segment = open_segment(segment_path(directory, entry["id"]))
+        segment.deleted = Tombstones.decode(entry["deleted"])
+        segments.append(segment)
+    return segments, saved["checkpoint"]
+
+
+def remove_unused_segments(directory: str, segment_ids: Iterable[str]):
+    """ Removes every segment file which is no longer in the saved list. """
+    used = {segment_id + SEGMENT_SUFFIX for segment_id in segment_ids}
+    segments_dir = os.path.join(directory, SEGMENTS_DIR)
+    for name in os.listdir(segments_dir):
+        if name not in used:
+            os.remove(os.path.join(segments_dir, name))
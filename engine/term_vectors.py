@@ -0,0 +1,52 @@
+from array import array
+from collections import Counter
+from itertools import accumulate, chain, repeat
+from operator import add, floordiv, mod, mul, sub
+from typing import Iterator, Sequence, Tuple
+
+
+class TermVectors:
+    """
+    The terms of each document of a field within a segment.
+
+    Vectors are stored in CSR form by doc ordinal, the term ids and their
+    frequencies of document `d` live at `offsets[d]:offsets[d + 1]` within
+    the shared `terms` and `freqs` arrays. Term ids are the ids of the
+    field's index within the same segment.
+    """
+
+    __slots__ = ("offsets", "terms", "freqs")
+
+    def __init__(self, offsets: Sequence[int], terms: Sequence[int], freqs: Sequence[int]):
+        self.offsets = offsets
+        self.terms = terms
+        self.freqs = freqs
+
+    @classmethod
+    def from_postings(cls, offsets: Sequence[int], docs: Sequence[int], freqs: Sequence[int], num_docs: int) -> "TermVectors":
+        """
+        Transposes a field's postings into term vectors.
+
+        Each posting is packed into a single (ordinal, term id) integer and
+        sorted in bulk, so no posting is visited by a Python loop.
+        """
+        num_terms = len(offsets) - 1
+        stride = max(num_terms, 1)
+        doc_freqs = map(sub, offsets[1:], offsets[:-1])
+        term_ids = chain.from_iterable(map(repeat, range(num_terms), doc_freqs))
+
+        packed = list(map(add, map(mul, docs, repeat(stride)), term_ids))
+        order = sorted(range(len(packed)), key=packed.__getitem__)
+        keys = list(map(packed.__getitem__, order))
+
+        lengths = Counter(map(floordiv, keys, repeat(stride)))
+        return cls(
+            array("Q", accumulate(map(lengths.__getitem__, range(num_docs)), initial=0)),
+            array("I", map(mod, keys, repeat(stride))),
+            array("I", map(freqs.__getitem__, order)),
+        )
+
+    def vector(self, ordinal: int) -> Iterator[Tuple[int, int]]:
+        """ The term ids and frequencies of a single document. """
+        start, stop = self.offsets[ordinal], self.offsets[ordinal + 1]
+        return zip(self.terms[start:stop], self.freqs[start:stop])
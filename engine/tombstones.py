@@ -0,0 +1,73 @@
+import base64
+import zlib
+from typing import Iterable, Iterator, Optional
+
+
+def _popcount(value: int) -> int:
+    return bin(value).count("1")
+
+
+def _ordinals(bits: Iterable[int]) -> Iterator[int]:
+    """ The position of every set bit across a sequence of bytes. """
+    for i, byte in enumerate(bits):
+        if byte:
+            base = i << 3
+            for bit in range(8):
+                if byte & (1 << bit):
+                    yield base + bit
+
+
+class Tombstones:
+    """
+    A bitset of the deleted ordinals of a segment.
+
+    Searchers check it while scoring so deleted documents never reach the
+    collector, the documents themselves are only dropped once their
+    segment is merged. The tombstones of a published segment are never
+    changed, commits delete from a copy and publish it.
+    """
+
+    __slots__ = ("_bits", "_count")
+
+    def __init__(self, size: int = 0, bits: Optional[bytearray] = None):
+        if bits is None:
+            bits = bytearray((size + 7) // 8)
+        self._bits = bits
+        self._count = _popcount(int.from_bytes(bits, "little")) if any(bits) else 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, ordinal: int) -> bool:
+        return bool(self._bits[ordinal >> 3] & (1 << (ordinal & 7)))
+
+    def __iter__(self) -> Iterator[int]:
+        return _ordinals(self._bits)
+
+    def add(self, ordinal: int) -> bool:
+        """ Marks an ordinal as deleted, returning `False` if it already was. """
+        index, mask = ordinal >> 3, 1 << (ordinal & 7)
+        if self._bits[index] & mask:
+            return False
+        self._bits[index] |= mask
+        self._count += 1
+        return True
+
+    def update(self, ordinals: Iterable[int]) -> int:
+        """ Marks several ordinals as deleted, returning how many were newly deleted. """
+        return sum(self.add(ordinal) for ordinal in ordinals)
+
+    def copy(self) -> "Tombstones":
+        return Tombstones(bits=bytearray(self._bits))
+
+    def difference(self, other: "Tombstones") -> Iterator[int]:
+        """ The ordinals deleted here but not in `other`, e.g. an earlier copy. """
+        return _ordinals(a & ~b for a, b in zip(self._bits, other._bits))
+
+    def encode(self) -> str:
+        """ A compact text form of the bitset, used to save it alongside the segment. """
+        return base64.b64encode(zlib.compress(bytes(self._bits))).decode()
+
+    @classmethod
+    def decode(cls, data: str) -> "Tombstones":
+        return cls(bits=bytearray(zlib.decompress(base64.b64decode(data))))
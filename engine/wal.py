@@ -0,0 +1,257 @@
+import json
+import os
+import shutil
+import struct
+import threading
+import uuid
+import zlib
+from typing import Any, BinaryIO, Dict, Iterator, Tuple
+
+# Every record is framed by its payload length and the crc32 of the payload,
+# a torn or corrupt record at the tail of the log fails its checksum.
+_FRAME = struct.Struct("<II")
+
+# The record marking the end of a committed transaction.
+COMMIT_RECORD = ["commit"]
+
+# magic, the log position the first record in the file starts at
+_HEADER = struct.Struct("<8sQ")
+LOG_MAGIC = b"LNXWAL\x00\x01"
+
+LOG_FILE = "wal.log"
+
+
+def encode_record(record: Any) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_header(file: BinaryIO) -> int:
+    file.seek(0)
+    header = file.read(_HEADER.size)
+    if len(header) < _HEADER.size or header[:len(LOG_MAGIC)] != LOG_MAGIC:
+        raise ValueError(f"{file.name!r} is not a write-ahead log")
+    return _HEADER.unpack(header)[1]
+
+
+def _write_log(path: str, base: int, data: bytes = b""):
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(LOG_MAGIC, base))
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _read_records(file: BinaryIO, base: int) -> Iterator[Tuple[int, Any]]:
+    """ Yields each intact record along with the log position it ends at. """
+    file.seek(_HEADER.size)
+    position = base
+    while True:
+        frame = file.read(_FRAME.size)
+        if len(frame) < _FRAME.size:
+            return
+
+        length, checksum = _FRAME.unpack(frame)
+        payload = file.read(length)
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return
+
+        position += _FRAME.size + length
+        yield position, json.loads(payload)
+
+
+def _fsync(file: BinaryIO):
+    if hasattr(os, "fdatasync"):
+        os.fdatasync(file.fileno())
+    else:
+        os.fsync(file.fileno())
+
+
+def _fsync_dir(path: str):
+    if os.name == "posix":
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class StagedLog:
+    """
+    Records staged in a side file, they only become part of the log once
+    adopted by it so a failed bulk load never reaches the log.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "wb")
+
+    def append(self, record: Any):
+        self._file.write(encode_record(record))
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+class WriteAheadLog:
+    """
+    An append-only log of an index's uncommitted writes.
+
+    Writes are appended as they are made without waiting for the disk, a
+    commit appends a commit record and then waits for the log to be
+    synced. Concurrent commits share a single sync, whichever commit
+    syncs first makes every record written before it durable.
+
+    Only records followed by a commit record are ever replayed, a rollback
+    truncates the log back to the end of the last commit.
+
+    Positions within the log keep counting up across checkpoints, a
+    checkpoint drops every record before a position by rewriting the file
+    to start at it.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, LOG_FILE)
+        self.directory = directory
+        self.commits = 0
+        self.syncs = 0
+
+        # Staged logs left behind by a crash during a bulk load were never adopted.
+        for name in os.listdir(directory):
+            if name.startswith("staged-") and name.endswith(".log"):
+                os.remove(os.path.join(directory, name))
+
+        if not os.path.exists(self.path):
+            _write_log(self.path, 0)
+            _fsync_dir(directory)
+
+        self._file = open(self.path, "ab+")
+        self._base = _read_header(self._file)
+
+        # Anything after the last commit record is either a torn write or
+        # an uncommitted transaction from before a crash, neither survive.
+        self._committed = self._base
+        for position, record in _read_records(self._file, self._base):
+            if record == COMMIT_RECORD:
+                self._committed = position
+        self._file.truncate(self._offset(self._committed))
+
+        self._position = self._committed
+        self._synced = self._committed
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def _offset(self, position: int) -> int:
+        return _HEADER.size + position - self._base
+
+    def records(self, after: int = 0) -> Iterator[Any]:
+        """
+        Every committed record ending after the given position, including
+        the commit records.
+        """
+        with open(self.path, "rb") as file:
+            for position, record in _read_records(file, self._base):
+                if position > self._committed:
+                    return
+                if position > after:
+                    yield record
+
+    @property
+    def committed(self) -> int:
+        """ The position of the end of the last commit. """
+        return self._committed
+
+    def append(self, record: Any):
+        data = encode_record(record)
+        with self._lock:
+            self._file.write(data)
+            self._position += len(data)
+
+    def commit(self) -> int:
+        """
+        Appends a commit record, returning the position the log must be
+        synced to for the commit to be durable.
+        """
+        data = encode_record(COMMIT_RECORD)
+        with self._lock:
+            self._file.write(data)
+            self._position += len(data)
+            self._committed = self._position
+            self.commits += 1
+            return self._committed
+
+    def sync(self, position: int):
+        """ Waits until the log is durable up to `position`. """
+        if self._synced >= position:
+            return
+
+        with self._sync_lock:
+            # A sync started while we waited may have already covered us.
+            if self._synced >= position:
+                return
+
+            with self._lock:
+                self._file.flush()
+                target = self._position
+
+            _fsync(self._file)
+            self._synced = target
+            self.syncs += 1
+
+    def rollback(self):
+        """ Drops every record written since the last commit. """
+        with self._sync_lock, self._lock:
+            self._file.flush()
+            self._file.truncate(self._offset(self._committed))
+            self._position = self._committed
+            self._synced = min(self._synced, self._committed)
+
+    def stage(self) -> StagedLog:
+        return StagedLog(os.path.join(self.directory, f"staged-{uuid.uuid4().hex}.log"))
+
+    def adopt(self, staged: StagedLog):
+        """ Appends every record of a staged log and removes it. """
+        staged.close()
+        with open(staged.path, "rb") as source, self._lock:
+            shutil.copyfileobj(source, self._file)
+            self._position += source.tell()
+        os.remove(staged.path)
+
+    def checkpoint(self, position: int):
+        """
+        Drops every record before `position` once the changes they hold
+        have been saved elsewhere, the records after it are kept.
+        """
+        with self._sync_lock, self._lock:
+            if position <= self._base:
+                return
+
+            self._file.flush()
+            with open(self.path, "rb") as file:
+                file.seek(self._offset(position))
+                tail = file.read()
+
+            _write_log(self.path + ".tmp", position, tail)
+            os.replace(self.path + ".tmp", self.path)
+            _fsync_dir(self.directory)
+
+            self._file.close()
+            self._file = open(self.path, "ab+")
+            self._base = position
+            self._synced = self._position
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "log_bytes": self._position - self._base,
+            "log_commits": self.commits,
+            "log_syncs": self.syncs,
+        }
+
@@ -0,0 +1,358 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .errors import InvalidDocument
+from .schema import Document, RawValue, Schema
+from .segment import Segment
+from .wal import COMMIT_RECORD, StagedLog, WriteAheadLog
+
+RawDocument = Dict[str, RawValue]
+
+DEFAULT_WRITER_BUFFER = 50_000_000
+DEFAULT_WRITER_THREADS = 2
+
+# Pending writer operations, applied in order when the index is committed.
+OP_ADD_SEGMENT = "add_segment"
+OP_DELETE_IDS = "delete_ids"
+OP_DELETE_TERMS = "delete_terms"
+OP_CLEAR = "clear"
+
+# Only ever written to the write-ahead log, added documents are replayed
+# through the buffer like any other write.
+OP_ADD_DOCUMENTS = "add_documents"
+# A batch of a bulk load, replayed into segments of its own as its ids were
+# taken before those of any add made while the stream was open.
+OP_ADD_BATCH = "add_batch"
+
+
+def document_size(doc: Document) -> int:
+    """ A rough estimate of the bytes a document takes up in the writer buffer. """
+    size = 0
+    for values in doc.values():
+        for value in values:
+            size += len(value) if isinstance(value, str) else 8
+    return size
+
+
+def _record(op: tuple) -> list:
+    """ The write-ahead log record of a delete or clear operation. """
+    if op[0] == OP_DELETE_IDS:
+        return [OP_DELETE_IDS, sorted(op[1])]
+    return list(op)
+
+
+def _completed(segment: Segment) -> Future:
+    future = Future()
+    future.set_result(segment)
+    return future
+
+
+class IndexWriter:
+    """
+    Buffers an index's writes until they are committed.
+
+    Added documents collect in an in-memory buffer until it reaches
+    `buffer_size` bytes, the buffer is then handed to one of the
+    `threads` indexing threads and built into an immutable segment in
+    the background while the buffer keeps filling.
+
+    Every write is recorded as an operation, segments are queued as
+    futures, and applied in order by the index on commit. If the index
+    keeps a write-ahead log every write is also appended to it in the
+    same order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        schema: Schema,
+        buffer_size: Optional[int],
+        threads: Optional[int],
+        processes: int = 0,
+    ):
+        self.schema = schema
+        self.buffer_size = buffer_size or DEFAULT_WRITER_BUFFER
+        self.threads = threads or DEFAULT_WRITER_THREADS
+        self.processes = processes
+        self.segments_flushed = 0
+
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix=f"{name}-writer")
+        # Bulk loads are built in worker processes when set, so analyzing
+        # several batches isn't held back by the GIL.
+        self._process_pool = ProcessPoolExecutor(processes) if processes else None
+        self._buffer: List[Tuple[int, Document]] = []
+        self._buffered_bytes = 0
+        self._pending_docs = 0
+        self._pending_bytes = 0
+        self._ops: List[tuple] = []
+        self._lock = threading.Lock()
+        self._id_lock = threading.Lock()
+        self._last_doc_id = 0
+        self.wal: Optional[WriteAheadLog] = None
+
+        # Called once the bytes pending since the last commit cross
+        # `nearly_full_bytes`, used to commit early.
+        self.on_nearly_full: Optional[Callable[[], None]] = None
+        self.nearly_full_bytes = self.buffer_size
+
+    def next_doc_id(self) -> int:
+        # Ids are time based so they are unique across restarts and always
+        # ascend. Adds are buffered in the order their ids are taken, while a
+        # bulk load's batches never share a segment with other writes, so the
+        # ids within each segment are sorted.
+        with self._id_lock:
+            self._last_doc_id = max(self._last_doc_id + 1, time.time_ns())
+            return self._last_doc_id
+
+    def build(self, documents: List[Tuple[int, Document]], bulk: bool = False) -> Future:
+        """
+        Builds a segment from a batch of documents on an indexing thread,
+        or a worker process for bulk loads if the writer has any.
+        """
+        self.segments_flushed += 1
+        executor = self._executor
+        if bulk and self._process_pool is not None:
+            executor = self._process_pool
+        return executor.submit(Segment.build, uuid.uuid4().hex, self.schema, documents)
+
+    @property
+    def bulk_workers(self) -> int:
+        """ The number of batches a bulk load can build at once. """
+        return self.processes or self.threads
+
+    def _flush(self):
+        if self._buffer:
+            self._ops.append((OP_ADD_SEGMENT, self.build(self._buffer)))
+            self._buffer = []
+            self._buffered_bytes = 0
+
+    def _buffer_documents(self, documents: List[Tuple[int, Document]]):
+        for doc_id, doc in documents:
+            self._buffer.append((doc_id, doc))
+            size = document_size(doc)
+            self._buffered_bytes += size
+            self._pending_bytes += size
+            self._pending_docs += 1
+            if self._buffered_bytes >= self.buffer_size:
+                self._flush()
+
+    def add(self, documents: List[Document]):
+        """ Adds validated documents to the buffer, flushing it once it is full. """
+        with self._lock:
+            added = [(self.next_doc_id(), doc) for doc in documents]
+            if self.wal is not None:
+                self.wal.append([OP_ADD_DOCUMENTS, added])
+            self._buffer_documents(added)
+            nearly_full = self._pending_bytes >= self.nearly_full_bytes
+
+        if nearly_full and self.on_nearly_full is not None:
+            self.on_nearly_full()
+
+    def add_segments(self, segments: List[Segment], log: Optional[StagedLog] = None):
+        with self._lock:
+            self._flush()
+            if log is not None:
+                self.wal.adopt(log)
+            for segment in segments:
+                self._ops.append((OP_ADD_SEGMENT, _completed(segment)))
+                self._pending_docs += len(segment)
+
+    def queue(self, *op: Any):
+        """
+        Queues a delete or clear operation, the buffer is flushed first so
+        the operation applies to every document added before it.
+        """
+        with self._lock:
+            self._flush()
+            if self.wal is not None:
+                self.wal.append(_record(op))
+            self._ops.append(op)
+
+    def take(self) -> Tuple[List[tuple], Optional[int]]:
+        """
+        Flushes the buffer and hands over every pending operation, along
+        with the log position which must be synced for them to be durable.
+        """
+        with self._lock:
+            self._flush()
+            ops, self._ops = self._ops, []
+            self._pending_docs = 0
+            self._pending_bytes = 0
+
+            position = None
+            if ops and self.wal is not None:
+                position = self.wal.commit()
+            return ops, position
+
+    def sync(self, position: Optional[int]):
+        if position is not None:
+            self.wal.sync(position)
+
+    def replay(self, record: list) -> bool:
+        """
+        Re-applies a write-ahead log record, returning `True` if it marks
+        the end of a committed transaction.
+        """
+        kind = record[0]
+        if record == COMMIT_RECORD:
+            return True
+
+        with self._lock:
+            if kind in (OP_ADD_DOCUMENTS, OP_ADD_BATCH):
+                documents = [(doc_id, doc) for doc_id, doc in record[1]]
+                if documents:
+                    self._last_doc_id = max(self._last_doc_id, documents[-1][0])
+                if kind == OP_ADD_BATCH:
+                    self._flush()
+                self._buffer_documents(documents)
+                if kind == OP_ADD_BATCH:
+                    self._flush()
+            else:
+                self._flush()
+                if kind == OP_DELETE_IDS:
+                    self._ops.append((OP_DELETE_IDS, frozenset(record[1])))
+                else:
+                    self._ops.append(tuple(record))
+        return False
+
+    def discard(self):
+        """ Drops every pending operation, used to rollback. """
+        with self._lock:
+            for op in self._ops:
+                if op[0] == OP_ADD_SEGMENT:
+                    op[1].cancel()
+            self._ops.clear()
+            if self.wal is not None:
+                self.wal.rollback()
+            self._buffer = []
+            self._buffered_bytes = 0
+            self._pending_docs = 0
+            self._pending_bytes = 0
+
+    @property
+    def pending_docs(self) -> int:
+        return self._pending_docs
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._ops or self._buffer)
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._buffered_bytes
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+        if self.wal is not None:
+            self.wal.close()
+
+    def stats(self) -> Dict[str, int]:
+        stats = {
+            "pending_docs": self._pending_docs,
+            "buffered_bytes": self._buffered_bytes,
+            "buffer_size": self.buffer_size,
+            "threads": self.threads,
+            "processes": self.processes,
+            "segments_flushed": self.segments_flushed,
+        }
+        if self.wal is not None:
+            stats.update(self.wal.stats())
+        return stats
+
+
+class BulkWriter:
+    """
+    Stages a stream of documents for an index in bounded batches.
+
+    Each full batch is built straight into a compact segment on the
+    writer's indexing threads, or its worker processes if it has any, so
+    the raw documents can be released, at most one batch per worker is
+    ever in flight. The staged segments
+    are only queued on the writer once the whole stream is accepted,
+    until then the batches are logged to a staged log.
+
+    Documents are given their ids as they are validated, so adds made
+    while the stream is open can have larger ids yet be published first,
+    each batch is kept in a segment of its own so its ids stay sorted.
+    """
+
+    def __init__(self, writer: IndexWriter):
+        self.writer = writer
+        self.count = 0
+        self._batch: List[Tuple[int, Document]] = []
+        self._batch_bytes = 0
+        self._building: Deque[Future] = deque()
+        self._staged: List[Segment] = []
+        self._log: Optional[StagedLog] = None
+        if writer.wal is not None:
+            self._log = writer.wal.stage()
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.abort()
+
+    def finish(self):
+        """
+        Waits for the batches still building and queues every staged
+        segment on the writer, blocking so async callers should run it
+        on a thread.
+        """
+        try:
+            self._flush()
+            while self._building:
+                self._staged.append(self._building.popleft().result())
+        except BaseException:
+            self.abort()
+            raise
+        self.writer.add_segments(self._staged, self._log)
+        self._reset()
+
+    def abort(self):
+        """ Drops everything staged so far, none of the documents are added. """
+        if self._log is not None:
+            self._log.discard()
+        self._reset()
+
+    def _reset(self):
+        for future in self._building:
+            future.cancel()
+        self._building.clear()
+        self._batch.clear()
+        self._staged.clear()
+
+    def add(self, documents: List[RawDocument]):
+        """ Validates and stages documents, building a segment per full batch. """
+        for doc in documents:
+            try:
+                validated = self.writer.schema.validate(doc)
+            except InvalidDocument as e:
+                raise InvalidDocument(f"document {self.count + 1}: {e}") from None
+
+            self._batch.append((self.writer.next_doc_id(), validated))
+            self._batch_bytes += document_size(validated)
+            self.count += 1
+            if self._batch_bytes >= self.writer.buffer_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._batch:
+            return
+
+        if len(self._building) >= self.writer.bulk_workers:
+            self._staged.append(self._building.popleft().result())
+        if self._log is not None:
+            self._log.append([OP_ADD_BATCH, self._batch])
+        self._building.append(self.writer.build(self._batch, bulk=True))
+        self._batch = []
+        self._batch_bytes = 0
@@ -1,7 +1,7 @@
 from typing import Optional, Dict, List, Union
 
 from datetime import datetime
-from pydantic import BaseModel, conint, Field
+from pydantic import BaseModel, conint, constr, Field, StrictFloat, StrictInt, StrictStr
 from enum import Enum
 
 
@@ -26,6 +26,7 @@ class FieldDeclaration(BaseModel):
     indexed: Optional[bool]
     multi: bool = False
     fast: bool = False
+    term_vectors: bool = False
 
 
 class IndexDeclaration(BaseModel):
@@ -40,11 +41,14 @@ class IndexDeclaration(BaseModel):
 
     writer_buffer: Optional[conint(ge=300_000)]
     writer_threads: Optional[conint(gt=0)]
+    writer_processes: conint(ge=0) = 0
 
     set_conjunction_by_default: bool = False
     use_fast_fuzzy: bool = False
     strip_stop_words: bool = False
     auto_commit: int = 0
+    result_cache_size: conint(ge=0) = 1_000
+    doc_cache_bytes: conint(ge=0) = 64_000_000
 
 
 class IndexCreationPayload(BaseModel):
@@ -89,6 +93,20 @@ class TermKind(BaseModel):
     fields: Union[str, List[str]]
 
 
+class RangeKind(BaseModel):
+    """
+    The required context for the range kind query, at least one bound
+    must be given. Bounds of date fields can be a timestamp or an ISO
+    formatted datetime.
+    """
+
+    field: str
+    gt: Optional[Union[StrictInt, float, str]]
+    gte: Optional[Union[StrictInt, float, str]]
+    lt: Optional[Union[StrictInt, float, str]]
+    lte: Optional[Union[StrictInt, float, str]]
+
+
 class QueryData(BaseModel):
     occur: Occur = Occur.Should
 
@@ -109,7 +127,26 @@ class TermQueryData(QueryData):
     term: TermKind
 
 
-QueryKinds = Union[FuzzyQueryData, NormalQueryData, MoreLikeThisQueryData, TermQueryData]
+class RangeQueryData(QueryData):
+    range: RangeKind
+
+
+QueryKinds = Union[FuzzyQueryData, NormalQueryData, MoreLikeThisQueryData, TermQueryData, RangeQueryData]
+
+
+class SearchCursor(BaseModel):
+    """ The position of a hit in a result set, used to fetch the page after it. """
+
+    value: Union[StrictInt, float]
+    document_id: constr(regex=r"^\d+$")
+
+
+class FacetQuery(BaseModel):
+    """ Counts the matches of a search below each child of a facet path. """
+
+    field: str
+    path: str = "/"
+    limit: conint(gt=0) = 10
 
 
 class QueryPayload(BaseModel):
@@ -118,18 +155,47 @@ class QueryPayload(BaseModel):
     offset: conint(ge=0) = 0
     order_by: Optional[str] = None
     sort: Sort = Sort.Desc
+    search_after: Optional[SearchCursor] = None
+    facets: List[FacetQuery] = []
+
+
+class MultiSearchQuery(BaseModel):
+    """ A single search of a multi-search request and the index it runs on. """
+
+    index: str
+    search: QueryPayload
+
+
+# Strict so stored values keep their JSON type rather than being coerced to strings.
+FieldValue = Union[StrictInt, StrictFloat, StrictStr]
 
 
 class DocumentHit(BaseModel):
-    data: Dict[str, Union[List[Union[str, int, float]], str, int, float]]
+    data: Dict[str, Union[List[FieldValue], FieldValue]]
     ratio: Optional[float]
     document_id: str
 
 
+class FacetCount(BaseModel):
+    path: str
+    count: int
+
+
+class FacetResults(BaseModel):
+    """ The most common children of a requested facet path, most common first. """
+
+    field: str
+    path: str
+    counts: List[FacetCount]
+
+
 class QueryResults(BaseModel):
     hits: List[DocumentHit]
     count: int
     time_taken: float
+    next_cursor: Optional[SearchCursor]
+    facets: List[FacetResults] = []
+    cached: bool = False
 
 
 class CreateTokenPayload(BaseModel):
@@ -153,6 +219,16 @@ class QueryResponse(BasicResponse):
     data: QueryResults
 
 
+class MultiSearchResult(BasicResponse):
+    """ The results of one search of a multi-search, or why it failed. """
+
+    data: Union[QueryResults, str]
+
+
+class MultiSearchResponse(BasicResponse):
+    data: List[MultiSearchResult]
+
+
 class TokenResponse(BasicResponse):
     data: TokenData
 
@@ -161,6 +237,73 @@ class DocumentFetchResponse(BasicResponse):
     data: DocumentHit
 
 
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    capacity: int
+    generation: int
+
+
+class DocCacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    blocks: int
+    bytes: int
+    max_bytes: int
+
+
+class ReaderStats(BaseModel):
+    max_concurrency: int
+    running: int
+    queued: int
+    max_queued: int
+
+
+class WriterStats(BaseModel):
+    pending_docs: int
+    buffered_bytes: int
+    buffer_size: int
+    threads: int
+    processes: int
+    segments_flushed: int
+    merges: int
+    merging: bool
+    log_bytes: Optional[int]
+    log_commits: Optional[int]
+    log_syncs: Optional[int]
+    checkpoints: Optional[int]
+
+
+class CommitStats(BaseModel):
+    interval: int
+    commits: int
+    auto_commits: int
+    early_commits: int
+    pending_docs: int
+    last_duration_ms: float
+    mean_duration_ms: float
+
+
+class IndexStats(BaseModel):
+    num_docs: int
+    num_deleted: int
+    num_segments: int
+    stored_bytes: int
+    result_cache: CacheStats
+    more_like_this_cache: CacheStats
+    doc_cache: DocCacheStats
+    readers: ReaderStats
+    writer: WriterStats
+    commits: CommitStats
+
+
+class IndexStatsResponse(BasicResponse):
+    data: IndexStats
+
+
 class StopwordsResponse(BasicResponse):
     data: List[str]
 
@@ -0,0 +1,33 @@
+import json
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """ Encodes a response body, with orjson if it's installed. """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RawJSONResponse(Response):
+    """
+    A JSON response written straight from the engine's results.
+
+    Routes still declare their `response_model` so the OpenAPI schema is
+    unchanged, returning this response skips FastAPI validating and
+    serializing the body through that model, which for a page of hits
+    costs more than the search itself. The engine's results already have
+    the shape of the model so nothing is lost.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
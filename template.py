@@ -1,6 +1,26 @@
-from fastapi import FastAPI, Body
-
+import asyncio
+import logging
+import os
+import time
+
+from fastapi import FastAPI, Body, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from engine import Engine, EngineError, ServerOverloaded, Unauthorized
+from engine.auth import (
+    MODIFY_AUTH,
+    MODIFY_DOCUMENTS,
+    MODIFY_ENGINE,
+    MODIFY_STOP_WORDS,
+    SEARCH_INDEX,
+    TokenStore,
+)
+from engine.ingest import DocumentStream
 from models import *
+from responses import RawJSONResponse
+
+logger = logging.getLogger(__name__)
 
 
 def get_md(file: str) -> str:
@@ -8,6 +28,30 @@ def get_md(file: str) -> str:
         return file.read()
 
 
+def ok(data: Union[str, dict, list]) -> dict:
+    return {"status": 200, "data": data}
+
+
+def raw_ok(data: Union[str, dict, list]) -> RawJSONResponse:
+    """ The same as `ok` but written straight to JSON, for the hot read routes. """
+    return RawJSONResponse(ok(data))
+
+
+def query_results(results: dict, start: float) -> dict:
+    """
+    Lays out a search's results in the field order of `QueryResults`,
+    so the raw body is exactly what the response model would produce.
+    """
+    return {
+        "hits": results["hits"],
+        "count": results["count"],
+        "time_taken": time.perf_counter() - start,
+        "next_cursor": results["next_cursor"],
+        "facets": results["facets"],
+        "cached": results["cached"],
+    }
+
+
 INDEXES_TITLE = "📚 Managing indexes"
 SNAPSHOTS_TITLE = "📷 Snapshots"
 TRANSACTIONS_TITLE = "💾 Managing transactions"
@@ -68,11 +112,46 @@ lnx = FastAPI(
     ]
 )
 
+engine = Engine(os.environ.get("LNX_DATA_DIR", "./index"))
+SNAPSHOT_DIR = os.environ.get("LNX_SNAPSHOT_DIR", "./snapshots")
+tokens = TokenStore(os.environ.get("LNX_SUPER_USER_KEY"), engine.data_dir)
+
+
+def authorized(permission: int):
+    """
+    A route dependency rejecting requests whose token lacks the permission,
+    or isn't allowed the index in the route's path.
+    """
+    async def check(request: Request):
+        tokens.check(
+            request.headers.get("authorization"),
+            permission,
+            request.path_params.get("index"),
+        )
+
+    return Depends(check)
+
+
+@lnx.exception_handler(EngineError)
+async def engine_error_handler(_request: Request, exc: EngineError):
+    return JSONResponse(status_code=400, content={"status": 400, "data": str(exc)})
+
+
+@lnx.exception_handler(Unauthorized)
+async def unauthorized_handler(_request: Request, exc: Unauthorized):
+    return JSONResponse(status_code=401, content={"status": 401, "data": str(exc)})
+
+
+@lnx.exception_handler(ServerOverloaded)
+async def overloaded_handler(_request: Request, exc: ServerOverloaded):
+    return JSONResponse(status_code=503, content={"status": 503, "data": str(exc)})
+
 
 @lnx.post(
     "/indexes",
     name="Create Index",
     tags=[INDEXES_TITLE],
+    dependencies=[authorized(MODIFY_ENGINE)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -94,14 +173,18 @@ lnx = FastAPI(
         "A standard response from Lnx, with a simple conformation message."
     )
 )
-async def create_index(_payload: IndexCreationPayload):
-    ...
+async def create_index(request: Request, payload: IndexCreationPayload):
+    # The index isn't in the path, so tokens scoped to indexes are checked against the payload.
+    tokens.check(request.headers.get("authorization"), MODIFY_ENGINE, payload.index.name)
+    engine.create_index(payload.index, payload.override_if_exists)
+    return ok("index created")
 
 
 @lnx.delete(
     "/indexes/{index:str}",
     name="Delete Index",
     tags=[INDEXES_TITLE],
+    dependencies=[authorized(MODIFY_ENGINE)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -118,13 +201,68 @@ async def create_index(_payload: IndexCreationPayload):
     )
 )
 async def delete_index(index: str):  # noqa
-    ...
+    engine.delete_index(index)
+    return ok("index deleted")
+
+
+@lnx.post(
+    "/snapshots",
+    name="Create Snapshot",
+    tags=[SNAPSHOTS_TITLE],
+    dependencies=[authorized(MODIFY_ENGINE)],
+    response_model=BasicResponse,
+    responses={
+        **PERMISSIONS_RESPONSE,
+    },
+    response_description=(
+        "A standard response from Lnx, with the name of the new snapshot."
+    )
+)
+async def create_snapshot(request: Request):
+    """
+    Snapshots every `filesystem` index into the `LNX_SNAPSHOT_DIR` directory.
+
+    Each index is only paused while its committed segments are pinned, searches
+    and writes carry on while they are archived.
+    """
+    # The snapshot covers every index, so tokens scoped to indexes must be allowed each of them.
+    token = request.headers.get("authorization")
+    for index in engine.indexes():
+        tokens.check(token, MODIFY_ENGINE, index.name)
+    path = await run_in_threadpool(engine.snapshot, SNAPSHOT_DIR)
+    return ok(os.path.basename(path))
+
+
+@lnx.get(
+    "/indexes/{index:str}/stats",
+    name="Index Stats",
+    tags=[INDEXES_TITLE],
+    dependencies=[authorized(SEARCH_INDEX)],
+    response_model=IndexStatsResponse,
+    responses={
+        400: {
+            "description": "The index does not exist.",
+            "model": BasicResponse,
+        },
+        **PERMISSIONS_RESPONSE,
+    },
+    response_description=(
+        "The current document and segment counts of the index and its runtime counters."
+    )
+)
+async def index_stats(index: str):  # noqa
+    """
+    Gets the runtime statistics of an index, including the hit, miss and eviction
+    counters of its search result cache.
+    """
+    return ok(engine.get_index(index).stats())
 
 
 @lnx.post(
     "/indexes/{index:str}/commit",
     name="Commit",
     tags=[TRANSACTIONS_TITLE],
+    dependencies=[authorized(MODIFY_DOCUMENTS)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -145,12 +283,15 @@ async def commit_changes(index: str):  # noqa
     Finalises any changes to the index documents
     since the last commit and saves them.
     """
+    await run_in_threadpool(engine.get_index(index).commit)
+    return ok("changes committed")
 
 
 @lnx.post(
     "/indexes/{index:str}/rollback",
     name="Rollback",
     tags=[TRANSACTIONS_TITLE],
+    dependencies=[authorized(MODIFY_DOCUMENTS)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -171,12 +312,15 @@ async def rollback_changes(index: str):  # noqa
     Reverts any changes to the index documents since the
     last commit.
     """
+    await run_in_threadpool(engine.get_index(index).rollback)
+    return ok("changes rolled back")
 
 
 @lnx.post(
     "/indexes/{index:str}/documents",
     name="Add Documents",
     tags=[DOCUMENTS_TITLE],
+    dependencies=[authorized(MODIFY_DOCUMENTS)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -197,7 +341,7 @@ async def rollback_changes(index: str):  # noqa
 )
 async def add_documents(
     index: str,  # noqa
-    payload: Union[Dict[str, Union[List[str], str]], List[Dict[str, Union[List[str], str]]]],  # noqa
+    payload: Union[List[Dict[str, Union[List[str], str]]], Dict[str, Union[List[str], str]]],  # noqa
 ):
     """
     Adding a document is relatively simple, you can either add a single document
@@ -206,7 +350,72 @@ async def add_documents(
     Every document is checked for the required fields,
     if any docs are missing fields the *entire* request is rejected.
     """
-    ...
+    added = await run_in_threadpool(engine.get_index(index).add_documents, payload)
+    return ok(f"added {added} documents")
+
+
+@lnx.post(
+    "/indexes/{index:str}/documents/stream",
+    name="Add Documents (Streaming)",
+    tags=[DOCUMENTS_TITLE],
+    dependencies=[authorized(MODIFY_DOCUMENTS)],
+    response_model=BasicResponse,
+    responses={
+        400: {
+            "description": (
+                "The index does not exist or a document in the stream was invalid."
+            ),
+            "model": BasicResponse,
+        },
+        **PERMISSIONS_RESPONSE,
+    },
+    response_description=(
+        "A standard response from Lnx, with a simple conformation message."
+    ),
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {"type": "string", "description": "One JSON document per line."},
+                },
+                "application/json": {
+                    "schema": {"type": "array", "items": {"type": "object"}},
+                },
+            },
+        },
+    },
+)
+async def stream_documents(index: str, request: Request):  # noqa
+    """
+    Adds documents from a streamed body, either newline delimited JSON
+    (`Content-Type: application/x-ndjson`) or a JSON array of objects.
+
+    Unlike `POST /indexes/:index/documents` the body is never buffered as a whole,
+    documents are validated and indexed in bounded batches as they arrive so memory
+    stays flat no matter how large the upload is.
+
+    The same rules apply as adding documents normally, if any document is invalid
+    the *entire* request is rejected and none of the documents are added.
+    """
+    target = engine.get_index(index)
+    stream = DocumentStream(request.headers.get("content-type", ""))
+
+    # Finishing waits on the segment builds and copies the staged log, so like
+    # each batch it runs on a thread rather than stalling the event loop.
+    writer = target.bulk_writer()
+    try:
+        async for chunk in request.stream():
+            documents = stream.feed(chunk)
+            if documents:
+                await run_in_threadpool(writer.add, documents)
+        await run_in_threadpool(writer.add, stream.finish())
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+    await run_in_threadpool(writer.finish)
+
+    return ok(f"added {writer.count} documents")
 
 
 class DeletePayload(BaseModel):
@@ -222,6 +431,7 @@ class DeleteResponse(BasicResponse):
     "/indexes/{index:str}/documents",
     name="Delete Specific Documents",
     tags=[DOCUMENTS_TITLE],
+    dependencies=[authorized(MODIFY_DOCUMENTS)],
     response_model=DeleteResponse,
     responses={
         400: {
@@ -242,21 +452,25 @@ class DeleteResponse(BasicResponse):
 )
 async def delete_documents(
     index: str,  # noqa
-    payload: Union[Dict[str, Union[List[str], str]], List[Dict[str, Union[List[str], str]]]],  # noqa
+    payload: Union[List[Dict[str, Union[List[str], str]]], Dict[str, Union[List[str], str]]],  # noqa
 ):
     """
     Docs can only be deleted via terms, it's up to you to make sure a given term is
     unique otherwise multiple docs can be deleted via this method.
 
-    NOTE: This only works with fast fields, so it's a good idea to make a unique
-    id or use the document specific removal via `DELETE /index/:index/document/:document_id`.
+    NOTE: This only works with fast or indexed fields, so it's a good idea to make a
+    unique fast `string` id field, which is looked up with a single hash lookup per id,
+    or use the document specific removal via `DELETE /index/:index/document/:document_id`.
     """
+    deleted = await run_in_threadpool(engine.get_index(index).delete_by_terms, payload)
+    return ok({"num_deleted": deleted, "detail": "deletes will be applied on commit"})
 
 
 @lnx.delete(
     "/indexes/{index:str}/documents/query",
     name="Delete Documents By Query",
     tags=[DOCUMENTS_TITLE],
+    dependencies=[authorized(MODIFY_DOCUMENTS)],
     response_model=DeleteResponse,
     responses={
         400: {
@@ -278,19 +492,27 @@ async def delete_documents(
 async def delete_documents_by_query(
     index: str,  # noqa
     payload: QueryPayload,  # noqa
+    all_matches: bool = False,
 ):
     """
     Deletes any documents matched with the given query.
 
-    This respects the limits and offsets of the query, so to delete all the matched
-    results you will need to send the request several time however, This is generally not recommended to do.
+    By default this respects the limits and offsets of the query, set `all_matches`
+    to delete every document matching the query in a single request instead, the
+    query's `limit` and `offset` are then ignored.
+
+    `num_deleted` is the number of documents the delete will remove once committed.
     """
+    target = engine.get_index(index)
+    deleted = await run_in_threadpool(target.delete_by_query, payload, all_matches)
+    return ok({"num_deleted": deleted, "detail": "deletes will be applied on commit"})
 
 
 @lnx.delete(
     "/indexes/{index:str}/documents/{document_id:int}",
     name="Delete Document",
     tags=[DOCUMENTS_TITLE],
+    dependencies=[authorized(MODIFY_DOCUMENTS)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -303,19 +525,22 @@ async def delete_documents_by_query(
         "A standard response from Lnx, with a simple conformation message."
     ),
 )
-async def delete_documents(
+async def delete_document(
     index: str,  # noqa
     document_id: int,
 ):
     """
     Delete a specific document with the provided id.
     """
+    engine.get_index(index).delete_by_ids([document_id])
+    return ok("document deleted")
 
 
 @lnx.delete(
     "/indexes/{index:str}/documents/clear",
     name="Clear All Documents",
     tags=[DOCUMENTS_TITLE],
+    dependencies=[authorized(MODIFY_DOCUMENTS)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -335,12 +560,15 @@ async def clear_delete_documents(index: str):  # noqa
     """
     All docs can be cleared from the index via this endpoint.
     """
+    engine.get_index(index).clear()
+    return ok("documents cleared")
 
 
 @lnx.get(
     "/indexes/{index:str}/documents/{document_id:int}",
     name="Get Document By Id",
     tags=[DOCUMENTS_TITLE],
+    dependencies=[authorized(SEARCH_INDEX)],
     response_model=DocumentFetchResponse,
     responses={
         400: {
@@ -360,12 +588,14 @@ async def get_document(index: str, document_id: int):  # noqa
     """
     Get a single document from the index with it's given document_id.
     """
+    return raw_ok(await run_in_threadpool(engine.get_index(index).get_document, document_id))
 
 
 @lnx.post(
     "/indexes/{index:str}/search",
     name="Search Index",
     tags=[SEARCHES_TITLE],
+    dependencies=[authorized(SEARCH_INDEX)],
     response_model=QueryResponse,
     responses={
         400: {
@@ -378,6 +608,12 @@ async def get_document(index: str, document_id: int):  # noqa
             ),
             "model": BasicResponse,
         },
+        503: {
+            "description": (
+                "Every searcher is busy and the search queue is full, try again later."
+            ),
+            "model": BasicResponse,
+        },
         **PERMISSIONS_RESPONSE,
     },
     response_description=(
@@ -387,14 +623,86 @@ async def get_document(index: str, document_id: int):  # noqa
 async def search_index(index: str, payload: QueryPayload):  # noqa
     """
     Search the index for the given query.
+
+    Deep pages are expensive to reach with `offset` as every earlier hit has to be
+    collected again, instead pass the `next_cursor` of the previous page as
+    `search_after` to continue from the last hit at a constant cost per page.
+
+    Results are cached per index until the next commit, rollback, clear or stopword /
+    synonym change. `cached` is set when the results came from the cache, in which case
+    `time_taken` is only the time spent on the lookup.
     """
+    start = time.perf_counter()
+    results = await engine.get_index(index).search_async(payload)
+    return raw_ok(query_results(results, start))
+
+
+@lnx.post(
+    "/search",
+    name="Multi Search",
+    tags=[SEARCHES_TITLE],
+    dependencies=[authorized(SEARCH_INDEX)],
+    response_model=MultiSearchResponse,
+    responses={
+        422: {
+            "description": (
+                "The server was unable to deserialize the payload given."
+            ),
+            "model": BasicResponse,
+        },
+        **PERMISSIONS_RESPONSE,
+    },
+    response_description=(
+        "The results of each search in the order they were given."
+    )
+)
+async def multi_search(request: Request, payload: List[MultiSearchQuery] = Body(...)):  # noqa
+    """
+    Runs several searches, across one or more indexes, in a single request.
+
+    The searches run concurrently on each index's searchers, up to its `max_concurrency`
+    at a time, and the searches of the same index share a single view of it along with
+    its term lookups.
+    Each search is reported with its own `status`, a search which fails or
+    targets an index the token may not search doesn't fail the others, an unexpected
+    error is logged and reported as a `500` for that search alone.
+    """
+    token = request.headers.get("authorization")
+    searchers = {}
+    # A batch runs as many searches at once as a single index can, rather than filling its queue.
+    limits = {}
+
+    async def run(position: int, entry: MultiSearchQuery) -> dict:
+        start = time.perf_counter()
+        try:
+            tokens.check(token, SEARCH_INDEX, entry.index)
+            index = engine.get_index(entry.index)
+            if entry.index not in searchers:
+                searchers[entry.index] = index.searcher()
+                limits[entry.index] = asyncio.Semaphore(index.declaration.max_concurrency)
+            async with limits[entry.index]:
+                results = await index.search_async(entry.search, searchers[entry.index])
+        except Unauthorized as e:
+            return {"status": 401, "data": str(e)}
+        except ServerOverloaded as e:
+            return {"status": 503, "data": str(e)}
+        except EngineError as e:
+            return {"status": 400, "data": str(e)}
+        except Exception:
+            logger.exception("search %d of a multi search on index %r failed", position, entry.index)
+            return {"status": 500, "data": "internal server error"}
+
+        return ok(query_results(results, start))
+
+    return raw_ok(await asyncio.gather(*(run(position, entry) for position, entry in enumerate(payload))))
 
 
 @lnx.post(
     "/indexes/{index:str}/stopwords",
     name="Add Stopwords",
     tags=[CONFIG_TITLE],
-    response_model=QueryResponse,
+    dependencies=[authorized(MODIFY_STOP_WORDS)],
+    response_model=BasicResponse,
     responses={
         400: {
             "description": "The index does not exist or the query is malformed",
@@ -409,22 +717,25 @@ async def search_index(index: str, payload: QueryPayload):  # noqa
         **PERMISSIONS_RESPONSE,
     },
     response_description=(
-        "A list of matching results ordered by and sorted according to the passed query."
+        "A standard response from Lnx, with a simple conformation message."
     )
 )
-async def add_synonyms(index: str, payload: List[str] = Body(...)):  # noqa
+async def add_stopwords(index: str, payload: List[str] = Body(...)):  # noqa
     """
     Adds a set of stopwords to the index.
 
     Note:
         Stop words are only applied if `strip_stop_words: true` in the schema config.
     """
+    engine.get_index(index).add_stop_words(payload)
+    return ok("stopwords added")
 
 
 @lnx.get(
     "/indexes/{index:str}/stopwords",
     name="Get Stopwords",
     tags=[CONFIG_TITLE],
+    dependencies=[authorized(MODIFY_STOP_WORDS)],
     response_model=StopwordsResponse,
     responses={
         400: {
@@ -434,7 +745,7 @@ async def add_synonyms(index: str, payload: List[str] = Body(...)):  # noqa
         **PERMISSIONS_RESPONSE,
     },
     response_description=(
-        "A "
+        "A list of the stopwords applied to the index."
     )
 )
 async def get_stopwords(index: str):  # noqa
@@ -447,12 +758,14 @@ async def get_stopwords(index: str):  # noqa
     Note:
         Stop words are only applied if `strip_stop_words: true` in the schema config.
     """
+    return ok(engine.get_index(index).stop_words.to_list())
 
 
 @lnx.delete(
     "/indexes/{index:str}/stopwords",
     name="Delete Stopwords",
     tags=[CONFIG_TITLE],
+    dependencies=[authorized(MODIFY_STOP_WORDS)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -466,12 +779,15 @@ async def delete_stopwords(index: str, payload: List[str] = Body(...)):  # noqa
     """
     Deletes a set of stopwords from the index.
     """
+    engine.get_index(index).remove_stop_words(payload)
+    return ok("stopwords deleted")
 
 
 @lnx.delete(
     "/indexes/{index:str}/stopwords/clear",
     name="Clear All Stopwords",
     tags=[CONFIG_TITLE],
+    dependencies=[authorized(MODIFY_STOP_WORDS)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -485,13 +801,16 @@ async def clear_stopwords(index: str):  # noqa
     """
     Deletes all stopwords from the index.
     """
+    engine.get_index(index).clear_stop_words()
+    return ok("stopwords cleared")
 
 
 @lnx.post(
     "/indexes/{index:str}/synonyms",
     name="Add Synonyms",
     tags=[CONFIG_TITLE],
-    response_model=QueryResponse,
+    dependencies=[authorized(MODIFY_STOP_WORDS)],
+    response_model=BasicResponse,
     responses={
         400: {
             "description": "The index does not exist or the query is malformed",
@@ -506,7 +825,7 @@ async def clear_stopwords(index: str):  # noqa
         **PERMISSIONS_RESPONSE,
     },
     response_description=(
-        "A list of matching results ordered by and sorted according to the passed query."
+        "A standard response from Lnx, with a simple conformation message."
     )
 )
 async def add_synonyms(index: str, payload: List[str] = Body(...)):  # noqa
@@ -529,12 +848,15 @@ async def add_synonyms(index: str, payload: List[str] = Body(...)):  # noqa
     ]
     ```
     """
+    engine.get_index(index).add_synonyms(payload)
+    return ok("synonyms added")
 
 
 @lnx.get(
     "/indexes/{index:str}/synonyms",
     name="Get Synonyms",
     tags=[CONFIG_TITLE],
+    dependencies=[authorized(MODIFY_STOP_WORDS)],
     response_model=SynonymResponse,
     responses={
         400: {
@@ -551,12 +873,14 @@ async def get_synonyms(index: str):  # noqa
     """
     Get all the synonyms within the index.
     """
+    return ok(engine.get_index(index).synonyms.to_dict())
 
 
 @lnx.delete(
     "/indexes/{index:str}/synonyms",
     name="Delete Synonyms",
     tags=[CONFIG_TITLE],
+    dependencies=[authorized(MODIFY_STOP_WORDS)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -590,12 +914,15 @@ async def delete_synonyms(index: str, payload: List[str] = Body(...)):  # noqa
     Only the iphone's given synonyms will be removed.
     Meaning both `apple` and `phone` will still have `'apple', 'phone', 'iphone'` as their synonyms.
     """
+    engine.get_index(index).remove_synonyms(payload)
+    return ok("synonyms deleted")
 
 
 @lnx.delete(
     "/indexes/{index:str}/synonyms/clear",
     name="Clear All Synonyms",
     tags=[CONFIG_TITLE],
+    dependencies=[authorized(MODIFY_STOP_WORDS)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -609,12 +936,15 @@ async def clear_synonyms(index: str):  # noqa
     """
     Deletes all synonyms from the index, essentially making it a blank slate again.
     """
+    engine.get_index(index).clear_synonyms()
+    return ok("synonyms cleared")
 
 
 @lnx.post(
     "/auth",
     name="Create Token",
     tags=[AUTH_TITLE],
+    dependencies=[authorized(MODIFY_AUTH)],
     response_model=TokenResponse,
     responses={
         422: {
@@ -633,12 +963,15 @@ async def create_token(payload: CreateTokenPayload):  # noqa
     """
     Creates a new access token with a given set of metadata.
     """
+    access = tokens.create(payload)
+    return ok(access.to_dict())
 
 
 @lnx.delete(
     "/auth",
     name="Revoke All Token",
     tags=[AUTH_TITLE],
+    dependencies=[authorized(MODIFY_AUTH)],
     response_model=BasicResponse,
     responses={
         422: {
@@ -662,12 +995,15 @@ async def revoke_all_tokens():
     Running this will revoke all tokens including the super user key,
     run this at your own risk.
     """
+    tokens.revoke_all()
+    return ok("all tokens revoked")
 
 
 @lnx.post(
     "/auth/{token}/revoke",
     name="Revoke Token",
     tags=[AUTH_TITLE],
+    dependencies=[authorized(MODIFY_AUTH)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -685,17 +1021,20 @@ async def revoke_all_tokens():
         "A standard conformation message."
     )
 )
-async def revoke_token():
+async def revoke_token(token: str):
     """
     Revokes a given token, any requests after this with the given token
     will be rejected.
     """
+    tokens.revoke(token)
+    return ok("token revoked")
 
 
 @lnx.post(
     "/auth/{token}/edit",
     name="Edit Token",
     tags=[AUTH_TITLE],
+    dependencies=[authorized(MODIFY_AUTH)],
     response_model=BasicResponse,
     responses={
         400: {
@@ -716,12 +1055,14 @@ async def revoke_token():
         "A payload containing the response token and other metadata."
     )
 )
-async def edit_token(payload: CreateTokenPayload):  # noqa
+async def edit_token(token: str, payload: CreateTokenPayload):  # noqa
     """
     Edits a given token's permissions and metadata.
     The payload will replace **ALL** fields which will either set or unset the
     fields.
     """
+    access = tokens.edit(token, payload)
+    return ok(access.to_dict())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,62 @@
+from typing import Iterator, List
+
+import pytest
+
+from engine import Engine
+from engine.index import Index
+from models import IndexDeclaration, QueryPayload
+
+FIELDS = {
+    "title": {"type": "text", "stored": True},
+    "tag": {"type": "string", "stored": True, "fast": True},
+    "rank": {"type": "u64", "stored": True, "fast": True},
+}
+
+
+def declaration(name: str = "docs", storage_type: str = "filesystem", **options) -> IndexDeclaration:
+    return IndexDeclaration(
+        name=name,
+        storage_type=storage_type,
+        fields=FIELDS,
+        search_fields=["title"],
+        max_concurrency=2,
+        **options,
+    )
+
+
+def search_ids(index: Index, query: str = "hello", **options) -> List[int]:
+    hits = index.search(QueryPayload(query=query, limit=1000, **options))["hits"]
+    return [int(hit["document_id"]) for hit in hits]
+
+
+@pytest.fixture
+def data_dir(tmp_path) -> str:
+    return str(tmp_path / "data")
+
+
+@pytest.fixture
+def engine(data_dir) -> Iterator[Engine]:
+    engine = Engine(data_dir)
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def index(engine) -> Index:
+    return engine.create_index(declaration())
+
+
+@pytest.fixture
+def reopen(data_dir):
+    """ Closes an engine and opens a new one over the same data directory. """
+    opened = []
+
+    def reopen(engine: Engine) -> Engine:
+        engine.close()
+        engine = Engine(data_dir)
+        opened.append(engine)
+        return engine
+
+    yield reopen
+    for engine in opened:
+        engine.close()
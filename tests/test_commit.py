@@ -0,0 +1,51 @@
+from .conftest import search_ids
+
+
+def test_documents_are_visible_once_committed(index):
+    index.add_documents([{"title": "hello", "tag": "a", "rank": i} for i in range(3)])
+    assert search_ids(index) == []
+    index.commit()
+    assert len(search_ids(index)) == 3
+
+
+def test_commit_invalidates_cached_results(index):
+    index.add_documents({"title": "hello", "tag": "a", "rank": 1})
+    index.commit()
+    assert len(search_ids(index)) == 1
+    index.add_documents({"title": "hello", "tag": "a", "rank": 2})
+    index.commit()
+    assert len(search_ids(index)) == 2
+
+
+def test_rollback_discards_pending_writes(index):
+    index.add_documents({"title": "hello kept", "tag": "a", "rank": 1})
+    index.commit()
+    kept = search_ids(index)
+
+    index.add_documents({"title": "hello dropped", "tag": "a", "rank": 2})
+    index.delete_by_ids(kept)
+    index.rollback()
+    index.commit()
+    assert search_ids(index) == kept
+
+
+def test_rollback_truncates_the_log(engine, index, reopen):
+    index.add_documents({"title": "hello kept", "tag": "a", "rank": 1})
+    index.commit()
+    index.add_documents({"title": "hello dropped", "tag": "a", "rank": 2})
+    index.rollback()
+    index.add_documents({"title": "hello later", "tag": "a", "rank": 3})
+    index.commit()
+
+    recovered = reopen(engine).get_index("docs")
+    assert search_ids(recovered, "dropped") == []
+    assert len(search_ids(recovered)) == 2
+
+
+def test_clear_removes_every_document(index):
+    index.add_documents([{"title": "hello", "tag": "a", "rank": i} for i in range(3)])
+    index.commit()
+    index.clear()
+    index.commit()
+    assert search_ids(index) == []
+    assert index.num_docs == 0
@@ -0,0 +1,70 @@
+from engine.index import Index
+from models import QueryPayload
+
+from .conftest import search_ids
+
+
+def _populate(index: Index):
+    index.add_documents([{"title": "hello first", "tag": "a", "rank": i} for i in range(5)])
+    index.commit()
+    index.add_documents([{"title": "hello second", "tag": "b", "rank": i} for i in range(5, 10)])
+    index.commit()
+
+
+def test_delete_by_ids_across_segments(index):
+    _populate(index)
+    ids = sorted(search_ids(index))
+    index.delete_by_ids([ids[0], ids[-1]])
+    index.commit()
+    assert sorted(search_ids(index)) == ids[1:-1]
+
+
+def test_delete_by_unknown_id_is_ignored(index):
+    _populate(index)
+    ids = sorted(search_ids(index))
+    index.delete_by_ids([1])
+    index.commit()
+    assert sorted(search_ids(index)) == ids
+
+
+def test_delete_by_text_term(index):
+    _populate(index)
+    assert index.delete_by_terms({"title": "first"}) == 5
+    index.commit()
+    assert search_ids(index, "first") == []
+    assert len(search_ids(index, "second")) == 5
+
+
+def test_delete_by_keyed_field(index):
+    _populate(index)
+    assert index.delete_by_terms([{"tag": "b"}, {"tag": "missing"}]) == 5
+    index.commit()
+    assert search_ids(index, "second") == []
+
+
+def test_delete_by_query_page(index):
+    _populate(index)
+    payload = QueryPayload(query="hello", order_by="rank", limit=3)
+    top = [int(hit["document_id"]) for hit in index.search(payload)["hits"]]
+    assert index.delete_by_query(payload) == 3
+    index.commit()
+    remaining = search_ids(index)
+    assert len(remaining) == 7
+    assert not set(top) & set(remaining)
+
+
+def test_delete_by_query_all_matches(index):
+    _populate(index)
+    assert index.delete_by_query(QueryPayload(query="second"), all_matches=True) == 5
+    index.commit()
+    assert search_ids(index, "second") == []
+    assert len(search_ids(index)) == 5
+
+
+def test_deletes_apply_to_documents_added_before_them(index):
+    index.add_documents({"title": "hello early", "tag": "a", "rank": 1})
+    index.delete_by_terms({"tag": "a"})
+    index.add_documents({"title": "hello late", "tag": "a", "rank": 2})
+    index.commit()
+    assert search_ids(index, "early") == []
+    assert len(search_ids(index, "late")) == 1
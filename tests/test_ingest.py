@@ -0,0 +1,52 @@
+import pytest
+
+from engine.errors import InvalidDocument
+from engine.ingest import NDJSON_CONTENT_TYPE, DocumentStream
+
+
+def _parse(body: bytes, content_type: str = "application/json", chunk: int = 3):
+    stream = DocumentStream(content_type)
+    documents = []
+    for start in range(0, len(body), chunk):
+        documents.extend(stream.feed(body[start:start + chunk]))
+    documents.extend(stream.finish())
+    return documents
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 1024])
+def test_array_is_parsed_across_chunks(chunk):
+    body = b' [ {"a": "b"} , {"a": "\xc3\xa9"},{"a":["x","y"]} ] '
+    assert _parse(body, chunk=chunk) == [{"a": "b"}, {"a": "é"}, {"a": ["x", "y"]}]
+
+
+def test_empty_array():
+    assert _parse(b"[]") == []
+
+
+def test_ndjson_is_parsed_across_chunks():
+    body = b'{"a": 1}\n\n{"a": 2}\n{"a": 3}'
+    assert _parse(body, NDJSON_CONTENT_TYPE) == [{"a": 1}, {"a": 2}, {"a": 3}]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'[{"a":"b"},]',
+        b'[{"a":"b"}, ]',
+        b'[,{"a":"b"}]',
+        b'[{"a":"b"},,{"a":"c"}]',
+        b'[{"a":"b"} {"a":"c"}]',
+        b'[{"a":"b"}',
+        b'[{"a":"b"}] []',
+        b'{"a":"b"}',
+    ],
+)
+def test_malformed_arrays_are_rejected(body):
+    for chunk in (1, 1024):
+        with pytest.raises(InvalidDocument):
+            _parse(body, chunk=chunk)
+
+
+def test_malformed_ndjson_line_is_rejected():
+    with pytest.raises(InvalidDocument, match="document 2"):
+        _parse(b'{"a": 1}\n{"a": \n', NDJSON_CONTENT_TYPE)
@@ -0,0 +1,54 @@
+from typing import List
+
+import pytest
+
+from engine.index import Index
+from models import QueryPayload, Sort
+
+
+def _populate(index: Index):
+    # Several segments with interleaved and repeated ranks.
+    for start in range(0, 30, 10):
+        index.add_documents([{"title": "hello", "tag": "a", "rank": (i * 7) % 12} for i in range(start, start + 10)])
+        index.commit()
+
+
+def _pages(index: Index, **options) -> List[List[str]]:
+    pages = []
+    cursor = None
+    while True:
+        results = index.search(QueryPayload(query="hello", limit=4, search_after=cursor, **options))
+        if not results["hits"]:
+            return pages
+        pages.append([hit["document_id"] for hit in results["hits"]])
+        cursor = results["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("sort", [Sort.Desc, Sort.Acs])
+def test_search_after_pages_by_fast_field(index, sort):
+    _populate(index)
+    everything = index.search(QueryPayload(query="hello", limit=100, order_by="rank", sort=sort))["hits"]
+    pages = _pages(index, order_by="rank", sort=sort)
+
+    paged = [doc_id for page in pages for doc_id in page]
+    assert paged == [hit["document_id"] for hit in everything]
+    assert len(set(paged)) == 30
+
+
+def test_search_after_pages_by_relevance(index):
+    _populate(index)
+    everything = index.search(QueryPayload(query="hello", limit=100))["hits"]
+    paged = [doc_id for page in _pages(index) for doc_id in page]
+    assert paged == [hit["document_id"] for hit in everything]
+
+
+def test_search_after_skips_documents_deleted_between_pages(index):
+    _populate(index)
+    first = index.search(QueryPayload(query="hello", limit=4, order_by="rank"))
+    index.delete_by_ids([int(doc_id) for doc_id in [h["document_id"] for h in first["hits"]]])
+    index.commit()
+
+    rest = index.search(QueryPayload(query="hello", limit=100, order_by="rank", search_after=first["next_cursor"]))
+    assert len(rest["hits"]) == 26
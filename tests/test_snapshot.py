@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from engine import DataDirectoryInUse, Engine
+from engine.snapshot import create_snapshot, latest_snapshot, main, read_manifest, restore_snapshot
+
+from .conftest import declaration, search_ids
+
+
+def test_snapshot_round_trip(engine, index, tmp_path):
+    index.add_documents([{"title": "hello saved", "tag": "a", "rank": i} for i in range(10)])
+    index.commit()
+    index.checkpoint()
+    index.add_documents([{"title": "hello logged", "tag": "b", "rank": i} for i in range(5)])
+    index.commit()
+    index.delete_by_terms({"rank": 0})
+    index.commit()
+    engine.create_index(declaration("memory", "tempdir"))
+    expected = sorted(search_ids(index))
+
+    snapshots = str(tmp_path / "snapshots")
+    path = create_snapshot(engine, snapshots, threads=2)
+    assert latest_snapshot(snapshots) == path
+    assert list(read_manifest(path)["indexes"]) == ["docs"]
+
+    restored_dir = str(tmp_path / "restored")
+    assert restore_snapshot(path, restored_dir, threads=2) == ["docs"]
+    restored = Engine(restored_dir)
+    try:
+        docs = restored.get_index("docs")
+        assert sorted(search_ids(docs)) == expected
+        for doc_id in expected:
+            assert docs.get_document(doc_id)["document_id"] == str(doc_id)
+    finally:
+        restored.close()
+
+
+def test_snapshots_reuse_unchanged_segments(engine, index, tmp_path):
+    index.add_documents([{"title": "hello", "tag": "a", "rank": i} for i in range(5)])
+    index.commit()
+    snapshots = str(tmp_path / "snapshots")
+    first = create_snapshot(engine, snapshots, threads=2)
+
+    index.add_documents({"title": "hello", "tag": "a", "rank": 9})
+    index.commit()
+    second = create_snapshot(engine, snapshots, threads=2)
+    assert first != second
+
+    segments = read_manifest(second)["indexes"]["docs"]["segments"]
+    assert os.path.basename(first) in {segment["snapshot"] for segment in segments}
+    assert os.path.basename(second) in {segment["snapshot"] for segment in segments}
+
+
+def test_data_directory_is_locked_while_open(engine, data_dir):
+    with pytest.raises(DataDirectoryInUse):
+        Engine(data_dir)
+    engine.close()
+    Engine(data_dir).close()
+
+
+def test_cli_refuses_a_directory_in_use(engine, index, data_dir, tmp_path):
+    index.add_documents({"title": "hello", "tag": "a", "rank": 1})
+    index.commit()
+    snapshots = str(tmp_path / "snapshots")
+    with pytest.raises(SystemExit) as exited:
+        main(["--data-dir", data_dir, "create", "--snapshot-directory", snapshots])
+    assert exited.value.code == 1
+    assert latest_snapshot(snapshots) is None
+
+    # Recovery never ran under the open engine, its uncommitted writes survive.
+    index.add_documents({"title": "hello pending", "tag": "a", "rank": 2})
+    with pytest.raises(SystemExit):
+        main(["--data-dir", data_dir, "restore", snapshots])
+    index.commit()
+    assert len(search_ids(index)) == 2
+
+
+def test_cli_snapshots_a_stopped_directory(engine, index, data_dir, tmp_path):
+    index.add_documents({"title": "hello", "tag": "a", "rank": 1})
+    index.commit()
+    engine.close()
+
+    snapshots = str(tmp_path / "snapshots")
+    main(["--data-dir", data_dir, "create", "--snapshot-directory", snapshots])
+    assert list(read_manifest(latest_snapshot(snapshots))["indexes"]) == ["docs"]
+
+    # The CLI closed its engine, so the directory can be opened again.
+    Engine(data_dir).close()
@@ -0,0 +1,107 @@
+import os
+
+from engine.wal import LOG_FILE
+
+from .conftest import search_ids
+
+
+def test_committed_documents_are_replayed(engine, index, reopen):
+    index.add_documents([{"title": "hello world", "tag": "a", "rank": i} for i in range(10)])
+    index.commit()
+    ids = search_ids(index)
+
+    recovered = reopen(engine).get_index("docs")
+    assert sorted(search_ids(recovered)) == sorted(ids)
+    for doc_id in ids:
+        assert recovered.get_document(doc_id)["document_id"] == str(doc_id)
+
+
+def test_uncommitted_documents_are_dropped(engine, index, reopen):
+    index.add_documents({"title": "hello kept", "tag": "a", "rank": 1})
+    index.commit()
+    index.add_documents({"title": "hello lost", "tag": "a", "rank": 2})
+
+    recovered = reopen(engine).get_index("docs")
+    assert len(search_ids(recovered)) == 1
+    assert search_ids(recovered, "lost") == []
+
+
+def test_torn_tail_is_truncated(engine, index, reopen):
+    index.add_documents({"title": "hello", "tag": "a", "rank": 1})
+    index.commit()
+    with open(os.path.join(index.directory, LOG_FILE), "ab") as file:
+        file.write(b"\x10\x00\x00\x00garbage")
+
+    engine = reopen(engine)
+    recovered = engine.get_index("docs")
+    assert len(search_ids(recovered)) == 1
+
+    # Later commits are appended after the last intact record and replay cleanly.
+    recovered.add_documents({"title": "hello again", "tag": "a", "rank": 2})
+    recovered.commit()
+    assert len(search_ids(reopen(engine).get_index("docs"))) == 2
+
+
+def test_deletes_are_replayed(engine, index, reopen):
+    index.add_documents([{"title": "hello", "tag": "a", "rank": i} for i in range(5)])
+    index.commit()
+    ids = sorted(search_ids(index))
+    index.delete_by_ids(ids[:2])
+    index.commit()
+
+    recovered = reopen(engine).get_index("docs")
+    assert sorted(search_ids(recovered)) == ids[2:]
+
+
+def test_log_after_checkpoint_is_replayed(engine, index, reopen):
+    index.add_documents([{"title": "hello saved", "tag": "a", "rank": i} for i in range(5)])
+    index.commit()
+    index.checkpoint()
+    index.add_documents([{"title": "hello logged", "tag": "b", "rank": i} for i in range(3)])
+    index.commit()
+    ids = sorted(search_ids(index))
+
+    recovered = reopen(engine).get_index("docs")
+    assert sorted(search_ids(recovered)) == ids
+    assert len(search_ids(recovered, "logged")) == 3
+
+
+def test_bulk_load_is_replayed(engine, index, reopen):
+    with index.bulk_writer() as writer:
+        writer.add([{"title": "hello bulk", "tag": "a", "rank": i} for i in range(20)])
+    index.commit()
+
+    recovered = reopen(engine).get_index("docs")
+    assert len(search_ids(recovered, "bulk")) == 20
+
+
+def test_aborted_bulk_load_is_not_replayed(engine, index, reopen):
+    writer = index.bulk_writer()
+    writer.add([{"title": "hello bulk", "tag": "a", "rank": 1}])
+    writer.abort()
+    index.add_documents({"title": "hello single", "tag": "a", "rank": 2})
+    index.commit()
+
+    recovered = reopen(engine).get_index("docs")
+    assert search_ids(recovered, "bulk") == []
+    assert len(search_ids(recovered, "single")) == 1
+
+
+def test_bulk_load_overlapping_adds_is_replayed_in_order(engine, index, reopen):
+    # The stream's ids are taken before the add's, but its log is adopted after it.
+    writer = index.bulk_writer()
+    writer.add([{"title": "hello bulk", "tag": "a", "rank": i} for i in range(2)])
+    index.add_documents({"title": "hello single", "tag": "b", "rank": 2})
+    writer.finish()
+    index.commit()
+    ids = search_ids(index)
+
+    recovered = reopen(engine).get_index("docs")
+    for segment in recovered.segments:
+        assert list(segment.doc_ids) == sorted(segment.doc_ids)
+    for doc_id in ids:
+        assert recovered.get_document(doc_id)["document_id"] == str(doc_id)
+
+    recovered.delete_by_ids(ids)
+    recovered.commit()
+    assert search_ids(recovered) == []